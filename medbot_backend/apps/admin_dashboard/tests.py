@@ -1,3 +1,68 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.n8n_integration.models import N8NExecution, N8NWorkflow
+from apps.users.models import User
 
-# Create your tests here.
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class SystemHealthTest(TestCase):
+    """Platform admins see per-workflow health over sliding windows and stuck executions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', user_type='admin')
+        cls.workflow = N8NWorkflow.objects.create(
+            name='Symptom analysis', workflow_type='symptom_analysis', n8n_workflow_id='wf-1',
+            version='1', description='Analysis', webhook_url='https://n8n.example.com/webhook/analysis'
+        )
+        now = timezone.now()
+        for number, (status, minutes) in enumerate((('success', 3), ('error', 2), ('running', 30))):
+            execution = N8NExecution.objects.create(
+                workflow=cls.workflow, n8n_execution_id=f'exec-{number}', input_data={},
+                start_time=now - timedelta(minutes=minutes)
+            )
+            if status != 'running':
+                execution.status, execution.end_time = status, now - timedelta(minutes=minutes - 1)
+                execution.save()
+
+    def get(self, url, user=None, **params):
+        client = APIClient()
+        client.force_authenticate(user or self.admin)
+        return client.get(f'/api/admin-dashboard/system-health/{url}', params)
+
+    def test_system_health(self):
+        response = self.get('')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(list(body['windows']), ['5m', '1h', '24h'])
+        stats, = body['windows']['5m']
+        self.assertEqual(
+            (stats['name'], stats['executions'], stats['error_rate']), ('Symptom analysis', 2, 0.5)
+        )
+        self.assertAlmostEqual(stats['p50_seconds'], 60, delta=1.5)
+        self.assertEqual(body['stuck_executions'], {'threshold_minutes': 10, 'count': 1})
+
+        body = self.get('', window='1h', threshold_minutes=60).json()
+        self.assertEqual(list(body['windows']), ['1h'])
+        self.assertEqual(body['stuck_executions'], {'threshold_minutes': 60, 'count': 0})
+        response = self.get('', window='7d')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['available_windows'], ['5m', '1h', '24h'])
+
+    def test_stuck_executions(self):
+        body = self.get('stuck-executions/').json()
+        self.assertEqual(body['count'], 1)
+        execution, = body['executions']
+        self.assertEqual((execution['n8n_execution_id'], execution['workflow_name']), ('exec-2', 'Symptom analysis'))
+        self.assertGreaterEqual(execution['running_seconds'], 30 * 60)
+
+    def test_admins_only(self):
+        for user_type in ('patient', 'doctor', 'clinic_admin'):
+            user = User.objects.create_user(username=user_type, password='x', user_type=user_type)
+            for url in ('', 'stuck-executions/', 'analysis-queue/', 'admission/'):
+                self.assertEqual(self.get(url, user).status_code, 403, (user_type, url))
+        self.assertEqual(APIClient().get('/api/admin-dashboard/system-health/').status_code, 401)
+        for url in ('analysis-queue/', 'admission/'):
+            self.assertEqual(self.get(url).status_code, 200, url)
@@ -1,2 +1,9 @@
 from django.urls import path
-urlpatterns = []
+from .views import admission_control, analysis_queue, system_health, stuck_executions
+
+urlpatterns = [
+    path('system-health/', system_health, name='system_health'),
+    path('system-health/stuck-executions/', stuck_executions, name='stuck_executions'),
+    path('system-health/analysis-queue/', analysis_queue, name='analysis_queue'),
+    path('system-health/admission/', admission_control, name='admission_control'),
+]
@@ -1,3 +1,134 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+from apps.healthcare_systems.sharding import shard_aliases
+from apps.n8n_integration.models import N8NExecution
+from apps.n8n_integration.dispatch import dispatch_stats
+from apps.n8n_integration.metrics import workflow_window_stats
+from apps.authentication.permissions import Capability, require
+from medbot.load_shedding import load_shedding_stats
 
-# Create your views here.
+# Sliding windows reported by the system health endpoint
+HEALTH_WINDOWS = {
+    '5m': timedelta(minutes=5),
+    '1h': timedelta(hours=1),
+    '24h': timedelta(hours=24),
+}
+
+STUCK_EXECUTIONS_LIMIT = 50
+
+
+def _stuck_threshold(request):
+    """Return the stuck-execution threshold in minutes from the request or settings."""
+    default = getattr(settings, 'N8N_STUCK_EXECUTION_MINUTES', 10)
+    try:
+        return max(1, int(request.query_params.get('threshold_minutes', default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def _stuck_executions(threshold_minutes):
+    """
+    Running executions started before the threshold on every shard, served
+    from the (status, start_time) index.
+    """
+    cutoff = timezone.now() - timedelta(minutes=threshold_minutes)
+    count, executions = 0, []
+    for alias in shard_aliases():
+        queryset = N8NExecution.objects.using(alias).filter(
+            status='running',
+            start_time__lt=cutoff
+        ).order_by('start_time')
+        count += queryset.count()
+        executions.extend(queryset.values(
+            'id', 'n8n_execution_id', 'workflow__name', 'consultation_id', 'start_time'
+        )[:STUCK_EXECUTIONS_LIMIT])
+    executions.sort(key=lambda execution: execution['start_time'])
+    return count, executions[:STUCK_EXECUTIONS_LIMIT]
+
+
+@api_view(['GET'])
+@permission_classes([require(Capability.VIEW_SYSTEM_HEALTH)])
+def system_health(request):
+    """
+    Per-workflow throughput, error rate and execution time percentiles
+    over sliding windows, plus a count of stuck executions.
+    """
+    window = request.query_params.get('window')
+    if window and window not in HEALTH_WINDOWS:
+        return Response({
+            'error': f"Unknown window '{window}'",
+            'available_windows': list(HEALTH_WINDOWS)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    windows = [window] if window else list(HEALTH_WINDOWS)
+    threshold_minutes = _stuck_threshold(request)
+    stuck_count, _ = _stuck_executions(threshold_minutes)
+
+    return Response({
+        'generated_at': timezone.now(),
+        'windows': {
+            name: workflow_window_stats(HEALTH_WINDOWS[name])
+            for name in windows
+        },
+        'stuck_executions': {
+            'threshold_minutes': threshold_minutes,
+            'count': stuck_count,
+        }
+    })
+
+
+@api_view(['GET'])
+@permission_classes([require(Capability.VIEW_SYSTEM_HEALTH)])
+def stuck_executions(request):
+    """
+    List executions still marked as running past the stuck threshold.
+    """
+    threshold_minutes = _stuck_threshold(request)
+    count, executions = _stuck_executions(threshold_minutes)
+    now = timezone.now()
+
+    return Response({
+        'threshold_minutes': threshold_minutes,
+        'count': count,
+        'executions': [
+            {
+                'id': str(execution['id']),
+                'n8n_execution_id': execution['n8n_execution_id'],
+                'workflow_name': execution['workflow__name'],
+                'consultation_id': str(execution['consultation_id']) if execution['consultation_id'] else None,
+                'start_time': execution['start_time'],
+                'running_seconds': int((now - execution['start_time']).total_seconds()),
+            }
+            for execution in executions
+        ]
+    })
+
+
+@api_view(['GET'])
+@permission_classes([require(Capability.VIEW_SYSTEM_HEALTH)])
+def analysis_queue(request):
+    """
+    Depth, in-flight analyses and wait times of each analysis priority lane
+    in the process serving the request.
+    """
+    return Response({
+        'generated_at': timezone.now(),
+        'lanes': dispatch_stats(),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([require(Capability.VIEW_SYSTEM_HEALTH)])
+def admission_control(request):
+    """
+    Adaptive concurrency limit and admitted/shed requests per priority class
+    in the process serving the request.
+    """
+    return Response({
+        'generated_at': timezone.now(),
+        **load_shedding_stats(),
+    })
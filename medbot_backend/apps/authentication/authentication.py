@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from apps.healthcare_systems.sharding import home_tenant
+from .permissions import capabilities_for
+import uuid
+
+# Bump when the snapshot layout changes so stale entries are never read
+USER_SNAPSHOT_VERSION = 3
+
+
+def user_snapshot_key(user_id):
+    return f'auth:user:v{USER_SNAPSHOT_VERSION}:{user_id}'
+
+
+def build_user_snapshot(user):
+    """Compact, cacheable view of the fields needed to authenticate a request."""
+    return {
+        'id': str(user.pk),
+        'user_type': user.user_type,
+        'is_active': user.is_active,
+        'is_verified': user.is_verified,
+        'healthcare_system_id': str(user.healthcare_system_id) if user.healthcare_system_id else None,
+        'tenant_id': str(tenant_id) if (tenant_id := home_tenant(user)) else None,
+        'password_hash': get_md5_hash_password(user.password),
+    }
+
+
+def cache_user_snapshot(user, overwrite=True):
+    """
+    Store a user's snapshot. Fills after a cache miss use ``overwrite=False``
+    so they can never replace a fresher snapshot written by ``User.save()``.
+    """
+    snapshot = build_user_snapshot(user)
+    timeout = getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+    if overwrite:
+        cache.set(user_snapshot_key(user.pk), snapshot, timeout)
+    else:
+        cache.add(user_snapshot_key(user.pk), snapshot, timeout)
+    return snapshot
+
+
+def invalidate_user_snapshot(user_id):
+    cache.delete(user_snapshot_key(user_id))
+
+
+class CachedUser(SimpleLazyObject):
+    """
+    ``request.user`` stand-in backed by a cached snapshot.
+
+    Snapshot fields (id, user_type, is_active, is_verified,
+    healthcare_system_id, tenant_id) are served without a query; any other attribute loads the full ``User`` row once.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    @property
+    def tenant_id(self):
+        """The user's ``home_tenant``, as of the snapshot."""
+        system_id = self.__dict__['_snapshot']['tenant_id']
+        return uuid.UUID(system_id) if system_id else None
+
+    def __init__(self, snapshot, user=None):
+        user_id = snapshot['id']
+        super().__init__(lambda: get_user_model().objects.get(pk=user_id))
+        self.__dict__['_snapshot'] = snapshot
+        if user is not None:
+            self._wrapped = user
+
+    def __getattr__(self, name):
+        if self._wrapped is empty:
+            snapshot = self.__dict__['_snapshot']
+            if name in ('id', 'pk'):
+                return uuid.UUID(snapshot['id'])
+            if name == 'healthcare_system_id':
+                system_id = snapshot['healthcare_system_id']
+                return uuid.UUID(system_id) if system_id else None
+            if name in ('user_type', 'is_active', 'is_verified'):
+                return snapshot[name]
+            self._setup()
+        return getattr(self._wrapped, name)
+
+    def __bool__(self):
+        return True
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the user from a short-lived cached
+    snapshot instead of loading the ``User`` row on every request.
+
+    Snapshots are rewritten whenever a user is saved (including password
+    changes), so deactivation and token revocation apply immediately.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            # Precomputed role bitmask checked by HasCapability permissions
+            request.capabilities = capabilities_for(result[0])
+        return result
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = None
+        snapshot = cache.get(user_snapshot_key(user_id))
+        if snapshot is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            snapshot = cache_user_snapshot(user, overwrite=False)
+
+        if not snapshot['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != snapshot['password_hash']:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return CachedUser(snapshot, user)
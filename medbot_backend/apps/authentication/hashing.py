@@ -0,0 +1,150 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HashingPoolBusy(APIException):
+    """Raised when the password hashing queue is full."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Authentication service is busy, please retry shortly.'
+    default_code = 'hashing_busy'
+    wait = 1  # Retry-After seconds
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _hash(raw_password):
+    return make_password(raw_password)
+
+
+def _verify(raw_password, encoded):
+    """Return (is_valid, needs_rehash) for a stored password hash."""
+    if not check_password(raw_password, encoded):
+        return False, False
+    try:
+        return True, identify_hasher(encoded).must_update(encoded)
+    except ValueError:
+        return True, False
+
+
+class PasswordHashingPool:
+    """
+    Bounded process pool for CPU-bound password hashing.
+
+    At most ``queue_size`` hashes may be in flight or queued; further
+    requests wait up to ``queue_timeout`` seconds and then fail with
+    ``HashingPoolBusy`` so login bursts cannot starve other traffic.
+    With ``workers=0`` hashing runs inline on the calling thread.
+    """
+
+    def __init__(self, workers, queue_size, queue_timeout):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max(queue_size, 1))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        initializer=_init_worker
+                    )
+        return self._executor
+
+    def submit(self, fn, *args, blocking=True):
+        if not self._slots.acquire(blocking, self.queue_timeout if blocking else None):
+            logger.warning("Password hashing queue full, rejecting request")
+            raise HashingPoolBusy()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        return self.submit(fn, *args).result()
+
+    async def arun(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        return await asyncio.wrap_future(self.submit(fn, *args, blocking=False))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PasswordHashingPool(
+                    workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 0),
+                    queue_size=getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', 64),
+                    queue_timeout=getattr(settings, 'PASSWORD_HASHING_QUEUE_TIMEOUT', 2),
+                )
+    return _pool
+
+
+def hash_password(raw_password):
+    """Hash a password with the preferred hasher on the hashing pool."""
+    return get_hashing_pool().run(_hash, raw_password)
+
+
+def set_password(user, raw_password):
+    """
+    ``user.set_password()`` with the hash computed on the hashing pool.
+    Like it, remembers the raw password so ``save()`` notifies the
+    ``password_changed`` validators.
+    """
+    user.password = hash_password(raw_password)
+    user._password = raw_password
+
+
+def verify_password(user, raw_password):
+    """
+    Check a user's password on the hashing pool, transparently upgrading
+    the stored hash when the hasher or its parameters have changed.
+    """
+    valid, needs_rehash = get_hashing_pool().run(_verify, raw_password, user.password)
+    if valid and needs_rehash:
+        set_password(user, raw_password)
+        user.save(update_fields=['password'])
+    return valid
+
+
+async def ahash_password(raw_password):
+    return await get_hashing_pool().arun(_hash, raw_password)
+
+
+async def aset_password(user, raw_password):
+    """Awaitable ``set_password``."""
+    user.password = await ahash_password(raw_password)
+    user._password = raw_password
+
+
+async def averify_password(user, raw_password):
+    """Awaitable ``verify_password`` for async views."""
+    valid, needs_rehash = await get_hashing_pool().arun(_verify, raw_password, user.password)
+    if valid and needs_rehash:
+        await aset_password(user, raw_password)
+        await user.asave(update_fields=['password'])
+    return valid
@@ -0,0 +1,77 @@
+import statistics
+import time
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.authentication.authentication import CachedJWTAuthentication, invalidate_user_snapshot
+from apps.users.models import User
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure JWT authentication overhead per request: queries and latency of '
+        "simplejwt's JWTAuthentication against the cached user snapshot"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if isinstance(caches['default'], DummyCache):
+            # A dummy cache never stores the snapshot; measure with a local one instead
+            self.stdout.write('Configured cache stores nothing; using a local-memory cache')
+            with override_settings(CACHES=LOCMEM):
+                self._run(options)
+        else:
+            self._run(options)
+
+    def _run(self, options):
+        users = User.objects.bulk_create([
+            User(username=f'auth-benchmark-{number}-{time.time_ns()}', password='!')
+            for number in range(options['users'])
+        ])
+        try:
+            factory = APIRequestFactory()
+            headers = [f'Bearer {AccessToken.for_user(user)}' for user in users]
+            requests = [
+                factory.get('/api/symptoms/analysis/', HTTP_AUTHORIZATION=headers[number % len(headers)])
+                for number in range(options['requests'])
+            ]
+            for user in users:
+                invalidate_user_snapshot(user.pk)
+            for name, authentication in (
+                ('JWTAuthentication', JWTAuthentication()),
+                ('CachedJWTAuthentication', CachedJWTAuthentication()),
+            ):
+                timings = []
+                queries = QueryCounter()
+                with connection.execute_wrapper(queries):
+                    for request in requests:
+                        start = time.perf_counter()
+                        authentication.authenticate(Request(request))
+                        timings.append((time.perf_counter() - start) * 1e6)
+                timings.sort()
+                self.stdout.write(
+                    f'{name:<24} {queries.count / len(requests):.3f} queries/request  '
+                    f'p50 {statistics.median(timings):6.1f} µs  p99 {timings[int(len(timings) * 0.99)]:6.1f} µs'
+                )
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
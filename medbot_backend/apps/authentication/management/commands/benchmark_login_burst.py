@@ -0,0 +1,88 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.authentication import hashing
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire a burst of concurrent logins and measure login throughput and the latency of a '
+        'cheap authenticated endpoint meanwhile, hashing inline against the hashing pool'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16, help='Threads sending logins')
+        parser.add_argument(
+            '--workers', type=int, default=settings.PASSWORD_HASHING_WORKERS or 2,
+            help='Hashing pool processes for the pooled run'
+        )
+
+    def handle(self, *args, **options):
+        password = f'burst-{time.time_ns()}'
+        users = [
+            User.objects.create(username=f'login-burst-{number}-{time.time_ns()}', password=make_password(password))
+            for number in range(options['concurrency'])
+        ]
+        observer = User.objects.create(username=f'login-burst-observer-{time.time_ns()}', password='!')
+        previous = hashing._pool
+        try:
+            # Every login and the observer would otherwise drain the same rate limit buckets
+            with override_settings(RATE_LIMIT_ENABLED=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for name, workers in (('inline', 0), (f'pool ({options["workers"]} workers)', options['workers'])):
+                    hashing._pool = hashing.PasswordHashingPool(
+                        workers=workers, queue_size=settings.PASSWORD_HASHING_QUEUE_SIZE,
+                        queue_timeout=settings.PASSWORD_HASHING_QUEUE_TIMEOUT,
+                    )
+                    # Start the worker processes before the clock does
+                    hashing.hash_password(password)
+                    self._report(name, *self._burst(users, password, observer, options))
+                    if hashing._pool._executor is not None:
+                        hashing._pool._executor.shutdown()
+        finally:
+            hashing._pool = previous
+            User.objects.filter(pk__in=[user.pk for user in (*users, observer)]).delete()
+
+    def _burst(self, users, password, observer, options):
+        done = threading.Event()
+        statuses = []
+
+        def login(number):
+            response = Client().post('/api/auth/login/', {
+                'username': users[number % len(users)].username, 'password': password
+            }, content_type='application/json')
+            statuses.append(response.status_code)
+
+        # Polls the cheap endpoint until the burst is over
+        def observe():
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(observer)}')
+            while not timings or not done.is_set():
+                start = time.perf_counter()
+                client.get('/api/auth/status/')
+                timings.append((time.perf_counter() - start) * 1000)
+
+        timings = []
+        watcher = threading.Thread(target=observe)
+        watcher.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(login, range(options['logins'])))
+        elapsed = time.perf_counter() - start
+        done.set()
+        watcher.join()
+        return statuses, elapsed, timings
+
+    def _report(self, name, statuses, elapsed, timings):
+        timings.sort()
+        ok = statuses.count(200)
+        self.stdout.write(
+            f'{name:<20} {ok / elapsed:6.1f} logins/s  ({ok} ok, {statuses.count(503)} busy)  '
+            f'status p50 {statistics.median(timings):7.1f} ms  p99 {timings[int(len(timings) * 0.99)]:7.1f} ms'
+        )
@@ -0,0 +1,69 @@
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from apps.authentication.authentication import CachedUser
+from apps.authentication.permissions import (
+    ROLE_DEFINITIONS,
+    Capability,
+    capabilities_for,
+    has_capability,
+    require,
+)
+from .benchmark_auth import QueryCounter
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure permission checks per second: inline user_type comparisons, the DRF '
+        'capability permission class and healthcare-system scoped checks'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=200000)
+
+    def handle(self, *args, **options):
+        systems = [uuid.uuid4() for _ in range(5)]
+        users = [
+            CachedUser({
+                'id': str(uuid.uuid4()), 'user_type': role, 'is_active': True, 'is_verified': True,
+                'healthcare_system_id': str(systems[number % len(systems)]), 'tenant_id': None,
+                'password_hash': '',
+            })
+            for number, role in enumerate(list(ROLE_DEFINITIONS) * 20)
+        ]
+        factory = APIRequestFactory()
+        requests = []
+        for user in users:
+            request = Request(factory.get('/api/clinic/dashboard/'))
+            request.user = user
+            request.capabilities = capabilities_for(user)
+            requests.append(request)
+        permission = require(Capability.MANAGE_APPOINTMENTS, Capability.ACCESS_CLINIC_DASHBOARD)()
+
+        count = options['checks']
+        checks = (
+            # What views did before: role lists compared on every request
+            ('inline user_type', lambda number: requests[number % len(requests)].user.user_type in [
+                'clinic_admin', 'doctor', 'nurse'
+            ]),
+            ('HasCapability', lambda number: permission.has_permission(requests[number % len(requests)], None)),
+            ('scoped has_capability', lambda number: has_capability(
+                users[number % len(users)], Capability.EXPORT_CONSULTATIONS,
+                healthcare_system_id=systems[number % len(systems)],
+                capabilities=requests[number % len(requests)].capabilities,
+            )),
+        )
+        for name, check in checks:
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                start = time.perf_counter()
+                for number in range(count):
+                    check(number)
+                elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{name:<22} {count / elapsed:12,.0f} checks/s  '
+                f'{elapsed / count * 1e9:6.0f} ns/check  {queries.count} queries'
+            )
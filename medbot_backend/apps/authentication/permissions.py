@@ -0,0 +1,105 @@
+from enum import IntFlag
+from functools import reduce
+from operator import or_
+from rest_framework import permissions
+
+
+class Capability(IntFlag):
+    """
+    Individual actions a user may perform, combined into one bitmask per role.
+    """
+    NONE = 0
+    CREATE_CONSULTATIONS = 1 << 0
+    MANAGE_APPOINTMENTS = 1 << 1
+    ACCESS_ADMIN = 1 << 2
+    ACCESS_CLINIC_DASHBOARD = 1 << 3
+    EXPORT_CONSULTATIONS = 1 << 4
+    VIEW_SYSTEM_HEALTH = 1 << 5
+    IMPORT_PATIENTS = 1 << 6
+
+
+ROLE_DEFINITIONS = {
+    'patient': [Capability.CREATE_CONSULTATIONS],
+    'doctor': [Capability.MANAGE_APPOINTMENTS, Capability.ACCESS_CLINIC_DASHBOARD],
+    'nurse': [Capability.MANAGE_APPOINTMENTS, Capability.ACCESS_CLINIC_DASHBOARD],
+    'clinic_admin': [
+        Capability.MANAGE_APPOINTMENTS,
+        Capability.ACCESS_CLINIC_DASHBOARD,
+        Capability.EXPORT_CONSULTATIONS,
+        Capability.IMPORT_PATIENTS,
+    ],
+    'receptionist': [],
+    'admin': [
+        Capability.ACCESS_ADMIN,
+        Capability.EXPORT_CONSULTATIONS,
+        Capability.VIEW_SYSTEM_HEALTH,
+        Capability.IMPORT_PATIENTS,
+    ],
+}
+
+# Roles whose capabilities apply to every healthcare system rather than their own
+GLOBAL_ROLES = frozenset(['admin'])
+
+# Compiled once at import: user_type -> capability bitmask
+ROLE_CAPABILITIES = {
+    role: reduce(or_, capabilities, Capability.NONE)
+    for role, capabilities in ROLE_DEFINITIONS.items()
+}
+
+
+def capabilities_for(user):
+    """Return the capability bitmask for a user from their user_type alone."""
+    if not user or not user.is_authenticated:
+        return Capability.NONE
+    return ROLE_CAPABILITIES.get(user.user_type, Capability.NONE)
+
+
+def request_capabilities(request):
+    """Capabilities attached to the request by authentication, or computed from the user."""
+    capabilities = getattr(request, 'capabilities', None)
+    if capabilities is None:
+        capabilities = capabilities_for(request.user)
+    return capabilities
+
+
+def has_global_role(user):
+    """Whether the user's capabilities apply across all healthcare systems."""
+    return user.user_type in GLOBAL_ROLES
+
+
+def has_capability(user, capability, healthcare_system_id=None, capabilities=None):
+    """
+    Check a capability, optionally scoped to a healthcare system.
+
+    Users outside GLOBAL_ROLES only hold their capabilities within the
+    healthcare system they belong to.
+    """
+    if capabilities is None:
+        capabilities = capabilities_for(user)
+    if capabilities & capability != capability:
+        return False
+    if healthcare_system_id is None or has_global_role(user):
+        return True
+    return (
+        user.healthcare_system_id is not None
+        and str(user.healthcare_system_id) == str(healthcare_system_id)
+    )
+
+
+class HasCapability(permissions.BasePermission):
+    """
+    DRF permission checking one bitmask against the request's capabilities.
+    Use ``require(...)`` to build a permission class for specific capabilities.
+    """
+    required = Capability.NONE
+
+    def has_permission(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return False
+        return request_capabilities(request) & self.required == self.required
+
+
+def require(*capabilities):
+    """Build a ``HasCapability`` permission class requiring all given capabilities."""
+    required = reduce(or_, capabilities, Capability.NONE)
+    return type(f'RequiresCapability{int(required)}', (HasCapability,), {'required': required})
@@ -1,16 +1,37 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
+from django.utils import timezone
+from datetime import timedelta
 from apps.users.models import User, PatientProfile, DoctorProfile
+from .hashing import set_password, verify_password
+from .permissions import capabilities_for
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """
     Custom JWT token serializer that includes user information.
     """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # Role claims let clients and downstream services authorize statelessly
+        token['user_type'] = user.user_type
+        token['capabilities'] = int(capabilities_for(user))
+        token['healthcare_system_id'] = (
+            str(user.healthcare_system_id) if user.healthcare_system_id else None
+        )
+        return token
     
     def validate(self, attrs):
         data = super().validate(attrs)
+        self._update_last_login()
         
         # Add custom user data to the token response
         data.update({
@@ -27,6 +48,18 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         
         return data
 
+    def _update_last_login(self):
+        """
+        Record last_login at most once per LAST_LOGIN_UPDATE_INTERVAL with a
+        single-column UPDATE instead of a full user save on every login.
+        """
+        now = timezone.now()
+        interval = timedelta(seconds=getattr(settings, 'LAST_LOGIN_UPDATE_INTERVAL', 3600))
+        if self.user.last_login and now - self.user.last_login < interval:
+            return
+        User.objects.filter(pk=self.user.pk).update(last_login=now)
+        self.user.last_login = now
+
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """
@@ -57,10 +90,12 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         validated_data.pop('password_confirm')
         password = validated_data.pop('password')
         
-        user = User.objects.create_user(
-            password=password,
-            **validated_data
-        )
+        # Same as create_user(), but the hash is computed on the hashing pool
+        user = User(**validated_data)
+        user.username = User.normalize_username(user.username)
+        user.email = User.objects.normalize_email(user.email)
+        set_password(user, password)
+        user.save()
         
         # Create profile based on user type
         if user.user_type == 'patient':
@@ -127,6 +162,29 @@ class PasswordChangeSerializer(serializers.Serializer):
     
     def validate_old_password(self, value):
         user = self.context['request'].user
-        if not user.check_password(value):
+        if not verify_password(user, value):
             raise serializers.ValidationError("Old password is incorrect")
         return value
+
+
+class AcceptInviteSerializer(serializers.Serializer):
+    """
+    Serializer for redeeming a patient invite and setting the first password.
+    """
+    uid = serializers.CharField(required=True)
+    token = serializers.CharField(required=True)
+    password = serializers.CharField(required=True, min_length=8)
+    password_confirm = serializers.CharField(required=True)
+
+    def validate(self, attrs):
+        try:
+            user = User.objects.get(pk=force_str(urlsafe_base64_decode(attrs['uid'])))
+        except (ValueError, TypeError, OverflowError, DjangoValidationError, User.DoesNotExist):
+            user = None
+        # The token is bound to the unusable password, so it stops working once redeemed
+        if user is None or not default_token_generator.check_token(user, attrs['token']):
+            raise serializers.ValidationError("Invite link is invalid or has expired")
+        if attrs['password'] != attrs['password_confirm']:
+            raise serializers.ValidationError("Passwords don't match")
+        attrs['user'] = user
+        return attrs
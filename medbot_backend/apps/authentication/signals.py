@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.users.models import PatientProfile
+from .authentication import cache_user_snapshot, invalidate_user_snapshot
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_user_snapshot(sender, instance, **kwargs):
+    """Rewrite the cached auth snapshot once the user change is committed."""
+    transaction.on_commit(lambda: cache_user_snapshot(instance))
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def drop_user_snapshot(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_user_snapshot(instance.pk))
+
+
+@receiver(post_save, sender=PatientProfile)
+@receiver(post_delete, sender=PatientProfile)
+def drop_patient_snapshot(sender, instance, **kwargs):
+    """A patient's preferred hospital decides their shard (``home_tenant``)."""
+    transaction.on_commit(lambda: invalidate_user_snapshot(instance.user_id))
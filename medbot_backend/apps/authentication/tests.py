@@ -1,3 +1,230 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.consultations.models import Consultation
+from apps.healthcare_systems.models import HealthcareSystem
+from apps.users.models import User
+from .authentication import CachedJWTAuthentication, CachedUser, build_user_snapshot
+from . import hashing
+from .hashing import HashingPoolBusy, PasswordHashingPool, get_hashing_pool
+from .permissions import Capability, has_capability, require
 
-# Create your tests here.
+PASSWORD_CHANGED = 'django.contrib.auth.base_user.password_validation.password_changed'
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class PooledPasswordTest(TestCase):
+    """Passwords hashed on the worker pool behave like ``set_password()``."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='pooled', password='old-secret-1')
+        self.client = APIClient()
+
+    def test_pool_has_workers(self):
+        # Everything below must exercise the process pool, not the inline path
+        self.assertGreater(get_hashing_pool().workers, 0)
+
+    def test_authenticate(self):
+        self.assertEqual(authenticate(username='pooled', password='old-secret-1'), self.user)
+        self.assertIsNone(authenticate(username='pooled', password='wrong'))
+        self.assertIsNone(authenticate(username='nobody', password='old-secret-1'))
+
+    def test_outdated_hash_upgraded_on_login(self):
+        stale = PBKDF2PasswordHasher().encode('old-secret-1', 'fixedsalt', iterations=1000)
+        User.objects.filter(pk=self.user.pk).update(password=stale)
+        with mock.patch(PASSWORD_CHANGED) as password_changed:
+            self.assertEqual(authenticate(username='pooled', password='old-secret-1'), self.user)
+        self.user.refresh_from_db()
+        self.assertNotEqual(self.user.password, stale)
+        self.assertTrue(check_password('old-secret-1', self.user.password))
+        password_changed.assert_called_once()
+        self.assertEqual(password_changed.call_args.args[0], 'old-secret-1')
+
+    def test_change_password_notifies_validators(self):
+        self.client.force_authenticate(self.user)
+        with mock.patch(PASSWORD_CHANGED) as password_changed:
+            response = self.client.post('/api/auth/change-password/', {
+                'old_password': 'old-secret-1',
+                'new_password': 'new-secret-2',
+                'new_password_confirm': 'new-secret-2',
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        password_changed.assert_called_once()
+        self.assertEqual(password_changed.call_args.args[:2], ('new-secret-2', self.user))
+        self.assertEqual(authenticate(username='pooled', password='new-secret-2'), self.user)
+
+    def test_registration_notifies_validators(self):
+        with mock.patch(PASSWORD_CHANGED) as password_changed:
+            response = self.client.post('/api/auth/register/', {
+                'username': 'newcomer', 'email': 'newcomer@example.com',
+                'password': 'first-secret-3', 'password_confirm': 'first-secret-3',
+                'first_name': 'New', 'last_name': 'Comer', 'user_type': 'patient',
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        password_changed.assert_called_once()
+        self.assertEqual(password_changed.call_args.args[0], 'first-secret-3')
+        self.assertIsNotNone(authenticate(username='newcomer', password='first-secret-3'))
+
+    def test_full_queue_rejects_logins(self):
+        pool = PasswordHashingPool(workers=1, queue_size=1, queue_timeout=0.05)
+        try:
+            busy = pool.submit(time.sleep, 1)
+            with self.assertRaises(HashingPoolBusy):
+                pool.submit(time.sleep, 0)
+            with mock.patch.object(hashing, '_pool', pool):
+                response = self.client.post('/api/auth/login/', {
+                    'username': 'pooled', 'password': 'old-secret-1'
+                }, format='json')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+            # The slot frees once the queued hash finishes
+            busy.result()
+            self.assertEqual(pool.run(hashing._hash, 'old-secret-1')[:6], 'pbkdf2')
+        finally:
+            pool._executor.shutdown()
+
+
+@override_settings(CACHES=LOCMEM, RATE_LIMIT_ENABLED=False)
+class CachedJWTAuthenticationTest(TestCase):
+    """Requests authenticate from the cached snapshot, which follows every user change."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='polling', password='secret-polling-1', is_verified=True)
+        self.header = f'Bearer {AccessToken.for_user(self.user)}'
+
+    def authenticate(self):
+        request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION=self.header))
+        return CachedJWTAuthentication().authenticate(request)[0]
+
+    def test_repeat_requests_make_no_user_query(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertIsInstance(user, CachedUser)
+            self.assertEqual((user.pk, user.user_type, user.is_active, user.is_verified),
+                             (self.user.pk, 'patient', True, True))
+        # Other fields load the row once
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, 'polling')
+            self.assertEqual(user.email, '')
+
+    def test_snapshot_follows_user_changes(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.user_type = 'doctor'
+            self.user.save()
+        self.assertEqual(self.authenticate().user_type, 'doctor')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_status_polling_queries_only_the_consultation(self):
+        consultation = Consultation.objects.create(
+            patient=self.user, symptom_description='Headache', status='completed'
+        )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=self.header)
+        url = f'/api/symptoms/analysis/{consultation.id}/analysis_status/'
+        self.assertEqual(client.get(url).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(url).json()['status'], 'completed')
+
+    def test_last_login_written_at_most_once_per_interval(self):
+        client = APIClient()
+        credentials = {'username': 'polling', 'password': 'secret-polling-1'}
+        self.assertEqual(client.post('/api/auth/login/', credentials, format='json').status_code, 200)
+        self.user.refresh_from_db()
+        first = self.user.last_login
+        self.assertIsNotNone(first)
+        with self.assertNumQueries(1):  # the user lookup; no last_login UPDATE
+            self.assertEqual(client.post('/api/auth/login/', credentials, format='json').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, first)
+
+
+@override_settings(CACHES=LOCMEM, RATE_LIMIT_ENABLED=False)
+class CapabilityTest(TestCase):
+    """Authorization reads one precomputed bitmask, scoped to the user's healthcare system."""
+
+    # The ad-hoc user_type rules user_status applied before the capability engine
+    LEGACY_PERMISSIONS = {
+        'can_create_consultations': {'patient'},
+        'can_manage_appointments': {'doctor', 'nurse', 'clinic_admin'},
+        'can_access_admin': {'admin'},
+        'can_access_clinic_dashboard': {'clinic_admin', 'doctor', 'nurse'},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.north, cls.south = (
+            HealthcareSystem.objects.create(
+                name=name, system_type='hospital', address='1 Main St', city='Springfield',
+                state='IL', zip_code='62701', phone_number='555-0100', email='info@example.com',
+                monthly_fee=Decimal('100.00'), contract_start_date=timezone.now().date(),
+                contract_end_date=timezone.now().date() + timedelta(days=365),
+            )
+            for name in ('North', 'South')
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def user(self, user_type, **fields):
+        return User.objects.create_user(
+            username=f'{user_type}-{User.objects.count()}', password='secret-role-1', user_type=user_type, **fields
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    def test_user_status_matches_role_rules(self):
+        for user_type in ('patient', 'doctor', 'nurse', 'clinic_admin', 'receptionist', 'admin'):
+            permissions = self.client_for(self.user(user_type)).get('/api/auth/status/').json()['permissions']
+            self.assertEqual(permissions, {
+                name: user_type in roles for name, roles in self.LEGACY_PERMISSIONS.items()
+            }, user_type)
+
+    def test_checks_need_no_queries(self):
+        clinic_admin = CachedUser(build_user_snapshot(self.user('clinic_admin', healthcare_system=self.north)))
+        admin = CachedUser(build_user_snapshot(self.user('admin')))
+        request = Request(APIRequestFactory().get('/'))
+        request.user = clinic_admin
+        with self.assertNumQueries(0):
+            self.assertTrue(require(Capability.EXPORT_CONSULTATIONS)().has_permission(request, None))
+            self.assertFalse(require(Capability.VIEW_SYSTEM_HEALTH)().has_permission(request, None))
+            self.assertTrue(has_capability(clinic_admin, Capability.EXPORT_CONSULTATIONS, self.north.pk))
+            self.assertFalse(has_capability(clinic_admin, Capability.EXPORT_CONSULTATIONS, self.south.pk))
+            self.assertTrue(has_capability(admin, Capability.EXPORT_CONSULTATIONS, self.south.pk))
+
+    def test_endpoints_and_token_claims(self):
+        url = '/api/admin-dashboard/system-health/analysis-queue/'
+        self.assertEqual(self.client_for(self.user('doctor')).get(url).status_code, 403)
+        self.assertEqual(self.client_for(self.user('admin')).get(url).status_code, 200)
+
+        clinic_admin = self.user('clinic_admin', healthcare_system=self.north)
+        response = APIClient().post('/api/auth/login/', {
+            'username': clinic_admin.username, 'password': 'secret-role-1'
+        }, format='json')
+        token = AccessToken(response.json()['access'])
+        self.assertEqual(
+            (token['user_type'], token['capabilities'], token['healthcare_system_id']),
+            ('clinic_admin', int(Capability.MANAGE_APPOINTMENTS | Capability.ACCESS_CLINIC_DASHBOARD
+                                 | Capability.EXPORT_CONSULTATIONS | Capability.IMPORT_PATIENTS), str(self.north.pk))
+        )
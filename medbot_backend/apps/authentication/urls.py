@@ -5,6 +5,7 @@ from .views import (
     register_user,
     UserProfileView,
     ChangePasswordView,
+    AcceptInviteView,
     verify_user,
     user_status
 )
@@ -14,6 +15,7 @@ urlpatterns = [
     path('login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('register/', register_user, name='register'),
+    path('accept-invite/', AcceptInviteView.as_view(), name='accept_invite'),
     
     # User profile endpoints
     path('profile/', UserProfileView.as_view(), name='user_profile'),
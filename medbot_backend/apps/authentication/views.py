@@ -8,8 +8,11 @@ from .serializers import (
     CustomTokenObtainPairSerializer,
     UserRegistrationSerializer,
     UserProfileSerializer,
-    PasswordChangeSerializer
+    PasswordChangeSerializer,
+    AcceptInviteSerializer
 )
+from .hashing import set_password
+from .permissions import Capability, request_capabilities
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
@@ -17,6 +20,7 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     Custom JWT token view that includes user information.
     """
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_scope = 'login'
 
 
 @api_view(['POST'])
@@ -75,7 +79,7 @@ class ChangePasswordView(APIView):
         )
         if serializer.is_valid():
             user = request.user
-            user.set_password(serializer.validated_data['new_password'])
+            set_password(user, serializer.validated_data['new_password'])
             user.save()
             return Response({
                 'message': 'Password changed successfully'
@@ -83,6 +87,27 @@ class ChangePasswordView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class AcceptInviteView(APIView):
+    """
+    Redeem an invite emailed by a bulk patient import: set the account's
+    first password. The link works once.
+    """
+    permission_classes = [permissions.AllowAny]
+    throttle_scope = 'login'
+
+    def post(self, request):
+        serializer = AcceptInviteSerializer(data=request.data)
+        if serializer.is_valid():
+            user = serializer.validated_data['user']
+            set_password(user, serializer.validated_data['password'])
+            user.save()
+            return Response({
+                'message': 'Password set successfully',
+                'username': user.username
+            }, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def verify_user(request):
@@ -118,6 +143,7 @@ def user_status(request):
     Get current user status and permissions.
     """
     user = request.user
+    capabilities = request_capabilities(request)
     return Response({
         'user_id': str(user.id),
         'username': user.username,
@@ -125,9 +151,9 @@ def user_status(request):
         'is_verified': user.is_verified,
         'is_active': user.is_active,
         'permissions': {
-            'can_create_consultations': user.user_type == 'patient',
-            'can_manage_appointments': user.user_type in ['doctor', 'nurse', 'clinic_admin'],
-            'can_access_admin': user.user_type == 'admin',
-            'can_access_clinic_dashboard': user.user_type in ['clinic_admin', 'doctor', 'nurse'],
+            'can_create_consultations': bool(capabilities & Capability.CREATE_CONSULTATIONS),
+            'can_manage_appointments': bool(capabilities & Capability.MANAGE_APPOINTMENTS),
+            'can_access_admin': bool(capabilities & Capability.ACCESS_ADMIN),
+            'can_access_clinic_dashboard': bool(capabilities & Capability.ACCESS_CLINIC_DASHBOARD),
         }
     })
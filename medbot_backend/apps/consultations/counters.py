@@ -0,0 +1,61 @@
+"""
+Write-behind counters fed by consultations (see ``medbot.counters``).
+
+- ``DoctorProfile.total_consultations``: completed appointments.
+- ``DoctorProfile.rating``: mean of every feedback score given on the
+  doctor's consultations, from the running ``rating_sum`` and
+  ``rating_count``. Each feedback adds its three scores.
+- ``HealthcareSystem.current_occupancy``: appointments in progress.
+"""
+
+from django.db.models import DecimalField, F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from apps.healthcare_systems.models import HealthcareSystem
+from apps.users.models import DoctorProfile
+from medbot import counters
+
+FEEDBACK_SCORES = ('accuracy_rating', 'helpfulness_rating', 'speed_rating')
+
+
+def derive_rating(deltas):
+    """Recompute the average rating from the new totals in the same UPDATE."""
+    if 'rating_sum' not in deltas and 'rating_count' not in deltas:
+        return {}
+    total = Cast(F('rating_sum') + deltas.get('rating_sum', 0), FloatField())
+    count = NullIf(F('rating_count') + deltas.get('rating_count', 0), 0)
+    return {
+        'rating': Cast(
+            Coalesce(Round(total / count, 2), Value(0.0)),
+            DecimalField(max_digits=3, decimal_places=2),
+        )
+    }
+
+
+counters.register(
+    DoctorProfile,
+    ('total_consultations', 'rating_sum', 'rating_count'),
+    key='user_id',
+    derive=derive_rating,
+)
+counters.register(HealthcareSystem, ('current_occupancy',))
+
+
+def feedback_score(feedback):
+    return sum(getattr(feedback, field) or 0 for field in FEEDBACK_SCORES)
+
+
+def count_appointment(doctor_id, system_id, old_status, new_status):
+    """Count an appointment's move from ``old_status`` to ``new_status`` (``None``: absent)."""
+    if old_status == new_status:
+        return
+    completed = (new_status == 'completed') - (old_status == 'completed')
+    if completed:
+        counters.increment(DoctorProfile, doctor_id, total_consultations=completed)
+    in_progress = (new_status == 'in_progress') - (old_status == 'in_progress')
+    if in_progress:
+        counters.increment(HealthcareSystem, system_id, current_occupancy=in_progress)
+
+
+def count_feedback(doctor_id, score_delta, count_delta):
+    if doctor_id is not None:
+        counters.increment(DoctorProfile, doctor_id, rating_sum=score_delta, rating_count=count_delta)
@@ -0,0 +1,300 @@
+import csv
+import io
+import json
+import uuid
+import zlib
+from datetime import datetime, time
+from django.core.serializers.json import DjangoJSONEncoder
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from apps.healthcare_systems.sharding import shard_for
+from .models import Consultation
+
+# (output column, ORM lookup) pairs for exported consultations and outcomes
+EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('healthcare_system_id', 'healthcare_system_id'),
+    ('patient_id', 'patient_id'),
+    ('symptom_description', 'symptom_description'),
+    ('symptom_duration', 'symptom_duration'),
+    ('pain_level', 'pain_level'),
+    ('status', 'status'),
+    ('urgency_level', 'urgency_level'),
+    ('confidence_score', 'confidence_score'),
+    ('recommended_department_id', 'recommended_department_id'),
+    ('recommended_department_name', 'recommended_department__name'),
+    ('icd_suggestions', 'icd_suggestions'),
+    ('alternative_departments', 'alternative_departments'),
+    ('analysis_start_time', 'analysis_start_time'),
+    ('analysis_end_time', 'analysis_end_time'),
+    ('created_at', 'created_at'),
+]
+EXPORT_COLUMNS = [column for column, _ in EXPORT_FIELDS]
+JSON_COLUMNS = ('icd_suggestions', 'alternative_departments')
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class ExportError(ValueError):
+    """Raised for invalid export parameters."""
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """
+    Keep full microsecond precision on datetimes so exported ``created_at``
+    values can be used verbatim in resume cursors.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def parse_cursor(value):
+    """Parse a ``<created_at ISO>,<id>`` resume cursor."""
+    try:
+        created_at, row_id = value.rsplit(',', 1)
+        moment = parse_datetime(created_at)
+        if moment is None:
+            raise ValueError(created_at)
+        return moment, uuid.UUID(row_id)
+    except ValueError:
+        raise ExportError("Cursor must be '<created_at ISO timestamp>,<consultation id>'")
+
+
+def format_cursor(row):
+    """Build the resume cursor for an exported row."""
+    return f"{row['created_at'].isoformat()},{row['id']}"
+
+
+def _parse_bound(value, end_of_day=False):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ExportError(f"Invalid date '{value}'")
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(healthcare_system_id=None, start=None, end=None, cursor=None):
+    """
+    Consultations to export, in stable ``(created_at, id)`` order so an
+    interrupted export can resume from the last cursor it emitted.
+
+    With tenant shards configured an export covers one healthcare system.
+    """
+    if not healthcare_system_id and settings.DATABASE_SHARDS:
+        raise ExportError('healthcare_system is required when consultations are sharded')
+    queryset = Consultation.objects.using(shard_for(healthcare_system_id)).all()
+    if healthcare_system_id:
+        queryset = queryset.filter(healthcare_system_id=healthcare_system_id)
+    if start:
+        queryset = queryset.filter(created_at__gte=_parse_bound(start))
+    if end:
+        queryset = queryset.filter(created_at__lte=_parse_bound(end, end_of_day=True))
+    if cursor:
+        created_at, row_id = parse_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=row_id)
+        )
+    return queryset.order_by('created_at', 'id')
+
+
+def iter_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Yield export rows as dicts through a server-side cursor.
+
+    When a ``progress`` dict is given, ``progress['last_row']`` tracks the
+    most recent row so callers can report a resume cursor.
+    """
+    lookups = [lookup for _, lookup in EXPORT_FIELDS]
+    if connections[queryset.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        # Without server-side cursors (e.g. behind PgBouncer) iterator() would
+        # fetch the whole result, so page through it by keyset instead
+        pages = _keyset_pages(queryset.values_list(*lookups), chunk_size)
+    else:
+        pages = [queryset.values_list(*lookups).iterator(chunk_size=chunk_size)]
+
+    for page in pages:
+        for values in page:
+            row = dict(zip(EXPORT_COLUMNS, values))
+            if progress is not None:
+                progress['last_row'] = row
+            yield row
+
+
+def _keyset_pages(queryset, chunk_size):
+    """Yield ``(created_at, id)``-ordered pages of at most ``chunk_size`` rows."""
+    id_index = EXPORT_COLUMNS.index('id')
+    created_index = EXPORT_COLUMNS.index('created_at')
+    page = list(queryset[:chunk_size])
+    while page:
+        yield page
+        if len(page) < chunk_size:
+            return
+        last = page[-1]
+        page = list(queryset.filter(
+            Q(created_at__gt=last[created_index]) |
+            Q(created_at=last[created_index], id__gt=last[id_index])
+        )[:chunk_size])
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def render_ndjson(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    encoder = ExportJSONEncoder()
+    for batch in _batched(rows, chunk_size):
+        yield ''.join(encoder.encode(row) + '\n' for row in batch).encode('utf-8')
+
+
+def _flat_value(column, value):
+    if value is None:
+        return ''
+    if column in JSON_COLUMNS:
+        return json.dumps(value, cls=ExportJSONEncoder)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def render_csv(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in _batched(rows, chunk_size):
+        for row in batch:
+            writer.writerow([_flat_value(column, row[column]) for column in EXPORT_COLUMNS])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only sink whose buffered bytes are handed out after each row group."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError('Parquet export requires the pyarrow package')
+    return pa, pq
+
+
+def render_parquet(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write one Parquet row group per chunk, yielding bytes as they are produced."""
+    pa, pq = _import_pyarrow()
+
+    schema = pa.schema([
+        ('id', pa.string()),
+        ('healthcare_system_id', pa.string()),
+        ('patient_id', pa.string()),
+        ('symptom_description', pa.string()),
+        ('symptom_duration', pa.string()),
+        ('pain_level', pa.int32()),
+        ('status', pa.string()),
+        ('urgency_level', pa.string()),
+        ('confidence_score', pa.float64()),
+        ('recommended_department_id', pa.string()),
+        ('recommended_department_name', pa.string()),
+        ('icd_suggestions', pa.string()),
+        ('alternative_departments', pa.string()),
+        ('analysis_start_time', pa.timestamp('us', tz='UTC')),
+        ('analysis_end_time', pa.timestamp('us', tz='UTC')),
+        ('created_at', pa.timestamp('us', tz='UTC')),
+    ])
+    string_columns = ('id', 'healthcare_system_id', 'patient_id', 'recommended_department_id')
+
+    def _columnar(batch):
+        columns = {column: [row[column] for row in batch] for column in EXPORT_COLUMNS}
+        for column in string_columns:
+            columns[column] = [str(value) if value is not None else None for value in columns[column]]
+        for column in JSON_COLUMNS:
+            columns[column] = [json.dumps(value, cls=ExportJSONEncoder) for value in columns[column]]
+        columns['confidence_score'] = [
+            float(value) if value is not None else None for value in columns['confidence_score']
+        ]
+        return pa.table(columns, schema=schema)
+
+    sink = _DrainableSink()
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for batch in _batched(rows, chunk_size):
+            writer.write_table(_columnar(batch))
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def gzip_stream(chunks):
+    """Compress a byte stream incrementally into a single gzip member."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# format -> (renderer, content type, file extension)
+EXPORT_FORMATS = {
+    'ndjson': (render_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (render_csv, 'text/csv', 'csv'),
+    'parquet': (render_parquet, 'application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def export_stream(export_format, queryset, compress=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                  progress=None):
+    """Return ``(byte iterator, content type, filename extension)`` for an export."""
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(
+            f"Unknown format '{export_format}'. Choose from: {', '.join(EXPORT_FORMATS)}"
+        )
+    renderer, content_type, extension = EXPORT_FORMATS[export_format]
+    if export_format == 'parquet':
+        # Fail before the response starts streaming
+        _import_pyarrow()
+    stream = renderer(iter_rows(queryset, chunk_size, progress), chunk_size)
+    if compress:
+        return gzip_stream(stream), 'application/gzip', f'{extension}.gz'
+    return stream, content_type, extension
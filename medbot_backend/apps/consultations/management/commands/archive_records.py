@@ -0,0 +1,172 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from apps.consultations.models import (
+    Consultation,
+    ConsultationFeedback,
+    Appointment,
+    AppointmentReminder,
+)
+from apps.healthcare_systems.models import HealthcareSystem
+from apps.healthcare_systems.sharding import shard_aliases
+from apps.n8n_integration.models import N8NExecution, N8NExecutionMetric
+
+# Consultations in these states can be archived once they pass retention
+ARCHIVABLE_CONSULTATION_STATUSES = ['completed', 'finished', 'cancelled', 'error']
+OPEN_APPOINTMENT_STATUSES = ['scheduled', 'confirmed', 'in_progress', 'rescheduled']
+
+# Rollup rows older than this are no longer covered by any dashboard window
+METRIC_RETENTION = timedelta(days=2)
+
+
+class Command(BaseCommand):
+    help = (
+        'Move consultations and n8n executions past their retention period '
+        'into monthly gzip-compressed NDJSON archives and delete them from '
+        'the hot tables'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archive-dir',
+            default=settings.ARCHIVE_ROOT,
+            help='Directory receiving <table>/<YYYY-MM>.ndjson.gz archives'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many rows would be archived'
+        )
+
+    def handle(self, *args, **options):
+        self.archive_dir = Path(options['archive_dir'])
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        now = timezone.now()
+
+        aliases = shard_aliases()
+        for alias in aliases:
+            self.using = alias
+            if len(aliases) > 1:
+                self.stdout.write(f'Database {alias}:')
+
+            executions = N8NExecution.objects.using(alias).filter(
+                created_at__lt=now - timedelta(days=settings.N8N_EXECUTION_RETENTION_DAYS)
+            ).exclude(status='running')
+            self._archive_executions(executions)
+
+            for consultations in self._aged_consultations(now):
+                self._archive_consultations(consultations)
+
+        if not self.dry_run:
+            deleted, _ = N8NExecutionMetric.objects.filter(
+                slot_start__lt=now - METRIC_RETENTION
+            ).delete()
+            self.stdout.write(f'Pruned {deleted} execution metric rows')
+
+        self.stdout.write(self.style.SUCCESS('Archival complete'))
+
+    def _aged_consultations(self, now):
+        """Yield one queryset per retention policy (system override or default)."""
+        base = Consultation.objects.using(self.using).filter(
+            status__in=ARCHIVABLE_CONSULTATION_STATUSES
+        ).exclude(
+            appointments__status__in=OPEN_APPOINTMENT_STATUSES
+        )
+
+        overrides = HealthcareSystem.objects.filter(
+            data_retention_days__isnull=False
+        ).values_list('id', 'data_retention_days')
+        for system_id, days in overrides:
+            yield base.filter(
+                healthcare_system_id=system_id,
+                created_at__lt=now - timedelta(days=days)
+            )
+
+        yield base.filter(
+            Q(healthcare_system__isnull=True) |
+            Q(healthcare_system__data_retention_days__isnull=True),
+            created_at__lt=now - timedelta(days=settings.DATA_RETENTION_DAYS)
+        )
+
+    def _archive_executions(self, queryset):
+        if self.dry_run:
+            self.stdout.write(f'Would archive {queryset.count()} n8n executions')
+            return
+
+        total = 0
+        while True:
+            rows = list(queryset.order_by('created_at', 'id').values()[:self.batch_size])
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            self._write_rows(N8NExecution, rows)
+            N8NExecution.objects.using(self.using).filter(id__in=ids).delete()
+            total += len(rows)
+        self.stdout.write(f'Archived {total} n8n executions')
+
+    def _archive_consultations(self, queryset):
+        if self.dry_run:
+            self.stdout.write(f'Would archive {queryset.count()} consultations')
+            return
+
+        total = 0
+        while True:
+            rows = list(
+                queryset.order_by('created_at', 'id').values()[:self.batch_size]
+            )
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+
+            # Rows removed by the cascade are archived alongside their consultation
+            appointments = list(Appointment.objects.using(self.using).filter(consultation_id__in=ids).values())
+            related = [
+                (N8NExecution, list(N8NExecution.objects.using(self.using).filter(consultation_id__in=ids).values())),
+                (ConsultationFeedback, list(ConsultationFeedback.objects.using(self.using).filter(consultation_id__in=ids).values())),
+                (Appointment, appointments),
+                (AppointmentReminder, list(AppointmentReminder.objects.using(self.using).filter(
+                    appointment_id__in=[appointment['id'] for appointment in appointments]
+                ).values())),
+            ]
+            for model, related_rows in related:
+                self._write_rows(model, related_rows)
+            self._write_rows(Consultation, rows)
+
+            with transaction.atomic(using=self.using):
+                Consultation.objects.using(self.using).filter(id__in=ids).delete()
+            total += len(rows)
+        self.stdout.write(f'Archived {total} consultations')
+
+    def _write_rows(self, model, rows):
+        """
+        Append rows to per-month gzip members and fsync before the caller
+        deletes them, so an interrupted run never loses data.
+        """
+        if not rows:
+            return
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row['created_at'].strftime('%Y-%m'), []).append(row)
+
+        table_dir = self.archive_dir / model._meta.db_table
+        table_dir.mkdir(parents=True, exist_ok=True)
+        for month, month_rows in by_month.items():
+            path = table_dir / f'{month}.ndjson.gz'
+            with open(path, 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='ab') as archive:
+                    for row in month_rows:
+                        archive.write(json.dumps(row, cls=DjangoJSONEncoder).encode('utf-8'))
+                        archive.write(b'\n')
+                raw.flush()
+                os.fsync(raw.fileno())
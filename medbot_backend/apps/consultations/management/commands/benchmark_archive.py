@@ -0,0 +1,109 @@
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.consultations.management.commands.archive_records import Command as ArchiveCommand
+from apps.consultations.models import Consultation
+from apps.healthcare_systems.models import HealthcareSystem
+from apps.healthcare_systems.sharding import shard_for
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure consultation insert and patient-history lookup latency on an empty table, '
+        'with aged history in place, and after archiving that history'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', type=int, default=50000, help='Aged consultations to create')
+        parser.add_argument('--patients', type=int, default=500)
+        parser.add_argument('--samples', type=int, default=500, help='Inserts and lookups per stage')
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        # Only this system's rows are created and archived; its retention is one day
+        system = HealthcareSystem.objects.create(
+            name=f'Archive benchmark {time.time_ns()}', system_type='hospital', address='-', city='-',
+            state='-', zip_code='-', phone_number='-', email='benchmark@example.com',
+            monthly_fee=Decimal('0'), contract_start_date=today, contract_end_date=today + timedelta(days=1),
+            data_retention_days=1,
+        )
+        using = shard_for(system.pk)
+        patients = User.objects.bulk_create([
+            User(username=f'archive-benchmark-{uuid.uuid4().hex[:12]}', password='!')
+            for _ in range(options['patients'])
+        ])
+        consultations = Consultation.objects.using(using).filter(healthcare_system=system)
+        try:
+            self._report('empty', self._measure(system, patients, using, options))
+
+            self._create_history(system, patients, using, options['history'])
+            self._report(f'{options["history"]} aged rows', self._measure(system, patients, using, options))
+
+            with tempfile.TemporaryDirectory() as archive_dir:
+                archive = ArchiveCommand(stdout=self.stdout)
+                archive.archive_dir, archive.batch_size, archive.dry_run, archive.using = (
+                    Path(archive_dir), 1000, False, using
+                )
+                start = time.perf_counter()
+                archive._archive_consultations(consultations.filter(
+                    status='completed', created_at__lt=timezone.now() - timedelta(days=1)
+                ))
+                self.stdout.write(f'  archival took {time.perf_counter() - start:.1f} s')
+            self._report('after archival', self._measure(system, patients, using, options))
+        finally:
+            consultations.delete()
+            User.objects.filter(pk__in=[patient.pk for patient in patients]).delete()
+            system.delete()
+
+    def _create_history(self, system, patients, using, count):
+        ids = []
+        for first in range(0, count, 5000):
+            created = Consultation.objects.using(using).bulk_create([
+                Consultation(
+                    patient=patients[number % len(patients)], healthcare_system=system,
+                    symptom_description='Archived benchmark consultation', status='completed',
+                )
+                for number in range(first, min(first + 5000, count))
+            ])
+            ids.extend(consultation.id for consultation in created)
+        # created_at is auto_now_add; age the rows afterwards, spread over two years
+        now = timezone.now()
+        for month in range(24):
+            Consultation.objects.using(using).filter(id__in=ids[month::24]).update(
+                created_at=now - timedelta(days=30 * (month + 1))
+            )
+
+    def _measure(self, system, patients, using, options):
+        inserts, lookups = [], []
+        for number in range(options['samples']):
+            patient = patients[number % len(patients)]
+            start = time.perf_counter()
+            Consultation.objects.using(using).create(
+                patient=patient, healthcare_system=system, symptom_description='Recent benchmark consultation'
+            )
+            inserts.append((time.perf_counter() - start) * 1000)
+
+            # The patient's consultation history page (patient, -created_at index)
+            start = time.perf_counter()
+            list(Consultation.objects.using(using).filter(patient=patient).order_by('-created_at')[:20])
+            lookups.append((time.perf_counter() - start) * 1000)
+        Consultation.objects.using(using).filter(
+            healthcare_system=system, symptom_description='Recent benchmark consultation'
+        ).delete()
+        return inserts, lookups
+
+    def _report(self, stage, timings):
+        self.stdout.write(f'{stage}:')
+        for name, values in zip(('insert', 'history lookup'), timings):
+            values.sort()
+            self.stdout.write(
+                f'  {name:<15} p50 {statistics.median(values):6.2f} ms  '
+                f'p99 {values[int(len(values) * 0.99)]:6.2f} ms'
+            )
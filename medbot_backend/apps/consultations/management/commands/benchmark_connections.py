@@ -0,0 +1,72 @@
+import statistics
+import time
+from wsgiref.util import setup_testing_defaults
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure requests per second through the WSGI handler with a new database connection '
+        'per request (CONN_MAX_AGE=0) against persistent connections'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--path', default='/api/auth/status/', help='Authenticated GET endpoint to call')
+
+    def handle(self, *args, **options):
+        user = User.objects.create(username=f'connection-benchmark-{time.time_ns()}', password='!')
+        environ = {
+            'PATH_INFO': options['path'],
+            'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}',
+        }
+        setup_testing_defaults(environ)
+        configured = connection.settings_dict['CONN_MAX_AGE']
+        try:
+            # The request signals open and close connections exactly as in production
+            hosts = [*settings.ALLOWED_HOSTS, environ['HTTP_HOST']]
+            with override_settings(RATE_LIMIT_ENABLED=False, ALLOWED_HOSTS=hosts):
+                handler = WSGIHandler()
+                for name, max_age in (('CONN_MAX_AGE=0', 0), (f'CONN_MAX_AGE={configured or 60}', configured or 60)):
+                    connection.settings_dict['CONN_MAX_AGE'] = max_age
+                    connection.close()
+                    self._report(name, *self._run(handler, environ, options['requests']))
+        finally:
+            connection.settings_dict['CONN_MAX_AGE'] = configured
+            connection.close()
+            User.objects.filter(pk=user.pk).delete()
+
+    def _run(self, handler, environ, count):
+        connects = []
+
+        def connected(sender, connection, **kwargs):
+            connects.append(connection.alias)
+
+        timings = []
+        connection_created.connect(connected)
+        try:
+            start = time.perf_counter()
+            for _ in range(count):
+                request_start = time.perf_counter()
+                response = handler(dict(environ), lambda status, headers, exc_info=None: None)
+                b''.join(response)
+                response.close()
+                timings.append((time.perf_counter() - request_start) * 1000)
+            elapsed = time.perf_counter() - start
+        finally:
+            connection_created.disconnect(connected)
+        return count / elapsed, len(connects), timings
+
+    def _report(self, name, rate, connects, timings):
+        timings.sort()
+        self.stdout.write(
+            f'{name:<18} {rate:7.1f} requests/s  {connects} connections opened  '
+            f'p50 {statistics.median(timings):6.2f} ms  p99 {timings[int(len(timings) * 0.99)]:6.2f} ms'
+        )
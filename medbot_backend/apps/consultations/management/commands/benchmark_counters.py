@@ -0,0 +1,95 @@
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from apps.healthcare_systems.models import HealthcareSystem
+from medbot import counters
+
+
+class UpdateMeter:
+    """Counts UPDATE statements and the time spent in them, row-lock waits included."""
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith('UPDATE'):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.statements += 1
+                self.seconds += time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        'Increment one hot occupancy counter from many threads by read-modify-write save(), '
+        'by an UPDATE per event and write-behind, and report lost updates and time in row UPDATEs'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--events', type=int, default=200, help='Increments per thread')
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        system = HealthcareSystem.objects.create(
+            name=f'Counter benchmark {time.time_ns()}', system_type='hospital', address='-', city='-',
+            state='-', zip_code='-', phone_number='-', email='benchmark@example.com',
+            monthly_fee=Decimal('0'), contract_start_date=today, contract_end_date=today + timedelta(days=1),
+        )
+        expected = options['threads'] * options['events']
+        try:
+            for name, event in (
+                ('save()', self._save), ('UPDATE per event', self._update), ('write-behind', self._increment)
+            ):
+                HealthcareSystem.objects.filter(pk=system.pk).update(current_occupancy=0)
+                meter = UpdateMeter()
+                start = time.perf_counter()
+                self._hammer(system.pk, event, meter, options)
+                with connection.execute_wrapper(meter):
+                    counters.flush()
+                elapsed = time.perf_counter() - start
+                total = HealthcareSystem.objects.get(pk=system.pk).current_occupancy
+                self.stdout.write(
+                    f'{name:<17} {total}/{expected} counted ({expected - total} lost), '
+                    f'{meter.statements} row UPDATEs taking {meter.seconds * 1000:.0f} ms, '
+                    f'{expected / elapsed:.0f} events/s'
+                )
+        finally:
+            system.delete()
+
+    def _hammer(self, pk, event, meter, options):
+        def work():
+            try:
+                with connection.execute_wrapper(meter):
+                    for _ in range(options['events']):
+                        event(pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _save(self, pk):
+        system = HealthcareSystem.objects.get(pk=pk)
+        system.current_occupancy += 1
+        system.save(update_fields=['current_occupancy'])
+
+    def _update(self, pk):
+        HealthcareSystem.objects.filter(pk=pk).update(current_occupancy=F('current_occupancy') + 1)
+
+    def _increment(self, pk):
+        counters.increment(HealthcareSystem, pk, current_occupancy=1)
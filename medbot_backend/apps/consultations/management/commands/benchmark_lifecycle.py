@@ -0,0 +1,85 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from apps.consultations.models import Consultation
+from apps.consultations.transitions import complete_analysis, record_execution
+from apps.users.models import User
+
+RESULTS = {
+    'confidence_score': 0.85,
+    'urgency_level': 'medium',
+    'icd_codes': [{'code': 'R51', 'description': 'Headache', 'confidence': 0.8}] * 3,
+    'alternatives': [],
+}
+
+
+class WriteMeter:
+    """Counts UPDATE statements and the bytes of SQL and parameters they send."""
+
+    def __init__(self):
+        self.statements = 0
+        self.bytes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('UPDATE'):
+            self.statements += 1
+            self.bytes += len(sql.encode()) + sum(len(str(param).encode()) for param in params or ())
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare write volume and latency of a consultation analysis lifecycle '
+        'using full save() calls versus conditional status transitions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200)
+        parser.add_argument('--description-length', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(username=f'lifecycle-benchmark-{time.time_ns()}')
+        description = ('Persistent headache with nausea. ' * 100)[:options['description_length']]
+        aliases = {'default'}
+        try:
+            for name, lifecycle in (('save()', self._full_save), ('transitions', self._transitions)):
+                timings, meter = [], WriteMeter()
+                for _ in range(options['count']):
+                    consultation = Consultation.objects.create(
+                        patient=user, symptom_description=description,
+                        status='analyzing', analysis_start_time=timezone.now()
+                    )
+                    aliases.add(consultation._state.db)
+                    with connections[consultation._state.db].execute_wrapper(meter):
+                        start = time.perf_counter()
+                        lifecycle(consultation)
+                        timings.append((time.perf_counter() - start) * 1000)
+                self.stdout.write(
+                    f'{name:<12} {meter.statements / options["count"]:.1f} UPDATEs, '
+                    f'{meter.bytes / options["count"]:.0f} bytes written, '
+                    f'{statistics.median(timings):.2f} ms median per lifecycle'
+                )
+        finally:
+            for alias in aliases:
+                Consultation.objects.using(alias).filter(patient_id=user.id).delete()
+            user.delete()
+
+    def _full_save(self, consultation):
+        """The lifecycle as written before transitions."""
+        consultation.n8n_execution_id = 'benchmark'
+        consultation.save()
+        # The callback loads the row, sets the results and saves everything
+        consultation = Consultation.objects.using(consultation._state.db).get(id=consultation.id)
+        consultation.confidence_score = RESULTS['confidence_score']
+        consultation.urgency_level = RESULTS['urgency_level']
+        consultation.icd_suggestions = RESULTS['icd_codes']
+        consultation.alternative_departments = RESULTS['alternatives']
+        consultation.status = 'completed'
+        consultation.analysis_end_time = timezone.now()
+        consultation.save()
+
+    def _transitions(self, consultation):
+        record_execution(consultation, 'benchmark')
+        complete_analysis(consultation.id, RESULTS, using=consultation._state.db)
@@ -0,0 +1,104 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from apps.consultations.models import Consultation
+from apps.departments.models import Department
+from apps.symptoms.serializers import ConsultationSerializer
+from apps.users.models import User
+from medbot.compression import brotli, compress_bytes
+from medbot.renderers import FastJSONRenderer, orjson
+
+WORDS = (
+    'persistent headache nausea fever since morning worse when lying down '
+    'mild chest tightness shortness of breath dizziness fatigue cough'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark rendering time and bytes on the wire for consultation '
+        'history pages, comparing the DRF and orjson renderers and compression'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', default='20,50,100,200,500')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        page_sizes = [int(size) for size in options['page_sizes'].split(',')]
+        repeat = options['repeat']
+        self.stdout.write(
+            f"orjson: {'yes' if orjson else 'no'}, brotli: {'yes' if brotli else 'no'}, "
+            f"median of {repeat} runs"
+        )
+        self.stdout.write(
+            f"{'rows':>5} {'serialize ms':>12} {'drf ms':>8} {'orjson ms':>9} "
+            f"{'raw KB':>8} {'gzip KB':>8} {'gzip ms':>8} {'br KB':>7} {'br ms':>7}"
+        )
+
+        rng = random.Random(42)
+        for size in page_sizes:
+            consultations = [self._consultation(rng) for _ in range(size)]
+            serialize_ms, data = self._time(
+                lambda: {'count': size, 'next': None, 'previous': None,
+                         'results': ConsultationSerializer(consultations, many=True).data},
+                repeat
+            )
+            drf_ms, body = self._time(lambda: JSONRenderer().render(data), repeat)
+            fast_ms, fast_body = self._time(lambda: FastJSONRenderer().render(data), repeat)
+            if fast_body != body:
+                self.stderr.write(self.style.WARNING(f'{size} rows: renderer outputs differ'))
+
+            gzip_ms, gzipped = self._time(lambda: compress_bytes(body, 'gzip'), repeat)
+            br_kb = br_ms = '-'
+            if brotli is not None:
+                br_ms, brotlied = self._time(lambda: compress_bytes(body, 'br'), repeat)
+                br_kb, br_ms = f'{len(brotlied) / 1024:.1f}', f'{br_ms:.2f}'
+
+            self.stdout.write(
+                f'{size:>5} {serialize_ms:>12.2f} {drf_ms:>8.2f} {fast_ms:>9.2f} '
+                f'{len(body) / 1024:>8.1f} {len(gzipped) / 1024:>8.1f} {gzip_ms:>8.2f} '
+                f'{br_kb:>7} {br_ms:>7}'
+            )
+
+    def _time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), result
+
+    def _consultation(self, rng):
+        """An unsaved consultation shaped like a completed analysis."""
+        started = timezone.now() - timedelta(days=rng.randint(0, 365))
+        return Consultation(
+            id=uuid.uuid4(),
+            patient=User(id=uuid.uuid4(), first_name='Jordan', last_name='Lee'),
+            symptom_description=' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 160))),
+            symptom_duration=f'{rng.randint(1, 14)} days',
+            pain_level=rng.randint(1, 10),
+            additional_info=' '.join(rng.choice(WORDS) for _ in range(20)),
+            recommended_department=Department(id=uuid.uuid4(), name='Internal Medicine'),
+            confidence_score=round(rng.random(), 4),
+            urgency_level=rng.choice(['low', 'medium', 'high']),
+            icd_suggestions=[
+                {'code': f'R{rng.randint(0, 99):02d}.{rng.randint(0, 9)}',
+                 'description': ' '.join(rng.choice(WORDS) for _ in range(6)),
+                 'confidence': round(rng.random(), 3)}
+                for _ in range(5)
+            ],
+            alternative_departments=[
+                {'id': str(uuid.uuid4()), 'name': 'Neurology', 'confidence': round(rng.random(), 3)}
+                for _ in range(3)
+            ],
+            status='completed',
+            analysis_start_time=started,
+            analysis_end_time=started + timedelta(seconds=rng.randint(5, 60)),
+            created_at=started,
+        )
@@ -0,0 +1,55 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from apps.consultations.exports import (
+    DEFAULT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    ExportError,
+    export_queryset,
+    export_stream,
+    format_cursor,
+)
+
+
+class Command(BaseCommand):
+    help = 'Stream consultations and outcomes to a file in NDJSON, CSV or Parquet format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Output file path, or '-' for stdout")
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--healthcare-system', help='Healthcare system ID to export')
+        parser.add_argument('--start', help='Earliest created_at (date or ISO timestamp)')
+        parser.add_argument('--end', help='Latest created_at (date or ISO timestamp)')
+        parser.add_argument('--cursor', help="Resume after '<created_at>,<id>'")
+        parser.add_argument('--gzip', action='store_true', help='Gzip-compress the output')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        progress = {}
+        try:
+            queryset = export_queryset(
+                healthcare_system_id=options['healthcare_system'],
+                start=options['start'],
+                end=options['end'],
+                cursor=options['cursor'],
+            )
+            stream, _, _ = export_stream(
+                options['format'],
+                queryset,
+                compress=options['gzip'],
+                chunk_size=options['chunk_size'],
+                progress=progress,
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in stream:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+
+        # Report where a follow-up run should resume
+        if 'last_row' in progress:
+            self.stderr.write(f"Resume cursor: {format_cursor(progress['last_row'])}")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from medbot import counters
+
+
+class Command(BaseCommand):
+    help = 'Write pending write-behind counter deltas (doctor totals and ratings, occupancy) to the database'
+
+    def handle(self, *args, **options):
+        statements = counters.flush()
+        self.stdout.write(self.style.SUCCESS(f'Flushed counters in {statements} UPDATE statements'))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['patient', '-created_at'], name='consultatio_patient_cae0dd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['created_at'], name='consultatio_created_c723b7_idx'),
+        ),
+    ]
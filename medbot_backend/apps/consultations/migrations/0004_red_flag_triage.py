@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0003_shard_user_references'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultation',
+            name='red_flag_triage',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -20,10 +20,13 @@ class Consultation(models.Model):
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Users live on the default database while consultations may be on a
+    # tenant shard, so user references are not enforced by the database
     patient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='consultations'
+        related_name='consultations',
+        db_constraint=False
     )
     healthcare_system = models.ForeignKey(
         'healthcare_systems.HealthcareSystem',
@@ -56,6 +59,9 @@ class Consultation(models.Model):
         validators=[MinValueValidator(0.0000), MaxValueValidator(1.0000)]
     )
     urgency_level = models.CharField(max_length=20, null=True, blank=True)
+    # The urgency and department come only from the inline red-flag matcher,
+    # so the AI analysis may still revise them
+    red_flag_triage = models.BooleanField(default=False)
     icd_suggestions = models.JSONField(default=list)
     alternative_departments = models.JSONField(default=list)
 
@@ -80,6 +86,10 @@ class Consultation(models.Model):
     class Meta:
         db_table = 'consultations'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient', '-created_at']),
+            models.Index(fields=['created_at']),
+        ]
 
 
 class ConsultationFeedback(models.Model):
@@ -141,12 +151,14 @@ class Appointment(models.Model):
     patient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='appointments'
+        related_name='appointments',
+        db_constraint=False
     )
     doctor = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='doctor_appointments'
+        related_name='doctor_appointments',
+        db_constraint=False
     )
     department = models.ForeignKey('departments.Department', on_delete=models.CASCADE)
     healthcare_system = models.ForeignKey(
@@ -0,0 +1,125 @@
+from datetime import datetime
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from apps.departments.wait_times import FINISH, LEAVE, START, WAIT, record_event
+from .counters import FEEDBACK_SCORES, count_appointment, count_feedback, feedback_score
+from .models import Appointment, Consultation, ConsultationFeedback
+
+# Status -> department queue event for the consultation's visit
+CONSULTATION_EVENTS = {
+    'scheduled': WAIT,
+    'in_progress': START,
+    'finished': FINISH,
+    'cancelled': LEAVE,
+}
+APPOINTMENT_EVENTS = {
+    'scheduled': WAIT,
+    'confirmed': WAIT,
+    'rescheduled': WAIT,
+    'in_progress': START,
+    'completed': FINISH,
+    'cancelled': LEAVE,
+    'no_show': LEAVE,
+}
+
+
+def appointment_due(appointment):
+    """Epoch seconds of the appointment's booked slot."""
+    booked = datetime.combine(appointment.scheduled_date, appointment.scheduled_time)
+    if timezone.is_naive(booked):
+        booked = timezone.make_aware(booked)
+    return booked.timestamp()
+
+
+@receiver(post_save, sender=Consultation)
+def track_consultation_visit(sender, instance, using, update_fields=None, **kwargs):
+    """Feed department wait-time estimates; only status changes are events."""
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    event = CONSULTATION_EVENTS.get(instance.status)
+    if event and instance.recommended_department_id:
+        args = (event, instance.id, instance.healthcare_system_id, instance.recommended_department_id)
+        transaction.on_commit(lambda: record_event(*args), using=using)
+
+
+@receiver(post_save, sender=Appointment)
+def track_appointment_visit(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    event = APPOINTMENT_EVENTS.get(instance.status)
+    if event:
+        args = (event, instance.consultation_id, instance.healthcare_system_id, instance.department_id)
+        due = appointment_due(instance) if event == WAIT else None
+        transaction.on_commit(lambda: record_event(*args, due=due), using=using)
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=Consultation)
+def forget_deleted_visit(sender, instance, using, **kwargs):
+    visit_id = instance.consultation_id if sender is Appointment else instance.id
+    transaction.on_commit(lambda: record_event(LEAVE, visit_id, None, None), using=using)
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_status(sender, instance, **kwargs):
+    # __dict__ so a deferred status is not fetched
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Appointment)
+def count_appointment_status(sender, instance, using, created, update_fields=None, **kwargs):
+    """Doctor consultation totals and system occupancy follow status changes."""
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    old_status = None if created else instance._loaded_status
+    args = (instance.doctor_id, instance.healthcare_system_id, old_status, instance.status)
+    instance._loaded_status = instance.status
+    transaction.on_commit(lambda: count_appointment(*args), using=using)
+
+
+@receiver(post_delete, sender=Appointment)
+def uncount_deleted_appointment(sender, instance, using, **kwargs):
+    args = (instance.doctor_id, instance.healthcare_system_id, instance._loaded_status, None)
+    transaction.on_commit(lambda: count_appointment(*args), using=using)
+
+
+@receiver(post_init, sender=ConsultationFeedback)
+def remember_feedback_score(sender, instance, **kwargs):
+    loaded = all(field in instance.__dict__ for field in FEEDBACK_SCORES)
+    instance._loaded_score = feedback_score(instance) if loaded else None
+
+
+def feedback_doctor(feedback, using):
+    """The doctor of the consultation's latest completed appointment, if any."""
+    return Appointment.objects.using(using).filter(
+        consultation_id=feedback.consultation_id, status='completed'
+    ).order_by('-scheduled_date', '-scheduled_time').values_list('doctor_id', flat=True).first()
+
+
+@receiver(post_save, sender=ConsultationFeedback)
+def count_feedback_scores(sender, instance, using, created, update_fields=None, **kwargs):
+    """Keep the doctor's running rating totals; edits add the score difference."""
+    if update_fields is not None and not set(FEEDBACK_SCORES) & set(update_fields):
+        return
+    score = feedback_score(instance)
+    if created:
+        score_delta, count_delta = score, len(FEEDBACK_SCORES)
+    elif instance._loaded_score is not None:
+        score_delta, count_delta = score - instance._loaded_score, 0
+    else:
+        return
+    instance._loaded_score = score
+    if score_delta or count_delta:
+        doctor_id = feedback_doctor(instance, using)
+        transaction.on_commit(lambda: count_feedback(doctor_id, score_delta, count_delta), using=using)
+
+
+@receiver(pre_delete, sender=ConsultationFeedback)
+def uncount_deleted_feedback(sender, instance, using, **kwargs):
+    # Before the delete: a cascade from the consultation removes its appointments too
+    if instance._loaded_score is not None:
+        doctor_id = feedback_doctor(instance, using)
+        args = (doctor_id, -instance._loaded_score, -len(FEEDBACK_SCORES))
+        transaction.on_commit(lambda: count_feedback(*args), using=using)
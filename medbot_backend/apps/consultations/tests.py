@@ -1,3 +1,244 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.departments.models import Department
+from apps.healthcare_systems.models import HealthcareSystem
+from apps.n8n_integration.models import N8NExecution, N8NWorkflow
+from apps.users.models import DoctorProfile, User
+from medbot import counters
+from .exports import export_queryset, iter_rows
+from .models import Appointment, Consultation, ConsultationFeedback
 
-# Create your tests here.
+
+@override_settings(COUNTER_FLUSH_INTERVAL=0)
+class ConsultationCounterTest(TestCase):
+    """Appointment status changes and feedback keep doctor and occupancy counters."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(
+            name='Cardiology', description='Heart', urgency_level='routine', average_wait_time=30
+        )
+        cls.system = HealthcareSystem.objects.create(
+            name='General', system_type='hospital', address='1 Main St', city='Springfield',
+            state='IL', zip_code='62701', phone_number='555-0100', email='info@example.com',
+            monthly_fee=Decimal('100.00'), contract_start_date=timezone.now().date(),
+            contract_end_date=timezone.now().date() + timedelta(days=365),
+        )
+        cls.patient = User.objects.create_user(username='rated', password='x')
+        cls.doctor = User.objects.create_user(username='doctor', password='x')
+        cls.profile = DoctorProfile.objects.create(
+            user=cls.doctor, license_number='L-1', specialization=cls.department, years_of_experience=5,
+            education='MD', consultation_fee=Decimal('50.00')
+        )
+
+    def setUp(self):
+        counters.flush()
+
+    def test_appointments_and_feedback(self):
+        consultation = Consultation.objects.create(
+            patient=self.patient, healthcare_system=self.system, symptom_description='Palpitations',
+            recommended_department=self.department, status='completed'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                consultation=consultation, patient=self.patient, doctor=self.doctor,
+                department=self.department, healthcare_system=self.system,
+                scheduled_date=timezone.now().date(), scheduled_time=timezone.now().time(),
+                appointment_type='consultation', status='in_progress'
+            )
+        counters.flush()
+        self.system.refresh_from_db()
+        self.assertEqual(self.system.current_occupancy, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.get()
+            appointment.status = 'completed'
+            appointment.save(update_fields=['status', 'updated_at'])
+            ConsultationFeedback.objects.create(
+                consultation=consultation, accuracy_rating=5, helpfulness_rating=4, speed_rating=3,
+                would_recommend=True
+            )
+        counters.flush()
+        self.system.refresh_from_db()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.system.current_occupancy, 0)
+        self.assertEqual(self.profile.total_consultations, 1)
+        self.assertEqual((self.profile.rating_sum, self.profile.rating_count), (12, 3))
+        self.assertEqual(self.profile.rating, Decimal('4.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feedback = ConsultationFeedback.objects.get()
+            feedback.speed_rating = 1
+            feedback.save()
+        counters.flush()
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.rating_sum, self.profile.rating_count), (10, 3))
+        self.assertEqual(self.profile.rating, Decimal('3.33'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            consultation.delete()
+        counters.flush()
+        self.profile.refresh_from_db()
+        self.assertEqual(
+            (self.profile.rating_sum, self.profile.rating_count, self.profile.rating, self.profile.total_consultations),
+            (0, 0, Decimal('0.00'), 0)
+        )
+
+
+class ConsultationExportScopeTest(TestCase):
+    """Clinic admins export only their own healthcare system; system admins any."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.systems = [
+            HealthcareSystem.objects.create(
+                name=name, system_type='hospital', address='1 Main St', city='Springfield',
+                state='IL', zip_code='62701', phone_number='555-0100', email='info@example.com',
+                monthly_fee=Decimal('100.00'), contract_start_date=timezone.now().date(),
+                contract_end_date=timezone.now().date() + timedelta(days=365),
+            )
+            for name in ('North', 'South')
+        ]
+        patient = User.objects.create_user(username='exported', password='x')
+        for system in cls.systems:
+            Consultation.objects.create(patient=patient, healthcare_system=system, symptom_description=system.name)
+        cls.clinic_admin = User.objects.create_user(
+            username='clinic', password='x', user_type='clinic_admin', healthcare_system=cls.systems[0]
+        )
+        cls.admin = User.objects.create_user(username='admin', password='x', user_type='admin')
+
+    def export(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/consultations/export/', params)
+        if response.status_code != 200:
+            return response.status_code, None
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        return 200, sorted(json.loads(row)['symptom_description'] for row in rows)
+
+    def test_clinic_admin_is_scoped(self):
+        self.assertEqual(self.export(self.clinic_admin), (200, ['North']))
+        self.assertEqual(self.export(self.clinic_admin, healthcare_system=self.systems[1].id), (403, None))
+        unassigned = User.objects.create_user(username='unassigned', password='x', user_type='clinic_admin')
+        self.assertEqual(self.export(unassigned), (403, None))
+
+    def test_system_admin_exports_any_system(self):
+        self.assertEqual(self.export(self.admin), (200, ['North', 'South']))
+        self.assertEqual(self.export(self.admin, healthcare_system=self.systems[1].id), (200, ['South']))
+
+
+class ConsultationExportPagingTest(TestCase):
+    """Behind a transaction pooler exports page by keyset instead of a server-side cursor."""
+
+    def test_connections_are_persistent_and_checked(self):
+        self.assertGreater(connection.settings_dict['CONN_MAX_AGE'], 0)
+        self.assertTrue(connection.settings_dict['CONN_HEALTH_CHECKS'])
+
+    def test_keyset_pages_match_cursor(self):
+        patient = User.objects.create_user(username='exported', password='x')
+        consultations = [
+            Consultation.objects.create(patient=patient, symptom_description=f'Visit {number}')
+            for number in range(7)
+        ]
+        # Ties on created_at across page boundaries are broken by id
+        moment = timezone.now() - timedelta(days=1)
+        Consultation.objects.filter(pk__in=[c.pk for c in consultations[1:5]]).update(created_at=moment)
+
+        streamed = [row['id'] for row in iter_rows(export_queryset(), chunk_size=2)]
+        with mock.patch.dict(connection.settings_dict, DISABLE_SERVER_SIDE_CURSORS=True):
+            with self.assertNumQueries(4):
+                paged = [row['id'] for row in iter_rows(export_queryset(), chunk_size=2)]
+        self.assertEqual(paged, streamed)
+        self.assertEqual(sorted(paged), sorted(c.id for c in consultations))
+
+
+@override_settings(DATA_RETENTION_DAYS=365, N8N_EXECUTION_RETENTION_DAYS=90)
+class ArchiveRecordsTest(TestCase):
+    """Aged rows move to monthly archives with what their deletion cascades to; the rest stays."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.short, cls.default = (
+            HealthcareSystem.objects.create(
+                name=name, system_type='hospital', address='1 Main St', city='Springfield',
+                state='IL', zip_code='62701', phone_number='555-0100', email='info@example.com',
+                monthly_fee=Decimal('100.00'), contract_start_date=timezone.now().date(),
+                contract_end_date=timezone.now().date() + timedelta(days=365), data_retention_days=days,
+            )
+            for name, days in (('Short retention', 30), ('Default retention', None))
+        )
+        cls.patient = User.objects.create_user(username='archived', password='x')
+        cls.workflow = N8NWorkflow.objects.create(
+            name='Symptom analysis', workflow_type='symptom_analysis', n8n_workflow_id='wf-1',
+            version='1', description='Analysis', webhook_url='https://n8n.example.com/webhook/analysis'
+        )
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive_dir = Path(archive_dir.name)
+
+    def consultation(self, system, days_ago, status='completed'):
+        consultation = Consultation.objects.create(
+            patient=self.patient, healthcare_system=system, symptom_description=f'{system.name} {days_ago}',
+            status=status
+        )
+        Consultation.objects.filter(pk=consultation.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return consultation
+
+    def archive(self, *args):
+        call_command('archive_records', '--archive-dir', str(self.archive_dir), *args, stdout=StringIO())
+
+    def archived(self, model):
+        rows = []
+        for path in sorted((self.archive_dir / model._meta.db_table).glob('*.ndjson.gz')):
+            with gzip.open(path, 'rt') as archive:
+                rows.extend(json.loads(line) for line in archive)
+        return rows
+
+    def test_archive(self):
+        aged_short = self.consultation(self.short, 60)
+        kept_short = self.consultation(self.short, 10)
+        aged_default = self.consultation(self.default, 400)
+        kept_default = self.consultation(self.default, 60)
+        still_analyzing = self.consultation(self.short, 60, status='analyzing')
+        ConsultationFeedback.objects.create(
+            consultation=aged_short, accuracy_rating=5, helpfulness_rating=5, speed_rating=5, would_recommend=True
+        )
+        execution = N8NExecution.objects.create(
+            workflow=self.workflow, consultation=aged_short, n8n_execution_id='exec-1', input_data={},
+            status='success', start_time=timezone.now()
+        )
+
+        self.archive('--dry-run')
+        self.assertEqual(Consultation.objects.count(), 5)
+        self.assertFalse(self.archive_dir.exists() and any(self.archive_dir.iterdir()))
+
+        self.archive()
+        self.assertEqual(
+            set(Consultation.objects.values_list('id', flat=True)),
+            {kept_short.id, kept_default.id, still_analyzing.id}
+        )
+        self.assertEqual(
+            sorted(row['id'] for row in self.archived(Consultation)), sorted([str(aged_short.id), str(aged_default.id)])
+        )
+        # Rows removed by the cascade are archived too, in their own tables
+        self.assertEqual([row['id'] for row in self.archived(N8NExecution)], [str(execution.id)])
+        self.assertEqual([row['consultation_id'] for row in self.archived(ConsultationFeedback)], [str(aged_short.id)])
+        self.assertFalse(N8NExecution.objects.exists())
+
+        # Archives are appended to, never rewritten
+        self.consultation(self.short, 90)
+        self.archive()
+        self.assertEqual(len(self.archived(Consultation)), 3)
@@ -0,0 +1,126 @@
+"""
+Consultation status transitions.
+
+Each transition is one ``UPDATE ... WHERE id = %s AND status IN (...)``
+writing only the columns it changes, so it never rewrites the symptom text
+and a late or duplicate callback cannot undo a transition that already
+happened (e.g. complete a consultation that was marked as ``error``).
+Transitions return whether they were applied.
+"""
+
+import logging
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from apps.departments.models import Department
+from apps.healthcare_systems.sharding import shard_aliases
+from .models import Consultation
+
+logger = logging.getLogger(__name__)
+
+# Statuses from which an analysis can still finish, one way or the other
+ANALYSIS_PENDING_STATUSES = ('initiated', 'analyzing')
+
+# Set by the inline red-flag triage or a clinician; the AI analysis may
+# revise the former only
+EMERGENCY_URGENCY = 'emergency'
+
+
+def transition(consultation_id, from_statuses, to_status, using=None, **changes):
+    """
+    Move a consultation in one of ``from_statuses`` to ``to_status``, also
+    writing ``changes``. Without ``using``, every shard is tried in turn.
+    """
+    changes.update(status=to_status, updated_at=timezone.now())
+    for alias in [using] if using else shard_aliases():
+        updated = Consultation.objects.using(alias).filter(
+            id=consultation_id, status__in=from_statuses
+        ).update(**changes)
+        if updated:
+            return True
+    return False
+
+
+def current_status(consultation_id, using=None):
+    """Status of a consultation, or ``None`` if it does not exist."""
+    for alias in [using] if using else shard_aliases():
+        status = Consultation.objects.using(alias).filter(
+            id=consultation_id
+        ).values_list('status', flat=True).first()
+        if status is not None:
+            return status
+    return None
+
+
+def claim_analysis(consultation_id, using=None, stalled_before=None):
+    """
+    ``initiated`` -> ``analyzing`` for the one dispatcher that may trigger
+    the analysis. With ``stalled_before``, an analysis claimed before then
+    that never recorded an n8n execution (its dispatcher died) can be
+    claimed again.
+    """
+    claimable = Q(status='initiated')
+    if stalled_before is not None:
+        claimable |= Q(status='analyzing', n8n_execution_id='', updated_at__lt=stalled_before)
+    for alias in [using] if using else shard_aliases():
+        if Consultation.objects.using(alias).filter(claimable, id=consultation_id).update(
+            status='analyzing', updated_at=timezone.now()
+        ):
+            return True
+    return False
+
+
+def record_execution(consultation, execution_id):
+    """Store the n8n execution id; the status is left to the callbacks."""
+    consultation.n8n_execution_id = execution_id
+    consultation.save(update_fields=['n8n_execution_id', 'updated_at'])
+
+
+def _unless_emergency(field, value):
+    """
+    Write ``value`` to ``field``, except on emergencies that were not set by
+    the red-flag matcher alone.
+    """
+    output_field = Consultation._meta.get_field(field)
+    return Case(
+        When(urgency_level=EMERGENCY_URGENCY, red_flag_triage=False, then=F(field)),
+        default=Value(value, output_field=output_field),
+        output_field=output_field,
+    )
+
+
+def analysis_result_fields(results):
+    """
+    Consultation columns for n8n analysis results. The analysis confirms or
+    revises a red-flag triage, which matches keywords only; an emergency
+    set any other way keeps its urgency and department whatever the
+    analysis says, and only a clinician changes those.
+    """
+    fields = {
+        'confidence_score': results.get('confidence_score'),
+        'urgency_level': _unless_emergency('urgency_level', results.get('urgency_level')),
+        'icd_suggestions': results.get('icd_codes', []),
+        'alternative_departments': results.get('alternatives', []),
+        'analysis_end_time': timezone.now(),
+    }
+    department_id = results.get('department_id')
+    if department_id:
+        if Department.objects.filter(id=department_id).exists():
+            fields['recommended_department_id'] = _unless_emergency('recommended_department_id', department_id)
+        else:
+            logger.warning(f"Department with ID {department_id} not found")
+    # Set last: the conditions above read the stored value
+    fields['red_flag_triage'] = False
+    return fields
+
+
+def complete_analysis(consultation_id, results, using=None):
+    """``analyzing`` -> ``completed`` with the analysis results."""
+    return transition(
+        consultation_id, ANALYSIS_PENDING_STATUSES, 'completed', using=using,
+        **analysis_result_fields(results)
+    )
+
+
+def fail_analysis(consultation_id, using=None):
+    """``analyzing`` -> ``error``; a completed analysis is kept."""
+    return transition(consultation_id, ANALYSIS_PENDING_STATUSES, 'error', using=using)
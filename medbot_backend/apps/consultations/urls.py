@@ -1,2 +1,6 @@
 from django.urls import path
-urlpatterns = []
+from .views import export_consultations
+
+urlpatterns = [
+    path('export/', export_consultations, name='export_consultations'),
+]
@@ -1,3 +1,59 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .exports import ExportError, export_queryset, export_stream
+from apps.authentication.permissions import (
+    Capability,
+    has_capability,
+    has_global_role,
+    request_capabilities,
+    require,
+)
 
-# Create your views here.
+
+@api_view(['GET'])
+@permission_classes([require(Capability.EXPORT_CONSULTATIONS)])
+def export_consultations(request):
+    """
+    Stream consultations and their outcomes as NDJSON, CSV or Parquet.
+
+    Query parameters: export_format, healthcare_system, start, end, cursor
+    (``<created_at>,<id>`` of the last row already received) and gzip.
+    """
+    params = request.query_params
+    user = request.user
+    healthcare_system_id = params.get('healthcare_system')
+    if not has_global_role(user):
+        # Scoped roles may only export their own healthcare system
+        healthcare_system_id = healthcare_system_id or user.healthcare_system_id
+        if healthcare_system_id is None or not has_capability(
+            user,
+            Capability.EXPORT_CONSULTATIONS,
+            healthcare_system_id=healthcare_system_id,
+            capabilities=request_capabilities(request),
+        ):
+            return Response({
+                'error': 'You can only export consultations for your healthcare system'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        queryset = export_queryset(
+            healthcare_system_id=healthcare_system_id,
+            start=params.get('start'),
+            end=params.get('end'),
+            cursor=params.get('cursor'),
+        )
+        stream, content_type, extension = export_stream(
+            params.get('export_format', 'ndjson'),
+            queryset,
+            compress=params.get('gzip') in ['1', 'true'],
+        )
+    except ExportError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    filename = f"consultations-{timezone.now():%Y%m%d%H%M%S}.{extension}"
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,170 @@
+"""
+In-memory interval index from ICD-10 codes to departments.
+
+``Department.icd_code_ranges`` entries are ``"I00-I99"`` ranges, single
+codes or categories (``"R51"``) or ``{"start": ..., "end": ...}`` objects.
+Codes are normalized to upper case without the dot and compared
+lexicographically; a range end covers every code it prefixes, so
+``"I00-I99"`` includes ``I99.8``.
+
+The range boundaries are kept sorted with the departments covering each gap
+between consecutive boundaries precomputed, so a lookup is one binary search.
+The index is built from active departments per process, rebuilt after any
+department change in this process and, for other processes, once the
+departments version stamp changes (checked every ``ICD_INDEX_CHECK_INTERVAL``
+seconds).
+"""
+
+import logging
+import re
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+ICD_INDEX_CHECK_INTERVAL = 5
+
+# Sorts after every character of a normalized code
+_RANGE_END = '~'
+_code_re = re.compile(r'^[A-Z][0-9][0-9A-Z]{0,5}$')
+
+_index = None
+_index_token = None
+_index_checked = 0.0
+_index_lock = threading.Lock()
+
+
+def normalize_code(code):
+    """``'i21.09'`` -> ``'I2109'``, or ``None`` for something that is not an ICD-10 code."""
+    if not isinstance(code, str):
+        return None
+    category, dot, subcategory = code.strip().upper().partition('.')
+    if dot and (len(category) != 3 or not subcategory):
+        # The only dot follows the three-character category
+        return None
+    code = category + subcategory
+    return code if _code_re.match(code) else None
+
+
+def parse_range(entry):
+    """``(start, end)`` normalized keys, ``end`` exclusive, or ``None`` if malformed."""
+    if isinstance(entry, dict):
+        start, end = entry.get('start'), entry.get('end', entry.get('start'))
+    elif isinstance(entry, str):
+        start, dash, end = entry.replace('–', '-').partition('-')
+        if not dash:
+            end = start
+    else:
+        return None
+    start, end = normalize_code(start), normalize_code(end)
+    if start is None or end is None or end < start:
+        return None
+    return start, end + _RANGE_END
+
+
+class ICDIntervalIndex:
+    """Map ICD-10 codes to the departments whose ranges contain them."""
+
+    def __init__(self, departments):
+        """``departments``: iterable of ``(id, name, icd_code_ranges)``."""
+        self.departments = []
+        intervals = []
+        for department_id, name, ranges in departments:
+            position = len(self.departments)
+            self.departments.append({'id': str(department_id), 'name': name})
+            for entry in ranges or ():
+                bounds = parse_range(entry)
+                if bounds is None:
+                    logger.warning(f"Ignoring malformed ICD range {entry!r} of department {name}")
+                    continue
+                intervals.append((*bounds, position))
+
+        self._bounds = sorted({bound for start, end, _ in intervals for bound in (start, end)})
+        covering = [set() for _ in self._bounds]
+        for start, end, position in intervals:
+            for segment in range(bisect_right(self._bounds, start) - 1, bisect_right(self._bounds, end) - 1):
+                covering[segment].add(position)
+        self._segments = [
+            tuple(self.departments[position] for position in sorted(positions))
+            for positions in covering
+        ]
+
+    def __len__(self):
+        return len(self._bounds)
+
+    def lookup(self, code):
+        """Departments for one code, in the order they were indexed."""
+        key = normalize_code(code)
+        if key is None:
+            return ()
+        segment = bisect_right(self._bounds, key) - 1
+        return self._segments[segment] if segment >= 0 else ()
+
+    def lookup_many(self, codes):
+        """
+        ``(matches, ranking, invalid)`` for a batch of codes: departments per
+        normalized code, departments ordered by how many codes they match,
+        and the inputs that are not ICD-10 codes.
+        """
+        matches, invalid = {}, []
+        for code in codes:
+            key = normalize_code(code)
+            if key is None:
+                invalid.append(code)
+            elif key not in matches:
+                matches[key] = self.lookup(key)
+
+        counts = Counter(department['id'] for found in matches.values() for department in found)
+        by_id = {department['id']: department for department in self.departments}
+        ranking = [
+            {**by_id[department_id], 'matched_codes': count}
+            for department_id, count in counts.most_common()
+        ]
+        return matches, ranking, invalid
+
+
+def build_index():
+    from .models import Department
+
+    return ICDIntervalIndex(
+        Department.objects.filter(is_active=True).order_by('name').values_list(
+            'id', 'name', 'icd_code_ranges'
+        )
+    )
+
+
+def forget_index():
+    global _index
+    _index = None
+
+
+def get_index():
+    """The current process's index, rebuilt when departments changed."""
+    from medbot.http_cache import table_versions
+
+    global _index, _index_token, _index_checked
+    now = time.monotonic()
+    if _index is not None and now - _index_checked < ICD_INDEX_CHECK_INTERVAL:
+        return _index
+
+    with _index_lock:
+        token = table_versions(('departments',))['departments']['token']
+        if _index is None or token != _index_token:
+            _index, _index_token = build_index(), token
+        _index_checked = now
+        return _index
+
+
+def departments_for_code(code):
+    return get_index().lookup(code)
+
+
+def departments_for_codes(codes):
+    """
+    Route a batch of codes, e.g. ``Symptom.icd_codes`` or the ``code`` of
+    each ``Consultation.icd_suggestions`` entry. See ``lookup_many``.
+    """
+    codes = [code.get('code') if isinstance(code, dict) else code for code in codes]
+    return get_index().lookup_many(codes)
@@ -0,0 +1,114 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.departments.icd_index import ICDIntervalIndex, normalize_code, parse_range
+from apps.departments.models import Department
+
+# ICD-10-CM chapters plus narrower, overlapping specialty ranges
+SYNTHETIC_DEPARTMENTS = [
+    ('Infectious Diseases', ['A00-B99']),
+    ('Oncology', ['C00-D49']),
+    ('Hematology', ['D50-D89', 'C81-C96']),
+    ('Endocrinology', ['E00-E89']),
+    ('Psychiatry', ['F01-F99']),
+    ('Neurology', ['G00-G99', 'R25-R29', 'R51', 'I60-I69']),
+    ('Ophthalmology', ['H00-H59']),
+    ('ENT', ['H60-H95', 'J30-J39']),
+    ('Cardiology', ['I00-I99', 'R00-R01', 'R07']),
+    ('Pulmonology', ['J00-J99', 'R06']),
+    ('Gastroenterology', ['K00-K95', 'R10-R19']),
+    ('Dermatology', ['L00-L99', 'R21']),
+    ('Orthopedics', ['M00-M99', 'S00-T14']),
+    ('Nephrology', ['N00-N29']),
+    ('Urology', ['N30-N53']),
+    ('Gynecology', ['N60-N98']),
+    ('Obstetrics', ['O00-O9A']),
+    ('Neonatology', ['P00-P96']),
+    ('Genetics', ['Q00-Q99']),
+    ('Internal Medicine', ['R00-R99', 'E08-E13']),
+    ('Emergency Medicine', ['S00-T88', 'V00-Y99', 'I46', 'R57']),
+    ('Primary Care', ['Z00-Z99']),
+]
+
+
+def icd10_codes():
+    """About 70k codes shaped like ICD-10-CM: categories and their subdivisions."""
+    codes = []
+    for letter in 'ABCDEFGHIJKLMNOPQRSTVWXYZ':
+        for category in range(100):
+            base = f'{letter}{category:02d}'
+            codes.append(base)
+            codes.extend(f'{base}.{digit}' for digit in range(10))
+            codes.extend(f'{base}.{sub:02d}' for sub in range(16))
+    return codes
+
+
+class Command(BaseCommand):
+    help = 'Benchmark ICD-10 code to department lookups against a linear scan of the ranges'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-database', action='store_true',
+            help='Index the active departments instead of a synthetic set'
+        )
+        parser.add_argument('--batch-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        codes = icd10_codes()
+
+        if options['from_database']:
+            departments = list(Department.objects.filter(is_active=True).order_by('name').values_list(
+                'id', 'name', 'icd_code_ranges'
+            ))
+        else:
+            departments = [
+                (position, name, ranges) for position, (name, ranges) in enumerate(SYNTHETIC_DEPARTMENTS)
+            ]
+
+        start = time.perf_counter()
+        index = ICDIntervalIndex(departments)
+        build_ms = (time.perf_counter() - start) * 1000
+        self.stdout.write(
+            f'{len(codes)} codes, {len(index.departments)} departments, '
+            f'{len(index)} boundaries, built in {build_ms:.1f} ms'
+        )
+
+        start = time.perf_counter()
+        indexed = [index.lookup(code) for code in codes]
+        lookup_s = time.perf_counter() - start
+
+        batch_size = options['batch_size']
+        start = time.perf_counter()
+        for offset in range(0, len(codes), batch_size):
+            index.lookup_many(codes[offset:offset + batch_size])
+        batch_s = time.perf_counter() - start
+
+        # Baseline: test every range of every department, as a per-row scan would
+        ranges = [
+            (bounds, str(department_id))
+            for department_id, _, entries in departments
+            for bounds in map(parse_range, entries or ()) if bounds
+        ]
+        start = time.perf_counter()
+        scanned = []
+        for code in codes:
+            key = normalize_code(code)
+            found = {department_id for (low, high), department_id in ranges if low <= key < high}
+            scanned.append(found)
+        scan_s = time.perf_counter() - start
+
+        mismatches = sum(
+            {department['id'] for department in found} != expected
+            for found, expected in zip(indexed, scanned)
+        )
+        if mismatches:
+            self.stderr.write(self.style.ERROR(f'{mismatches} codes differ from the linear scan'))
+
+        self.stdout.write(f'index lookup  {lookup_s / len(codes) * 1e6:7.2f} us/code')
+        self.stdout.write(
+            f'batches of {batch_size:<3} {batch_s / (len(codes) / batch_size) * 1e6:7.2f} us/batch'
+        )
+        self.stdout.write(
+            f'linear scan   {scan_s / len(codes) * 1e6:7.2f} us/code '
+            f'({scan_s / lookup_s:.0f}x slower)'
+        )
+
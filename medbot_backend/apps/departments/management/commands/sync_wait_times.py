@@ -0,0 +1,61 @@
+import time
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from apps.consultations.models import Appointment, Consultation
+from apps.consultations.signals import APPOINTMENT_EVENTS, appointment_due
+from apps.departments.models import Department
+from apps.departments.wait_times import START, WAIT, reset_queues
+from apps.healthcare_systems.models import HealthcareSystem
+from apps.healthcare_systems.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount the waiting and in-progress visits of every department queue from the '
+        'database, correcting drift in the live wait-time estimates'
+    )
+
+    def handle(self, *args, **options):
+        now = time.time()
+        # visit id -> (queue, state, since); an appointment overrides its consultation
+        visits = {}
+        for alias in shard_aliases():
+            consultations = Consultation.objects.using(alias).filter(
+                status__in=('scheduled', 'in_progress'), recommended_department__isnull=False
+            ).values_list('id', 'healthcare_system_id', 'recommended_department_id', 'status', 'updated_at')
+            for visit_id, system_id, department_id, status, updated_at in consultations:
+                state = 'serving' if status == 'in_progress' else 'waiting'
+                visits[visit_id] = ((system_id, department_id), state, updated_at.timestamp())
+
+            active = [status for status, event in APPOINTMENT_EVENTS.items() if event in (WAIT, START)]
+            appointments = Appointment.objects.using(alias).filter(status__in=active).order_by(
+                '-scheduled_date', '-scheduled_time'
+            )
+            for appointment in appointments.iterator():
+                queue = (appointment.healthcare_system_id, appointment.department_id)
+                if appointment.status == 'in_progress':
+                    visit = (queue, 'serving', appointment.updated_at.timestamp())
+                else:
+                    due = appointment_due(appointment)
+                    visit = (queue, 'waiting' if due <= now else 'booked', due)
+                # Earliest booking wins, unless one is already being seen
+                current = visits.get(appointment.consultation_id)
+                if not (current and current[1] == 'serving'):
+                    visits[appointment.consultation_id] = visit
+
+        queues = defaultdict(list)
+        department_ids = list(Department.objects.values_list('id', flat=True))
+        for system_id in [None, *HealthcareSystem.objects.values_list('id', flat=True)]:
+            for department_id in department_ids:
+                queues[(system_id, department_id)] = []
+        for visit_id, (queue, state, since) in visits.items():
+            queues[queue].append((visit_id, state, since))
+        reset_queues(queues)
+
+        counts = defaultdict(int)
+        for _, state, _ in visits.values():
+            counts[state] += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Reset {len(queues)} department queues: {counts["waiting"]} waiting, '
+            f'{counts["serving"]} being seen, {counts["booked"]} booked for later'
+        ))
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from medbot.http_cache import bump_table_version
+from .icd_index import forget_index
+from .models import Department
+
+
+@receiver([post_save, post_delete], sender=Department)
+def bump_department_version(sender, using, **kwargs):
+    # After commit, so other processes never rebuild from the old rows under the new version
+    def refresh():
+        bump_table_version(sender._meta.db_table)
+        forget_index()
+    transaction.on_commit(refresh, using=using)
@@ -1,3 +1,241 @@
-from django.test import TestCase
+import random
+import time
+from datetime import timedelta
+from unittest import mock
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.consultations.models import Appointment, Consultation
+from apps.healthcare_systems.models import HealthcareSystem
+from apps.symptoms.serializers import ConsultationResultSerializer
+from apps.users.models import User
+from . import icd_index, wait_times
+from .icd_index import ICDIntervalIndex, get_index, normalize_code, parse_range
+from .models import Department
 
-# Create your tests here.
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, COUNTER_FLUSH_INTERVAL=0
+)
+class WaitTimeEstimateTest(TestCase):
+    """Department wait times follow visit status changes and are served without queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(
+            name='Cardiology', description='Heart', urgency_level='routine', average_wait_time=30
+        )
+        cls.system = HealthcareSystem.objects.create(
+            name='General', system_type='hospital', address='1 Main St', city='Springfield',
+            state='IL', zip_code='62701', phone_number='555-0100', email='info@example.com',
+            monthly_fee=Decimal('100.00'), contract_start_date=timezone.now().date(),
+            contract_end_date=timezone.now().date() + timedelta(days=365),
+        )
+        cls.patient = User.objects.create_user(username='waiting', password='x')
+        cls.doctor = User.objects.create_user(username='doctor', password='x')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_estimate_from_events(self):
+        args = (self.system.id, self.department.id)
+        self.assertIsNone(wait_times.estimate(*args))
+        # Two patients seen 10 minutes after arriving, for 20 minutes each
+        for visit in ('a', 'b'):
+            wait_times.record_event(wait_times.WAIT, visit, *args, now=0)
+            wait_times.record_event(wait_times.WAIT, visit, *args, now=60)  # repeated, no change
+            wait_times.record_event(wait_times.START, visit, *args, now=600)
+            wait_times.record_event(wait_times.FINISH, visit, *args, now=1800)
+        # Three waiting, one being seen: 3 x 20 minutes
+        for visit in ('c', 'd', 'e', 'f'):
+            wait_times.record_event(wait_times.WAIT, visit, *args, now=1800)
+        wait_times.record_event(wait_times.START, 'f', *args, now=1800)
+        self.assertEqual(
+            wait_times.estimate(*args),
+            {'minutes': 60, 'p90_minutes': 10, 'queue_length': 3, 'in_service': 1}
+        )
+        wait_times.record_event(wait_times.LEAVE, 'c', None, None, now=1900)
+        self.assertEqual(wait_times.estimate(*args)['queue_length'], 2)
+
+    def test_published_through_results(self):
+        consultation = Consultation.objects.create(
+            patient=self.patient, healthcare_system=self.system, symptom_description='Palpitations',
+            recommended_department=self.department, status='completed'
+        )
+        consultation = Consultation.objects.select_related('recommended_department').get()
+        info = ConsultationResultSerializer(consultation).data['recommended_department_info']
+        self.assertEqual((info['average_wait_time'], info['wait_time_source']), (30, 'static'))
+
+        booked = timezone.localtime() - timedelta(minutes=15)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                consultation=consultation, patient=self.patient, doctor=self.doctor,
+                department=self.department, healthcare_system=self.system,
+                scheduled_date=booked.date(), scheduled_time=booked.time(),
+                appointment_type='consultation',
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = 'in_progress'
+            appointment.save(update_fields=['status', 'updated_at'])
+
+        with self.assertNumQueries(0):
+            info = ConsultationResultSerializer(consultation).data['recommended_department_info']
+        self.assertEqual(info['wait_time_source'], 'live')
+        self.assertEqual(info['average_wait_time'], info['wait_time_p90'])
+        self.assertEqual((info['queue_length'], info['average_wait_time']), (0, 15))
+
+
+class ICDRoutingViewTest(TestCase):
+    """Malformed routing requests are rejected with a 400."""
+
+    def test_rejects_bodies_that_are_not_objects(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='router', password='x'))
+        for body in (['R51'], 'R51', {'codes': 'R51'}, {'codes': []}):
+            response = client.post('/api/departments/icd-routing/', body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+        response = client.post('/api/departments/icd-routing/', {'codes': ['R51', 'nope']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['invalid_codes'], ['nope'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ICDIntervalIndexTest(TestCase):
+    """Codes map to every department whose ranges contain them, and follow department changes."""
+
+    def setUp(self):
+        cache.clear()
+        icd_index.forget_index()
+        self.addCleanup(icd_index.forget_index)
+
+    def names(self, index, code):
+        return [department['name'] for department in index.lookup(code)]
+
+    def test_parse_range(self):
+        for entry, expected in (
+            ('I00-I99', ('I00', 'I99~')),
+            ('i21.0 – i21.9', ('I210', 'I219~')),
+            ('R51', ('R51', 'R51~')),
+            ({'start': 'S00', 'end': 'T88.9'}, ('S00', 'T889~')),
+            ({'start': 'Z00'}, ('Z00', 'Z00~')),
+        ):
+            self.assertEqual(parse_range(entry), expected, entry)
+        for entry in ('I99-I00', 'I00-', 'heart', '', 'I00-I99-J00', {'end': 'I99'}, {'start': 'I00', 'end': 7},
+                      42, None, ['I00', 'I99']):
+            self.assertIsNone(parse_range(entry), entry)
+
+    def test_containment_and_boundaries(self):
+        index = ICDIntervalIndex([(1, 'Cardiology', ['I00-I99']), (2, 'Neurology', ['G00-G99', 'R51'])])
+        for code, expected in (
+            ('I00', ['Cardiology']), ('I21.9', ['Cardiology']), ('I99', ['Cardiology']),
+            ('I99.8', ['Cardiology']), ('i998', ['Cardiology']),
+            ('H99', []), ('J00', []), ('I0', []),  # I0 sorts before I00
+            ('R51', ['Neurology']), ('R51.9', ['Neurology']), ('R50.9', []), ('R52', []), ('R5', []),
+            ('G00', ['Neurology']), ('G99.8', ['Neurology']), ('F99', []), ('H00', []),
+            ('A00', []), ('Z99', []),
+        ):
+            self.assertEqual(self.names(index, code), expected, code)
+
+    def test_overlapping_ranges(self):
+        index = ICDIntervalIndex([
+            (1, 'Cardiology', ['I00-I99']),
+            (2, 'Emergency', ['I21-I22', 'R00-R09', {'start': 'S00', 'end': 'T88'}]),
+            (3, 'Pulmonology', ['J00-J99', 'R05-R07']),
+            (4, 'Duplicate', ['I21', 'I21.0-I21.4']),
+        ])
+        for code, expected in (
+            ('I20.9', ['Cardiology']),
+            ('I21.0', ['Cardiology', 'Emergency', 'Duplicate']),
+            ('I21.9', ['Cardiology', 'Emergency', 'Duplicate']),
+            ('I22.1', ['Cardiology', 'Emergency']),
+            ('I23', ['Cardiology']),
+            ('R04', ['Emergency']),
+            ('R05', ['Emergency', 'Pulmonology']),
+            ('R07.9', ['Emergency', 'Pulmonology']),
+            ('R08', ['Emergency']),
+            ('R10', []),
+            ('T50.9', ['Emergency']),
+        ):
+            self.assertEqual(self.names(index, code), expected, code)
+
+        matches, ranking, invalid = index.lookup_many(['I21.9', 'i21.9', 'R05', 'J45', 'bogus', None])
+        self.assertEqual(list(matches), ['I219', 'R05', 'J45'])
+        self.assertEqual(invalid, ['bogus', None])
+        self.assertEqual([(department['name'], department['matched_codes']) for department in ranking], [
+            ('Emergency', 2), ('Pulmonology', 2), ('Cardiology', 1), ('Duplicate', 1),
+        ])
+
+    def test_malformed_codes(self):
+        with self.assertLogs(icd_index.logger, 'WARNING') as logs:
+            index = ICDIntervalIndex([(1, 'Cardiology', ['I00-I99', 'I99-I00', 'heart', 42, {'start': 'X'}]),
+                                      (2, 'Empty', None)])
+        self.assertEqual(len(logs.records), 4)
+        self.assertEqual(self.names(index, 'I50'), ['Cardiology'])
+        for code in (None, '', '  ', 'I', '21.9', 'I21-9', 'I21.9.9', 'I2.19', 'I21.', 'Ⅰ21', 219, {'code': 'I21'}):
+            self.assertIsNone(normalize_code(code), code)
+            self.assertEqual(index.lookup(code), (), code)
+        self.assertEqual(ICDIntervalIndex([]).lookup('I21'), ())
+
+    def test_matches_brute_force(self):
+        rng = random.Random(41)
+
+        def code():
+            return rng.choice('ABIJRS') + str(rng.randrange(10)) + ''.join(
+                rng.choice('0123456789') for _ in range(rng.randrange(3)))
+
+        departments = []
+        for number in range(30):
+            ranges = []
+            for _ in range(rng.randrange(4)):
+                start, end = sorted((code(), code()))
+                ranges.append(f'{start}-{end}' if rng.random() < 0.8 else start)
+            departments.append((number, f'department {number}', ranges))
+        index = ICDIntervalIndex(departments)
+
+        for _ in range(2000):
+            probe = code()
+            expected = [
+                name for _, name, ranges in departments
+                if any(start <= probe < end for start, end in map(parse_range, ranges))
+            ]
+            self.assertEqual(self.names(index, probe), expected, probe)
+
+    def test_rebuilt_when_departments_change(self):
+        cardiology = Department.objects.create(name='Cardiology', description='Heart', icd_code_ranges=['I00-I99'])
+        Department.objects.create(name='Retired', description='Closed', icd_code_ranges=['R51'], is_active=False)
+        self.assertEqual(self.names(get_index(), 'I21.9'), ['Cardiology'])
+        self.assertEqual(self.names(get_index(), 'R51'), [])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            cardiology.icd_code_ranges = ['I20-I25', 'R00-R09']
+            cardiology.save()
+            # Other requests keep the committed ranges until the change commits
+            self.assertEqual(self.names(get_index(), 'I50'), ['Cardiology'])
+        for callback in callbacks:
+            callback()
+        index = get_index()
+        self.assertEqual(self.names(index, 'I50'), [])
+        self.assertEqual(self.names(index, 'I21.9'), ['Cardiology'])
+        self.assertEqual(self.names(index, 'R07.9'), ['Cardiology'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Department.objects.create(name='Neurology', description='Brain', icd_code_ranges=['R51', 'G00-G99'])
+        self.assertEqual(self.names(get_index(), 'R51'), ['Neurology'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cardiology.delete()
+        self.assertEqual(self.names(get_index(), 'I21.9'), [])
+
+    def test_other_processes_rebuild_from_the_version_stamp(self):
+        Department.objects.create(name='Cardiology', description='Heart', icd_code_ranges=['I00-I99'])
+        index = get_index()
+        # Another process changed the ranges: only the shared version stamp tells this one
+        with self.captureOnCommitCallbacks(execute=True):
+            Department.objects.update(icd_code_ranges=['J00-J99'])
+            Department.objects.first().save()
+        icd_index._index = index
+        self.assertIs(get_index(), index)
+        with mock.patch.object(icd_index.time, 'monotonic', return_value=time.monotonic() + 60):
+            self.assertEqual(self.names(get_index(), 'J45'), ['Cardiology'])
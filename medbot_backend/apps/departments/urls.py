@@ -1,2 +1,6 @@
 from django.urls import path
-urlpatterns = []
+from .views import icd_routing
+
+urlpatterns = [
+    path('icd-routing/', icd_routing, name='icd-routing'),
+]
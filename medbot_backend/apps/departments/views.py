@@ -1,3 +1,38 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from .icd_index import departments_for_codes
 
-# Create your views here.
+MAX_ICD_CODES = 1000
+
+
+@api_view(['GET', 'POST'])
+def icd_routing(request):
+    """
+    Candidate departments for ICD-10 codes.
+
+    ``GET ?codes=R51,I21.9`` or ``POST {"codes": [...]}``; codes may also be
+    ``icd_suggestions`` entries (objects with a ``code``).
+    """
+    if request.method == 'POST':
+        # A JSON body may be any value, not only an object
+        codes = request.data.get('codes', []) if isinstance(request.data, dict) else None
+    else:
+        codes = [code for code in request.query_params.get('codes', '').split(',') if code.strip()]
+
+    if not isinstance(codes, list) or not codes:
+        return Response({'error': 'Provide a list of ICD-10 codes'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(codes) > MAX_ICD_CODES:
+        return Response({
+            'error': f'At most {MAX_ICD_CODES} codes per request'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    matches, ranking, invalid = departments_for_codes(codes)
+    return Response({
+        'codes': [
+            {'code': code, 'departments': list(departments)}
+            for code, departments in matches.items()
+        ],
+        'departments': ranking,
+        'invalid_codes': invalid,
+    })
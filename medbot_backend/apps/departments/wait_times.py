@@ -0,0 +1,176 @@
+"""
+Live wait-time estimates per healthcare system and department.
+
+Consultation and appointment status changes (``apps.consultations.signals``)
+move each patient visit, keyed by consultation, through waiting -> being
+seen -> done. Every (healthcare system, department) queue keeps, in the
+shared cache:
+
+- ``waiting`` and ``serving`` counters, changed with atomic ``incr``;
+- a stats record with moving averages of observed waits and service times
+  and a streaming 90th percentile of waits.
+
+Each visit's state is its own cache entry, so an event costs a handful of
+cache operations whatever the queue length, and repeated events (an
+appointment saved twice) change nothing. A visit booked for later does not
+count as waiting until it starts. Its wait is then measured from the
+booked time, i.e. how late the department runs.
+
+``estimate`` reads one queue in a single ``get_many`` and never touches the
+database. Once service times have been observed, a new patient's wait is
+the number waiting times the mean service time, divided by the patients
+being seen in parallel; before that it is the observed average wait. The
+counters drift if visit entries expire or a status is changed by a bulk
+``update()``; ``sync_wait_times`` recounts them from the database. Stats
+are read-modify-write, so a sample can be lost to a concurrent update.
+"""
+
+import time
+from django.core.cache import cache
+
+# Weight of the newest sample in the moving averages
+WAIT_EWMA_ALPHA = 0.1
+
+# Step of the streaming percentile, relative to the average wait
+QUANTILE_STEP = 0.05
+WAIT_QUANTILE = 0.9
+
+# Visits idle longer than this are forgotten (seconds)
+VISIT_TTL = 2 * 24 * 3600
+
+WAIT, START, FINISH, LEAVE = 'wait', 'start', 'finish', 'leave'
+
+
+def _queue_id(system_id, department_id):
+    return f'{system_id or "none"}:{department_id}'
+
+
+def _visit_key(visit_id):
+    return f'waittime:visit:{visit_id}'
+
+
+def _counter_key(queue, counter):
+    return f'waittime:{counter}:{queue}'
+
+
+def _stats_key(queue):
+    return f'waittime:stats:{queue}'
+
+
+def _add(queue, counter, delta):
+    key = _counter_key(queue, counter)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:  # evicted between add and incr
+        cache.set(key, max(delta, 0), None)
+
+
+def _forget(visit):
+    """Take a visit out of the counters of its queue."""
+    if visit and visit['state'] in ('waiting', 'serving'):
+        _add(visit['queue'], visit['state'], -1)
+
+
+def _observe(queue, wait=None, service=None):
+    key = _stats_key(queue)
+    stats = cache.get(key) or {}
+    if wait is not None:
+        average = stats.get('wait_ewma')
+        stats['wait_ewma'] = wait if average is None else average + WAIT_EWMA_ALPHA * (wait - average)
+        quantile = stats.get('wait_p90')
+        if quantile is None:
+            quantile = wait
+        else:
+            step = QUANTILE_STEP * max(stats['wait_ewma'], 1.0)
+            quantile += step * WAIT_QUANTILE if wait > quantile else -step * (1 - WAIT_QUANTILE)
+        stats['wait_p90'] = max(quantile, 0.0)
+        stats['waits'] = stats.get('waits', 0) + 1
+    if service is not None:
+        average = stats.get('service_ewma')
+        stats['service_ewma'] = (
+            service if average is None else average + WAIT_EWMA_ALPHA * (service - average)
+        )
+        stats['services'] = stats.get('services', 0) + 1
+    cache.set(key, stats, None)
+
+
+def record_event(event, visit_id, system_id, department_id, due=None, now=None):
+    """
+    Apply ``event`` (``WAIT``, ``START``, ``FINISH`` or ``LEAVE``) to a visit.
+    ``due``: epoch seconds the visit is booked for, if any. ``FINISH`` and
+    ``LEAVE`` apply to the visit's own queue.
+    """
+    if department_id is None and event in (WAIT, START):
+        return
+    now = time.time() if now is None else now
+    queue = _queue_id(system_id, department_id)
+    key = _visit_key(visit_id)
+    visit = cache.get(key)
+
+    if event == WAIT:
+        if visit and visit['state'] != 'serving' and visit['queue'] == queue and due is None:
+            return
+        since = now if due is None else due
+        state = 'waiting' if since <= now else 'booked'
+        _forget(visit)
+        if state == 'waiting':
+            _add(queue, 'waiting', 1)
+        cache.set(key, {'queue': queue, 'state': state, 'since': since}, VISIT_TTL)
+    elif event == START:
+        if visit and visit['state'] == 'serving' and visit['queue'] == queue:
+            return
+        if visit and visit['state'] in ('waiting', 'booked'):
+            _observe(queue, wait=max(now - visit['since'], 0.0))
+        _forget(visit)
+        _add(queue, 'serving', 1)
+        cache.set(key, {'queue': queue, 'state': 'serving', 'since': now}, VISIT_TTL)
+    elif visit:
+        if event == FINISH and visit['state'] == 'serving':
+            _observe(visit['queue'], service=now - visit['since'])
+        _forget(visit)
+        cache.delete(key)
+
+
+def estimate(system_id, department_id):
+    """
+    ``{'minutes', 'p90_minutes', 'queue_length', 'in_service'}`` for a patient
+    joining the queue now, or ``None`` without observations.
+    """
+    queue = _queue_id(system_id, department_id)
+    keys = [_stats_key(queue), _counter_key(queue, 'waiting'), _counter_key(queue, 'serving')]
+    found = cache.get_many(keys)
+    stats = found.get(keys[0]) or {}
+    waiting = max(found.get(keys[1], 0), 0)
+    serving = max(found.get(keys[2], 0), 0)
+
+    if stats.get('service_ewma') is not None:
+        seconds = waiting * stats['service_ewma'] / max(serving, 1)
+    elif stats.get('wait_ewma') is not None:
+        seconds = stats['wait_ewma']
+    else:
+        return None
+    p90 = stats.get('wait_p90')
+    return {
+        'minutes': round(seconds / 60),
+        'p90_minutes': round(p90 / 60) if p90 is not None else None,
+        'queue_length': waiting,
+        'in_service': serving,
+    }
+
+
+def reset_queues(visits):
+    """
+    Replace the counters and visit entries of every queue in ``visits`` with
+    ``{(system_id, department_id): [(visit_id, state, since)]}``; stats are kept.
+    """
+    visit_entries, counters = {}, {}
+    for (system_id, department_id), queue_visits in visits.items():
+        queue = _queue_id(system_id, department_id)
+        counters[_counter_key(queue, 'waiting')] = counters[_counter_key(queue, 'serving')] = 0
+        for visit_id, state, since in queue_visits:
+            if state != 'booked':
+                counters[_counter_key(queue, state)] += 1
+            visit_entries[_visit_key(visit_id)] = {'queue': queue, 'state': state, 'since': since}
+    cache.set_many(visit_entries, VISIT_TTL)
+    cache.set_many(counters, None)
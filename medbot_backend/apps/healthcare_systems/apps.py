@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class HealthcareSystemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.healthcare_systems'
+
+    def ready(self):
+        from . import signals  # noqa: F401
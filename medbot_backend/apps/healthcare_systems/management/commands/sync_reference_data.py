@@ -0,0 +1,74 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from apps.healthcare_systems.sharding import REFERENCE_MODELS
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy reference data (healthcare systems, departments, symptoms, '
+        'workflows) from the default database to every tenant shard'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help='Only sync this shard alias')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        shards = settings.DATABASE_SHARDS
+        if options['database']:
+            if options['database'] not in shards:
+                raise CommandError(f"'{options['database']}' is not a configured shard")
+            shards = [options['database']]
+        if not shards:
+            self.stdout.write('No database shards configured')
+            return
+
+        models = [apps.get_model(label) for label in sorted(REFERENCE_MODELS)]
+        for alias in shards:
+            # Foreign keys are checked at commit, so model order does not matter
+            with transaction.atomic(using=alias):
+                for model in models:
+                    copied, removed = self._sync_model(model, alias, options['batch_size'])
+                    self.stdout.write(
+                        f'{alias}: {model._meta.label} {copied} copied, {removed} removed'
+                    )
+        self.stdout.write(self.style.SUCCESS('Reference data synced'))
+
+    def _sync_model(self, model, alias, batch_size):
+        pk_name = model._meta.pk.name
+        update_fields = [
+            field.name for field in model._meta.concrete_fields if not field.primary_key
+        ]
+        source = model._base_manager.using(DEFAULT_DB_ALIAS).order_by(pk_name)
+
+        copied = 0
+        batch = []
+        for row in source.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                copied += self._upsert(model, alias, batch, pk_name, update_fields)
+                batch = []
+        if batch:
+            copied += self._upsert(model, alias, batch, pk_name, update_fields)
+
+        source_pks = set(source.values_list('pk', flat=True))
+        stale = [
+            pk for pk in model._base_manager.using(alias).values_list('pk', flat=True)
+            if pk not in source_pks
+        ]
+        removed = 0
+        for start in range(0, len(stale), batch_size):
+            model._base_manager.using(alias).filter(pk__in=stale[start:start + batch_size]).delete()
+            removed += len(stale[start:start + batch_size])
+        return copied, removed
+
+    def _upsert(self, model, alias, rows, pk_name, update_fields):
+        model._base_manager.using(alias).bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=[pk_name],
+            update_fields=update_fields,
+        )
+        return len(rows)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare_systems', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthcaresystem',
+            name='data_retention_days',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
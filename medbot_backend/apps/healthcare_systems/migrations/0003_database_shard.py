@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare_systems', '0002_data_retention_days'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthcaresystem',
+            name='database_shard',
+            field=models.CharField(default='default', max_length=50),
+        ),
+    ]
@@ -42,6 +42,12 @@ class HealthcareSystem(models.Model):
     contract_end_date = models.DateField()
     is_active = models.BooleanField(default=True)
 
+    # Data retention (days); falls back to settings.DATA_RETENTION_DAYS when unset
+    data_retention_days = models.PositiveIntegerField(null=True, blank=True)
+
+    # Database alias holding this system's consultations, appointments and executions
+    database_shard = models.CharField(max_length=50, default='default')
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -0,0 +1,174 @@
+"""
+Tenant sharding of consultation data by healthcare system.
+
+Each ``HealthcareSystem.database_shard`` names the database alias holding
+that tenant's consultations, appointments, reminders and n8n executions.
+Reference data (healthcare systems, departments, symptoms, workflows) is
+written to ``default`` and copied to every shard so joins and foreign keys
+keep working there. Everything else (users, auth, metrics) lives only on
+``default``.
+"""
+
+import logging
+import time
+import uuid
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+
+logger = logging.getLogger(__name__)
+
+SHARDED_MODELS = {
+    'consultations.consultation',
+    'consultations.consultationfeedback',
+    'consultations.appointment',
+    'consultations.appointmentreminder',
+    'n8n_integration.n8nexecution',
+}
+
+REFERENCE_MODELS = {
+    'healthcare_systems.healthcaresystem',
+    'departments.department',
+    'symptoms.symptomcategory',
+    'symptoms.symptom',
+    'symptoms.symptomdepartmentmapping',
+    'n8n_integration.n8nworkflow',
+}
+
+TENANT_HEADER = 'HTTP_X_HEALTHCARE_SYSTEM'
+
+# Tenant -> shard assignments rarely change; unknown ids reload at most this often
+SHARD_MAP_TTL = 60
+SHARD_MAP_MISS_RELOAD = 1
+
+_shard_map = {}
+_shard_map_loaded = 0.0
+
+
+def _label(model):
+    # getattr: lazy wrappers such as CachedUser have no _meta of their own
+    meta = getattr(model, '_meta', None)
+    return meta.label_lower if meta else None
+
+
+def is_sharded(model):
+    return _label(model) in SHARDED_MODELS
+
+
+def is_reference(model):
+    return _label(model) in REFERENCE_MODELS
+
+
+def shard_aliases():
+    """Every database alias that can hold tenant data, ``default`` first."""
+    return [DEFAULT_DB_ALIAS, *getattr(settings, 'DATABASE_SHARDS', [])]
+
+
+def _load_shard_map():
+    from .models import HealthcareSystem
+
+    global _shard_map, _shard_map_loaded
+    _shard_map = {
+        str(system_id): shard
+        for system_id, shard in HealthcareSystem.objects.using(DEFAULT_DB_ALIAS).values_list(
+            'id', 'database_shard'
+        )
+    }
+    _shard_map_loaded = time.monotonic()
+
+
+def forget_shard_map():
+    global _shard_map_loaded
+    _shard_map_loaded = 0.0
+
+
+def shard_for(healthcare_system_id):
+    """Database alias holding a healthcare system's tenant data."""
+    if not healthcare_system_id or not getattr(settings, 'DATABASE_SHARDS', None):
+        return DEFAULT_DB_ALIAS
+
+    key = str(healthcare_system_id)
+    age = time.monotonic() - _shard_map_loaded
+    if age > SHARD_MAP_TTL or (key not in _shard_map and age > SHARD_MAP_MISS_RELOAD):
+        _load_shard_map()
+
+    alias = _shard_map.get(key, DEFAULT_DB_ALIAS)
+    if alias not in shard_aliases():
+        raise ImproperlyConfigured(
+            f"Healthcare system {key} is assigned to unknown database shard '{alias}'"
+        )
+    return alias
+
+
+def home_tenant(user):
+    """
+    Healthcare system whose shard holds a user's own data: a staff user's
+    system, or a patient's preferred hospital.
+    """
+    if user.healthcare_system_id:
+        return user.healthcare_system_id
+    if user.user_type == 'patient':
+        from apps.users.models import PatientProfile
+
+        return PatientProfile.objects.filter(user_id=user.pk).values_list(
+            'preferred_hospital_id', flat=True
+        ).first()
+    return None
+
+
+def request_tenant(request):
+    """
+    Healthcare system a request acts for. Users act for their own system
+    (``home_tenant``); only global roles such as platform admins may pick
+    one with the ``X-Healthcare-System`` header. ``None`` when unknown.
+    """
+    from apps.authentication.authentication import CachedUser
+    from apps.authentication.permissions import has_global_role
+
+    request = getattr(request, '_request', request)  # DRF wraps the HttpRequest
+    user = request.__dict__.get('user')
+    if not getattr(user, 'is_authenticated', False):
+        return None
+    # CachedUser serves the tenant from its snapshot, without a query
+    own = user.tenant_id if isinstance(user, CachedUser) else home_tenant(user)
+    if not has_global_role(user):
+        return own
+
+    header = request.META.get(TENANT_HEADER)
+    if header:
+        try:
+            return uuid.UUID(header)
+        except ValueError:
+            logger.warning(f"Ignoring invalid {TENANT_HEADER[5:]} header: {header[:64]}")
+    return own
+
+
+def get_across_shards(model, **lookup):
+    """
+    Fetch one tenant row by a globally unique key (id, n8n execution id)
+    when the tenant is unknown, e.g. in n8n callbacks.
+    """
+    for alias in shard_aliases():
+        try:
+            return model._default_manager.using(alias).get(**lookup)
+        except model.DoesNotExist:
+            continue
+    raise model.DoesNotExist(f"{model.__name__} matching {lookup} not found on any shard")
+
+
+def replicate_reference_row(instance):
+    """Copy a saved reference row from ``default`` to every shard."""
+    model = type(instance)
+    values = {
+        field.attname: getattr(instance, field.attname)
+        for field in model._meta.concrete_fields
+        if not field.primary_key
+    }
+    for alias in getattr(settings, 'DATABASE_SHARDS', []):
+        model._base_manager.using(alias).update_or_create(pk=instance.pk, defaults=values)
+
+
+def delete_reference_row(model, pk):
+    """Remove a deleted reference row (and its shard-local cascade) from every shard."""
+    for alias in getattr(settings, 'DATABASE_SHARDS', []):
+        model._base_manager.using(alias).filter(pk=pk).delete()
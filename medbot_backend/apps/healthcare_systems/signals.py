@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import HealthcareSystem
+from .sharding import (
+    delete_reference_row,
+    forget_shard_map,
+    is_reference,
+    replicate_reference_row,
+)
+
+
+@receiver(post_save)
+def replicate_reference_save(sender, instance, using, raw=False, **kwargs):
+    """Copy reference data written to ``default`` onto every shard once committed."""
+    if raw or using != DEFAULT_DB_ALIAS or not settings.DATABASE_SHARDS or not is_reference(sender):
+        return
+    transaction.on_commit(lambda: replicate_reference_row(instance), using=using)
+
+
+@receiver(post_delete)
+def replicate_reference_delete(sender, instance, using, **kwargs):
+    if using != DEFAULT_DB_ALIAS or not settings.DATABASE_SHARDS or not is_reference(sender):
+        return
+    # The collector clears instance.pk after deleting, so capture it now
+    pk = instance.pk
+    transaction.on_commit(lambda: delete_reference_row(sender, pk), using=using)
+
+
+@receiver(post_save, sender=HealthcareSystem)
+def refresh_shard_map(sender, **kwargs):
+    forget_shard_map()
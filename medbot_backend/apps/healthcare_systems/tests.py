@@ -1,3 +1,140 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.consultations.models import Consultation
+from apps.departments.models import Department
+from apps.n8n_integration.dispatch import run_analysis
+from apps.n8n_integration.models import N8NExecution, N8NWorkflow
+from apps.users.models import PatientProfile, User
+from .models import HealthcareSystem
+from .sharding import forget_shard_map, get_across_shards
 
-# Create your tests here.
+SHARDS = ['shard_1', 'shard_2']
+
+
+@override_settings(DATABASE_SHARDS=SHARDS, RATE_LIMIT_ENABLED=False)
+class ShardingTest(TestCase):
+    """Tenant rows live on their system's shard; reference rows on every database."""
+
+    databases = {'default', *SHARDS}
+
+    def setUp(self):
+        forget_shard_map()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.north = self._system('North', 'shard_1')
+            self.south = self._system('South', 'shard_2')
+            self.department = Department.objects.create(
+                name='Cardiology', description='Heart', urgency_level='routine'
+            )
+        self.patient = User.objects.create_user(username='patient', password='x')
+        PatientProfile.objects.create(user=self.patient, preferred_hospital=self.north)
+
+    def _system(self, name, shard):
+        return HealthcareSystem.objects.create(
+            name=name, system_type='hospital', address='1 Main St', city='Springfield',
+            state='IL', zip_code='62701', phone_number='555-0100', email='info@example.com',
+            monthly_fee=Decimal('100.00'), contract_start_date=timezone.now().date(),
+            contract_end_date=timezone.now().date() + timedelta(days=365), database_shard=shard,
+        )
+
+    def _consultation(self, system, **fields):
+        # save(), not objects.create(): outside a request only the instance names its tenant
+        consultation = Consultation(
+            patient=self.patient, healthcare_system=system, symptom_description='Palpitations', **fields
+        )
+        consultation.save()
+        return consultation
+
+    def _workflow(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return N8NWorkflow.objects.create(
+                name='Analysis', workflow_type='symptom_analysis', n8n_workflow_id='wf-1', version='1',
+                webhook_url='https://n8n.example.com/webhook/analysis',
+            )
+
+    def api_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    def test_reference_rows_replicated(self):
+        for alias in SHARDS:
+            self.assertEqual(
+                set(HealthcareSystem.objects.using(alias).values_list('name', flat=True)), {'North', 'South'}
+            )
+            self.assertTrue(Department.objects.using(alias).filter(pk=self.department.pk).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.department.name = 'Cardiac Care'
+            self.department.save()
+        for alias in SHARDS:
+            self.assertEqual(Department.objects.using(alias).get(pk=self.department.pk).name, 'Cardiac Care')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.department.delete()
+        for alias in SHARDS:
+            self.assertFalse(Department.objects.using(alias).exists())
+
+    def test_tenant_rows_routed_to_their_shard(self):
+        north = self._consultation(self.north, recommended_department=self.department)
+        south = self._consultation(self.south)
+        self.assertEqual((north._state.db, south._state.db), ('shard_1', 'shard_2'))
+        self.assertEqual(list(Consultation.objects.using('shard_1').values_list('id', flat=True)), [north.id])
+        self.assertEqual(list(Consultation.objects.using('shard_2').values_list('id', flat=True)), [south.id])
+        self.assertFalse(Consultation.objects.using('default').exists())
+
+        # Children follow their parent row; joins to reference data stay on the shard
+        execution = N8NExecution(
+            workflow=self._workflow(), consultation=south, n8n_execution_id='exec-1', input_data={},
+            start_time=timezone.now()
+        )
+        execution.save()
+        self.assertEqual(execution._state.db, 'shard_2')
+        self.assertEqual(
+            Consultation.objects.using('shard_1').get(pk=north.pk).recommended_department.name, 'Cardiology'
+        )
+
+    @mock.patch('apps.n8n_integration.services.requests.post')
+    def test_analysis_execution_stored_with_consultation(self, post):
+        self._workflow()
+        south = self._consultation(self.south, status='initiated')
+        post.return_value.status_code = 200
+        post.return_value.json.return_value = {'execution_id': 'exec-2'}
+        self.assertEqual(run_analysis(south, {}), 'exec-2')
+        execution = get_across_shards(N8NExecution, n8n_execution_id='exec-2')
+        self.assertEqual((execution._state.db, execution.consultation_id), ('shard_2', south.id))
+        self.assertEqual(Consultation.objects.using('shard_2').get(pk=south.pk).n8n_execution_id, 'exec-2')
+
+    def test_cross_shard_lookup(self):
+        south = self._consultation(self.south)
+        found = get_across_shards(Consultation, id=south.id)
+        self.assertEqual((found, found._state.db), (south, 'shard_2'))
+        with self.assertRaises(Consultation.DoesNotExist):
+            get_across_shards(Consultation, id=self.north.pk)
+
+    @mock.patch('apps.symptoms.views.dispatch_analysis')
+    def test_patient_cannot_pick_another_tenant(self, dispatch_analysis):
+        response = self.api_client(self.patient).post(
+            '/api/symptoms/analysis/analyze_symptoms/', {'symptoms': 'Racing heart since noon'},
+            format='json', HTTP_X_HEALTHCARE_SYSTEM=str(self.south.pk),
+        )
+        self.assertEqual(response.status_code, 202, response.content)
+        consultation = get_across_shards(Consultation, id=response.json()['consultation_id'])
+        self.assertEqual((consultation._state.db, consultation.healthcare_system_id), ('shard_1', self.north.pk))
+
+        # Staff act for their own system, platform admins for the one they name
+        doctor = User.objects.create_user(username='doctor', password='x', user_type='doctor',
+                                          healthcare_system=self.north)
+        admin = User.objects.create_user(username='admin', password='x', user_type='admin')
+        for user, expected in ((doctor, 'shard_1'), (admin, 'shard_2')):
+            response = self.api_client(user).post(
+                '/api/symptoms/analysis/analyze_symptoms/', {'symptoms': 'Racing heart since noon'},
+                format='json', HTTP_X_HEALTHCARE_SYSTEM=str(self.south.pk),
+            )
+            self.assertEqual(response.status_code, 202, response.content)
+            self.assertEqual(get_across_shards(Consultation, id=response.json()['consultation_id'])._state.db,
+                             expected)
@@ -0,0 +1,257 @@
+"""
+Background dispatch of symptom analyses to n8n, by priority lane.
+
+``analyze_symptoms`` answers at once and queues the n8n trigger here. Each
+analysis goes to a lane chosen from its early triage (``analysis_lane``):
+red flags -> ``emergency``, high pain -> ``urgent``, everything else
+``routine``. Workers always take from the highest lane that has work and
+is under its concurrency limit (``N8N_LANE_CONCURRENCY``); lower lanes get
+fewer slots than there are workers (``N8N_DISPATCH_WORKERS``), so a flood
+of routine work always leaves workers free for emergencies.
+
+Within a lane, healthcare systems share the workers by weighted fair
+queuing (``ANALYSIS_TENANT_WEIGHTS``, default weight 1): each analysis is
+tagged with a virtual finish time and the smallest tag goes next, so a bulk
+submission from one tenant interleaves with everyone else's work instead
+of queueing ahead of it.
+
+Queues live in the process that accepted the request; ``dispatch_stats``
+reports the depth, in-flight count and wait times of each lane. Queued
+consultations are ``initiated``; the worker that dispatches one first
+claims it (``initiated`` -> ``analyzing``, a conditional UPDATE), so only
+one dispatcher ever triggers it. Work still queued when that process exits
+is picked up again by the ``requeue_stalled_analyses`` command.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from apps.consultations.transitions import claim_analysis, fail_analysis, record_execution
+from .services import N8NService
+
+logger = logging.getLogger(__name__)
+
+LANES = ('emergency', 'urgent', 'routine')
+
+# Pain level (1-10) from which an analysis without red flags is urgent
+URGENT_PAIN_LEVEL = 7
+
+# Weight of the newest wait time in each lane's moving average
+WAIT_EWMA_ALPHA = 0.2
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def analysis_lane(red_flags=(), pain_level=None):
+    """Lane for an analysis from its early triage."""
+    if red_flags:
+        return 'emergency'
+    if pain_level is not None and pain_level >= URGENT_PAIN_LEVEL:
+        return 'urgent'
+    return 'routine'
+
+
+def analysis_patient_data(patient, preferred_language='en'):
+    """Patient details sent to n8n along with the symptoms."""
+    birth_date = patient.date_of_birth
+    today = timezone.now().date()
+    return {
+        'age': today.year - birth_date.year - (
+            (today.month, today.day) < (birth_date.month, birth_date.day)
+        ) if birth_date else None,
+        'gender': patient.gender,
+        'medical_history': patient.medical_history,
+        'allergies': patient.allergies,
+        'current_medications': patient.current_medications,
+        'preferred_language': preferred_language,
+    }
+
+
+class _Lane:
+    """Weighted fair queue of one lane."""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+        self.queue = []
+        self.virtual_time = 0.0
+        self.finish_tags = {}
+        self.dispatched = 0
+        self.wait_ewma = None
+        self.wait_max = 0.0
+
+    def push(self, entry, tenant, weight, sequence):
+        start = max(self.virtual_time, self.finish_tags.get(tenant, 0.0))
+        finish = start + 1.0 / weight
+        self.finish_tags[tenant] = finish
+        heapq.heappush(self.queue, (finish, sequence, start, entry))
+
+    def pop(self):
+        _, _, start, entry = heapq.heappop(self.queue)
+        self.virtual_time = start
+        if not self.queue:
+            # Nobody is waiting, so no tenant has a backlog to be charged for
+            self.finish_tags.clear()
+        return entry
+
+
+class LaneScheduler:
+    """
+    Lane selection and fair queuing, without threads or clocks of its own;
+    callers serialize access. Items are returned with their lane, which
+    must be passed to ``done`` when the work finishes.
+    """
+
+    def __init__(self, lane_limits, weights=None, lanes=LANES):
+        self.lanes = [_Lane(name, lane_limits.get(name, 1)) for name in lanes]
+        self._by_name = {lane.name: lane for lane in self.lanes}
+        self.weights = {str(tenant): weight for tenant, weight in (weights or {}).items()}
+        self._sequence = itertools.count()
+
+    def push(self, item, lane, tenant=None, now=0.0):
+        tenant = str(tenant) if tenant else None
+        weight = max(self.weights.get(tenant, 1), 0.001)
+        self._by_name[lane].push((item, now), tenant, weight, next(self._sequence))
+
+    def pop(self, now=0.0):
+        """``(item, lane)`` to run next, or ``None`` if nothing may run now."""
+        for lane in self.lanes:
+            if lane.queue and lane.in_flight < lane.limit:
+                item, enqueued = lane.pop()
+                lane.in_flight += 1
+                lane.dispatched += 1
+                wait = now - enqueued
+                lane.wait_max = max(lane.wait_max, wait)
+                lane.wait_ewma = wait if lane.wait_ewma is None else (
+                    WAIT_EWMA_ALPHA * wait + (1 - WAIT_EWMA_ALPHA) * lane.wait_ewma
+                )
+                return item, lane.name
+        return None
+
+    def done(self, lane):
+        self._by_name[lane].in_flight -= 1
+
+    def stats(self, now=0.0):
+        return {
+            lane.name: {
+                'depth': len(lane.queue),
+                'in_flight': lane.in_flight,
+                'concurrency_limit': lane.limit,
+                'dispatched': lane.dispatched,
+                'oldest_wait_seconds': round(
+                    max((now - entry[1] for *_, entry in lane.queue), default=0.0), 3
+                ),
+                'average_wait_seconds': round(lane.wait_ewma or 0.0, 3),
+                'max_wait_seconds': round(lane.wait_max, 3),
+            }
+            for lane in self.lanes
+        }
+
+
+class AnalysisDispatcher:
+    """``LaneScheduler`` served by a pool of worker threads."""
+
+    def __init__(self, workers, lane_limits, weights=None, runner=None):
+        self.scheduler = LaneScheduler(lane_limits, weights)
+        self.runner = runner or _run_in_background
+        self._condition = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._work, name=f'n8n-dispatch-{number}', daemon=True)
+            for number in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, item, lane, tenant=None):
+        with self._condition:
+            self.scheduler.push(item, lane, tenant, time.monotonic())
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return self.scheduler.stats(time.monotonic())
+
+    def _work(self):
+        while True:
+            with self._condition:
+                task = self.scheduler.pop(time.monotonic())
+                while task is None:
+                    self._condition.wait()
+                    task = self.scheduler.pop(time.monotonic())
+            item, lane = task
+            try:
+                self.runner(*item)
+            except Exception:
+                logger.exception("Error in %s analysis dispatch", lane)
+            finally:
+                with self._condition:
+                    self.scheduler.done(lane)
+                    # A slot in this lane may unblock work another worker skipped
+                    self._condition.notify_all()
+
+
+def run_analysis(consultation, patient_data, stalled_before=None):
+    """
+    Claim the consultation, trigger the analysis workflow and record its
+    execution, or mark the consultation failed. ``stalled_before`` is
+    passed on to ``claim_analysis``.
+    """
+    try:
+        # Queued work can also be re-dispatched by requeue_stalled_analyses; only the claimant runs it
+        if not claim_analysis(consultation.id, using=consultation._state.db, stalled_before=stalled_before):
+            logger.info("Analysis for consultation %s already dispatched or finished", consultation.id)
+            return None
+        execution_id = N8NService().trigger_symptom_analysis(
+            consultation_id=consultation.id,
+            symptoms=consultation.symptom_description,
+            patient_data=patient_data,
+            using=consultation._state.db
+        )
+        if execution_id:
+            record_execution(consultation, execution_id)
+        else:
+            fail_analysis(consultation.id, using=consultation._state.db)
+        return execution_id
+    except Exception:
+        logger.exception("Error dispatching analysis for consultation %s", consultation.id)
+        return None
+
+
+def _run_in_background(consultation, patient_data):
+    try:
+        return run_analysis(consultation, patient_data)
+    finally:
+        connections.close_all()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                workers = getattr(settings, 'N8N_DISPATCH_WORKERS', 8)
+                _dispatcher = AnalysisDispatcher(
+                    workers,
+                    getattr(settings, 'N8N_LANE_CONCURRENCY', {lane: workers for lane in LANES}),
+                    getattr(settings, 'ANALYSIS_TENANT_WEIGHTS', {}),
+                )
+    return _dispatcher
+
+
+def dispatch_analysis(consultation, patient_data, lane='routine'):
+    """Queue ``run_analysis`` in ``lane``, fair-shared by the consultation's healthcare system."""
+    get_dispatcher().submit((consultation, patient_data), lane, consultation.healthcare_system_id)
+
+
+def dispatch_stats():
+    """Depth, in-flight count and wait times per lane in this process."""
+    return get_dispatcher().stats() if _dispatcher is not None else LaneScheduler(
+        getattr(settings, 'N8N_LANE_CONCURRENCY', {})
+    ).stats()
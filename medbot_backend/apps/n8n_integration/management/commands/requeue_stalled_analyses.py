@@ -0,0 +1,60 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from apps.consultations.models import Consultation
+from apps.consultations.transitions import EMERGENCY_URGENCY
+from apps.healthcare_systems.sharding import shard_aliases
+from apps.n8n_integration.dispatch import LANES, analysis_lane, analysis_patient_data, run_analysis
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Trigger analyses still queued ("initiated") or claimed without an n8n execution, e.g. '
+        'in a process that exited before dispatching them; emergencies first. Run it periodically (cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=900,
+            help='Seconds since the analysis was queued or claimed; keep above the longest expected queue wait'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only list what would be triggered')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['older_than'])
+        stalled = []
+        for alias in shard_aliases():
+            stalled.extend(Consultation.objects.using(alias).filter(
+                Q(status='initiated', analysis_start_time__lt=cutoff)
+                | Q(status='analyzing', n8n_execution_id='', updated_at__lt=cutoff)
+            ))
+        # Patients live on default, not next to shard rows
+        patients = User.objects.in_bulk({consultation.patient_id for consultation in stalled})
+
+        lanes = {}
+        for consultation in stalled:
+            lanes[consultation.id] = analysis_lane(
+                consultation.urgency_level == EMERGENCY_URGENCY, consultation.pain_level
+            )
+        stalled.sort(key=lambda consultation: (
+            LANES.index(lanes[consultation.id]), consultation.analysis_start_time
+        ))
+
+        triggered = 0
+        for consultation in stalled:
+            lane = lanes[consultation.id]
+            if options['dry_run']:
+                self.stdout.write(
+                    f'{consultation.id} {lane} {consultation.status} since {consultation.updated_at:%Y-%m-%d %H:%M:%S}'
+                )
+                continue
+            patient = patients.get(consultation.patient_id)
+            patient_data = analysis_patient_data(patient, patient.preferred_language) if patient else {}
+            # Claimed like the queue workers claim, so each analysis is triggered once
+            if run_analysis(consultation, patient_data, stalled_before=cutoff):
+                triggered += 1
+
+        verb = 'would trigger' if options['dry_run'] else f'triggered {triggered} of'
+        self.stdout.write(self.style.SUCCESS(f'Stalled analyses: {verb} {len(stalled)}'))
@@ -0,0 +1,89 @@
+import heapq
+import random
+import statistics
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.n8n_integration.dispatch import LaneScheduler
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate analysis dispatch under a flood of bulk routine work from one healthcare '
+        'system, comparing one FIFO queue with priority lanes and per-tenant fair queuing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.N8N_DISPATCH_WORKERS)
+        parser.add_argument('--flood', type=int, default=5000, help='Bulk analyses submitted at once')
+        parser.add_argument('--duration', type=float, default=180, help='Seconds of steady traffic')
+        parser.add_argument('--service-ms', type=float, default=250, help='Mean n8n trigger time')
+        parser.add_argument('--emergency-rate', type=float, default=0.2, help='Per second')
+        parser.add_argument('--urgent-rate', type=float, default=0.5, help='Per second')
+        parser.add_argument('--routine-rate', type=float, default=2.0, help='Per second, other tenants')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        arrivals = self._arrivals(options)
+        self.stdout.write(
+            f'{len(arrivals)} analyses ({options["flood"]} bulk at t=0), {options["workers"]} workers, '
+            f'{options["service_ms"]:.0f} ms mean trigger time'
+        )
+
+        fifo = LaneScheduler({'all': options['workers']}, lanes=('all',))
+        lanes = LaneScheduler(settings.N8N_LANE_CONCURRENCY)
+        for name, scheduler, single_queue in (('fifo', fifo, True), ('lanes', lanes, False)):
+            waits = self._simulate(scheduler, arrivals, options, single_queue)
+            self.stdout.write(f'{name}:')
+            for kind in ('emergency', 'urgent', 'routine', 'bulk'):
+                values = sorted(waits[kind])
+                self.stdout.write(
+                    f'  {kind:<10} n={len(values):<5} wait p50 {statistics.median(values):8.2f} s  '
+                    f'p99 {values[int(len(values) * 0.99)]:8.2f} s  max {values[-1]:8.2f} s'
+                )
+
+    def _arrivals(self, options):
+        """``(time, kind, lane, tenant)`` for the flood plus Poisson traffic of every kind."""
+        rng = random.Random(options['seed'])
+        arrivals = [(0.0, 'bulk', 'routine', 'bulk-importer') for _ in range(options['flood'])]
+        for kind, lane, rate in (
+            ('emergency', 'emergency', options['emergency_rate']),
+            ('urgent', 'urgent', options['urgent_rate']),
+            ('routine', 'routine', options['routine_rate']),
+        ):
+            now = rng.expovariate(rate)
+            while now < options['duration']:
+                arrivals.append((now, kind, lane, f'clinic-{rng.randrange(5)}'))
+                now += rng.expovariate(rate)
+        arrivals.sort(key=lambda arrival: arrival[0])
+        return arrivals
+
+    def _simulate(self, scheduler, arrivals, options, single_queue):
+        rng = random.Random(options['seed'])
+        service = options['service_ms'] / 1000
+        waits = {kind: [] for kind in ('emergency', 'urgent', 'routine', 'bulk')}
+        # Events: (time, order, kind, payload); completions sort before arrivals at the same time
+        events = [(time, 1, 'arrive', arrival) for time, *arrival in arrivals]
+        heapq.heapify(events)
+        free = options['workers']
+        while events:
+            now, _, event, payload = heapq.heappop(events)
+            if event == 'arrive':
+                kind, lane, tenant = payload
+                if single_queue:
+                    # First come, first served: how every analysis was dispatched before lanes
+                    scheduler.push((kind, now), 'all', None, now)
+                else:
+                    scheduler.push((kind, now), lane, tenant, now)
+            else:
+                free += 1
+                scheduler.done(payload)
+            while free:
+                task = scheduler.pop(now)
+                if task is None:
+                    break
+                (kind, submitted), lane = task
+                waits[kind].append(now - submitted)
+                free -= 1
+                heapq.heappush(events, (now + rng.uniform(0.5, 1.5) * service, 0, 'done', lane))
+        return waits
+
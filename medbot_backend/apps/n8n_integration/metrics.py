@@ -0,0 +1,164 @@
+import math
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Relative accuracy of the execution time sketch (quantiles within ~2.5%)
+SKETCH_GAMMA = 1.05
+SKETCH_MIN_SECONDS = 0.001
+
+# Rollup slot size; sliding windows are unions of whole slots
+SLOT_SECONDS = 60
+
+TERMINAL_STATUSES = ('success', 'error', 'cancelled')
+
+
+class ExecutionTimeSketch:
+    """
+    Log-bucketed streaming quantile sketch for execution times.
+
+    Values are mapped to bucket ``ceil(log(x) / log(gamma))`` so every
+    quantile estimate is within a fixed relative error, and sketches from
+    different slots can be merged by adding bucket counts.
+    """
+
+    def __init__(self, gamma=SKETCH_GAMMA):
+        self.gamma = gamma
+        self._log_gamma = math.log(gamma)
+        self.counts = {}
+        self.total = 0
+
+    def bucket_for(self, seconds):
+        """Return the bucket index for a duration in seconds."""
+        if seconds <= SKETCH_MIN_SECONDS:
+            return 0
+        return max(1, math.ceil(math.log(seconds / SKETCH_MIN_SECONDS) / self._log_gamma))
+
+    def value_for(self, bucket):
+        """Return the representative duration in seconds for a bucket."""
+        if bucket <= 0:
+            return SKETCH_MIN_SECONDS
+        upper = SKETCH_MIN_SECONDS * self.gamma ** bucket
+        return 2 * upper / (self.gamma + 1)
+
+    def add(self, seconds, count=1):
+        self.add_bucket(self.bucket_for(seconds), count)
+
+    def add_bucket(self, bucket, count):
+        if count:
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+            self.total += count
+
+    def quantile(self, q):
+        """Return the estimated q-quantile (0 <= q <= 1) in seconds."""
+        if not self.total:
+            return None
+        rank = q * (self.total - 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen > rank:
+                return self.value_for(bucket)
+        return self.value_for(max(self.counts))
+
+
+def slot_start(moment):
+    """Truncate a datetime to the start of its rollup slot."""
+    epoch = int(moment.timestamp())
+    return moment - timedelta(seconds=epoch % SLOT_SECONDS, microseconds=moment.microsecond)
+
+
+def record_execution(execution):
+    """
+    Fold a finished execution into the per-slot histogram rollup.
+
+    Each call is a single ``UPDATE ... SET count = count + 1`` on one
+    (workflow, slot, bucket) row, so concurrent callbacks never lose counts.
+    """
+    from .models import N8NExecutionMetric
+
+    if execution.execution_time is None:
+        return
+
+    seconds = max(execution.execution_time.total_seconds(), 0)
+    lookup = {
+        'workflow_id': execution.workflow_id,
+        'slot_start': slot_start(execution.end_time),
+        'bucket': ExecutionTimeSketch().bucket_for(seconds),
+    }
+    increments = {'count': F('count') + 1}
+    if execution.status == 'error':
+        increments['error_count'] = F('error_count') + 1
+
+    try:
+        if N8NExecutionMetric.objects.filter(**lookup).update(**increments):
+            return
+        try:
+            with transaction.atomic():
+                N8NExecutionMetric.objects.create(
+                    count=1,
+                    error_count=1 if execution.status == 'error' else 0,
+                    **lookup
+                )
+        except IntegrityError:
+            # Another worker created the row first
+            N8NExecutionMetric.objects.filter(**lookup).update(**increments)
+    except Exception as e:
+        logger.error(f"Error recording execution metrics: {str(e)}")
+
+
+def workflow_window_stats(window):
+    """
+    Throughput, error rate and latency quantiles per workflow for a window.
+
+    Only rollup rows inside the window are read, so the cost depends on the
+    window length and number of workflows, not on the executions table.
+    """
+    from .models import N8NExecutionMetric
+
+    now = timezone.now()
+    since = slot_start(now - window) + timedelta(seconds=SLOT_SECONDS)
+    rows = N8NExecutionMetric.objects.filter(
+        slot_start__gte=since
+    ).values(
+        'workflow_id', 'workflow__name', 'workflow__workflow_type', 'bucket'
+    ).annotate(
+        total=Sum('count'),
+        errors=Sum('error_count')
+    )
+
+    stats = {}
+    for row in rows:
+        entry = stats.setdefault(row['workflow_id'], {
+            'workflow_id': str(row['workflow_id']),
+            'name': row['workflow__name'],
+            'workflow_type': row['workflow__workflow_type'],
+            'errors': 0,
+            'sketch': ExecutionTimeSketch(),
+        })
+        entry['errors'] += row['errors']
+        entry['sketch'].add_bucket(row['bucket'], row['total'])
+
+    window_minutes = window.total_seconds() / 60
+    results = []
+    for entry in stats.values():
+        sketch = entry.pop('sketch')
+        errors = entry.pop('errors')
+        entry.update({
+            'executions': sketch.total,
+            'throughput_per_minute': round(sketch.total / window_minutes, 3),
+            'error_rate': round(errors / sketch.total, 4) if sketch.total else 0.0,
+            'p50_seconds': _round(sketch.quantile(0.50)),
+            'p95_seconds': _round(sketch.quantile(0.95)),
+            'p99_seconds': _round(sketch.quantile(0.99)),
+        })
+        results.append(entry)
+    return sorted(results, key=lambda item: item['name'])
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('n8n_integration', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='N8NExecutionMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_start', models.DateTimeField()),
+                ('bucket', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('error_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'n8n_execution_metrics',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='n8nexecution',
+            index=models.Index(fields=['status', 'start_time'], name='n8n_executi_status_301839_idx'),
+        ),
+        migrations.AddField(
+            model_name='n8nexecutionmetric',
+            name='workflow',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='execution_metrics', to='n8n_integration.n8nworkflow'),
+        ),
+        migrations.AddIndex(
+            model_name='n8nexecutionmetric',
+            index=models.Index(fields=['slot_start'], name='n8n_executi_slot_st_4d1a30_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='n8nexecutionmetric',
+            unique_together={('workflow', 'slot_start', 'bucket')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('n8n_integration', '0002_execution_metrics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='n8nexecution',
+            index=models.Index(fields=['created_at'], name='n8n_executi_created_03dc04_idx'),
+        ),
+    ]
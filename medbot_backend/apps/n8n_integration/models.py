@@ -1,5 +1,6 @@
 from django.db import models
 import uuid
+from .metrics import TERMINAL_STATUSES, record_execution
 
 
 class N8NWorkflow(models.Model):
@@ -88,12 +89,58 @@ class N8NExecution(models.Model):
     def __str__(self):
         return f"Execution {self.n8n_execution_id} - {self.workflow.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded status so save() can detect completion
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def save(self, *args, **kwargs):
         # Calculate execution time if both start and end times are available
         if self.start_time and self.end_time:
             self.execution_time = self.end_time - self.start_time
+
+        finished = (
+            self.status in TERMINAL_STATUSES
+            and getattr(self, '_loaded_status', None) not in TERMINAL_STATUSES
+        )
         super().save(*args, **kwargs)
 
+        if finished:
+            record_execution(self)
+        self._loaded_status = self.status
+
     class Meta:
         db_table = 'n8n_executions'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'start_time']),
+            models.Index(fields=['created_at']),
+        ]
+
+
+class N8NExecutionMetric(models.Model):
+    """
+    Per-minute execution time histogram for n8n workflows.
+    Updated as executions finish so dashboards never scan execution rows.
+    """
+    workflow = models.ForeignKey(
+        N8NWorkflow,
+        on_delete=models.CASCADE,
+        related_name='execution_metrics'
+    )
+    slot_start = models.DateTimeField()
+    bucket = models.IntegerField()  # ExecutionTimeSketch bucket index
+    count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.workflow.name} @ {self.slot_start} [{self.bucket}]"
+
+    class Meta:
+        db_table = 'n8n_execution_metrics'
+        unique_together = ['workflow', 'slot_start', 'bucket']
+        indexes = [
+            models.Index(fields=['slot_start']),
+        ]
@@ -1,7 +1,9 @@
 import requests
 import json
 from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
 from django.utils import timezone
+from apps.healthcare_systems.sharding import get_across_shards
 from .models import N8NWorkflow, N8NExecution
 import logging
 
@@ -23,7 +25,7 @@ class N8NService:
         }
         self.timeout = 30
     
-    def trigger_symptom_analysis(self, consultation_id, symptoms, patient_data):
+    def trigger_symptom_analysis(self, consultation_id, symptoms, patient_data, using=DEFAULT_DB_ALIAS):
         """
         Trigger symptom analysis workflow in n8n.
         
@@ -31,6 +33,7 @@ class N8NService:
             consultation_id: UUID of the consultation
             symptoms: Patient's symptom description
             patient_data: Patient demographic and medical data
+            using: Database (tenant shard) holding the consultation
             
         Returns:
             str: n8n execution ID if successful, None if failed
@@ -67,8 +70,8 @@ class N8NService:
                 result = response.json()
                 execution_id = result.get('execution_id', f"exec_{consultation_id}")
                 
-                # Create execution record
-                N8NExecution.objects.create(
+                # Create execution record, next to its consultation
+                N8NExecution.objects.using(using).create(
                     workflow=workflow,
                     n8n_execution_id=execution_id,
                     consultation_id=consultation_id,
@@ -77,7 +80,7 @@ class N8NService:
                     start_time=timezone.now()
                 )
                 
-                logger.info(f"Triggered n8n symptom analysis: {execution_id}")
+                logger.info("Triggered n8n symptom analysis: %s", execution_id)
                 return execution_id
             else:
                 logger.error(f"n8n workflow trigger failed: {response.status_code} - {response.text}")
@@ -170,12 +173,12 @@ class N8NService:
                 
                 # Update local execution record
                 try:
-                    execution = N8NExecution.objects.get(n8n_execution_id=execution_id)
+                    execution = get_across_shards(N8NExecution, n8n_execution_id=execution_id)
                     execution.status = execution_data.get('status', 'unknown')
                     execution.output_data = execution_data.get('data', {})
                     if execution_data.get('status') in ['success', 'error']:
                         execution.end_time = timezone.now()
-                    execution.save()
+                    execution.save(update_fields=['status', 'output_data', 'end_time', 'execution_time', 'updated_at'])
                 except N8NExecution.DoesNotExist:
                     pass
                 
@@ -232,7 +235,7 @@ class N8NService:
         """
         import time
         import threading
-        from apps.consultations.models import Consultation
+        from apps.consultations.transitions import complete_analysis
         from apps.departments.models import Department
         
         def delayed_mock_response():
@@ -240,8 +243,6 @@ class N8NService:
             time.sleep(2)  # Simulate processing time
             
             try:
-                consultation = Consultation.objects.get(id=consultation_id)
-                
                 # Simple keyword-based department routing (mock AI)
                 symptoms_lower = symptoms.lower()
                 department_mapping = {
@@ -264,17 +265,14 @@ class N8NService:
                     recommended_dept = Department.objects.filter(name__icontains='Internal Medicine').first()
                 
                 # Update consultation with mock results
-                if recommended_dept:
-                    consultation.recommended_department = recommended_dept
-                consultation.confidence_score = 0.85
-                consultation.urgency_level = 'medium'
-                consultation.icd_suggestions = ['R50.9', 'R06.02']  # Mock ICD codes
-                consultation.alternative_departments = []
-                consultation.status = 'completed'
-                consultation.analysis_end_time = timezone.now()
-                consultation.save()
-                
-                logger.info(f"Mock analysis completed for consultation {consultation_id}")
+                if complete_analysis(consultation_id, {
+                    'department_id': recommended_dept.id if recommended_dept else None,
+                    'confidence_score': 0.85,
+                    'urgency_level': 'medium',
+                    'icd_codes': ['R50.9', 'R06.02'],  # Mock ICD codes
+                    'alternatives': [],
+                }):
+                    logger.info("Mock analysis completed for consultation %s", consultation_id)
                 
             except Exception as e:
                 logger.error(f"Error in mock analysis: {str(e)}")
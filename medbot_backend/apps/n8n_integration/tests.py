@@ -1,3 +1,344 @@
-from django.test import TestCase
+import json
+import random
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.consultations.models import Consultation
+from apps.consultations.transitions import fail_analysis
+from apps.departments.models import Department
+from apps.users.models import User
+from .dispatch import LaneScheduler, run_analysis
+from .metrics import SLOT_SECONDS, ExecutionTimeSketch, slot_start, workflow_window_stats
+from .models import N8NExecution, N8NExecutionMetric, N8NWorkflow
 
-# Create your tests here.
+
+class SymptomAnalysisCallbackTest(TestCase):
+    """n8n results complete pending analyses without undoing the inline triage."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.emergency = Department.objects.create(
+            name='Emergency Medicine', description='Emergency care', urgency_level='emergency'
+        )
+        cls.dermatology = Department.objects.create(
+            name='Dermatology', description='Skin', urgency_level='routine'
+        )
+        cls.patient = User.objects.create_user(username='callback', password='x')
+
+    def callback(self, consultation, **results):
+        return self.client.post('/webhooks/n8n/symptom-analysis/', json.dumps({
+            'consultation_id': str(consultation.id), 'execution_id': 'exec-1', 'results': results,
+        }), content_type='application/json')
+
+    def test_clinician_emergency_is_kept(self):
+        consultation = Consultation.objects.create(
+            patient=self.patient, symptom_description='Crushing chest pain', status='analyzing',
+            urgency_level='emergency', recommended_department=self.emergency
+        )
+        response = self.callback(
+            consultation, urgency_level='low', department_id=str(self.dermatology.id), confidence_score=0.4
+        )
+        self.assertEqual(response.json()['status'], 'success')
+        consultation.refresh_from_db()
+        self.assertEqual(consultation.status, 'completed')
+        self.assertEqual(consultation.urgency_level, 'emergency')
+        self.assertEqual(consultation.recommended_department_id, self.emergency.id)
+        self.assertEqual(float(consultation.confidence_score), 0.4)
+
+        # Without red flags the analysis decides
+        other = Consultation.objects.create(
+            patient=self.patient, symptom_description='Itchy rash', status='analyzing'
+        )
+        self.callback(other, urgency_level='low', department_id=str(self.dermatology.id))
+        other.refresh_from_db()
+        self.assertEqual((other.urgency_level, other.recommended_department_id), ('low', self.dermatology.id))
+
+    def test_analysis_revises_red_flag_triage(self):
+        def triaged():
+            return Consultation.objects.create(
+                patient=self.patient, symptom_description='Chest pain after a heavy meal', status='analyzing',
+                urgency_level='emergency', recommended_department=self.emergency, red_flag_triage=True
+            )
+
+        downgraded = triaged()
+        self.callback(downgraded, urgency_level='low', department_id=str(self.dermatology.id))
+        downgraded.refresh_from_db()
+        self.assertEqual(
+            (downgraded.urgency_level, downgraded.recommended_department_id, downgraded.red_flag_triage),
+            ('low', self.dermatology.id, False)
+        )
+
+        confirmed = triaged()
+        self.callback(confirmed, urgency_level='emergency', department_id=str(self.emergency.id))
+        confirmed.refresh_from_db()
+        self.assertEqual(
+            (confirmed.urgency_level, confirmed.recommended_department_id, confirmed.red_flag_triage),
+            ('emergency', self.emergency.id, False)
+        )
+
+    def test_late_callback_after_failure(self):
+        consultation = Consultation.objects.create(
+            patient=self.patient, symptom_description='Itchy rash', status='analyzing'
+        )
+        workflow = N8NWorkflow.objects.create(
+            name='Symptom analysis', workflow_type='symptom_analysis', n8n_workflow_id='wf-1',
+            version='1', description='Analysis', webhook_url='https://n8n.example.com/webhook/analysis'
+        )
+        execution = N8NExecution.objects.create(
+            workflow=workflow, n8n_execution_id='exec-1', consultation=consultation,
+            input_data={}, start_time=timezone.now()
+        )
+        self.assertTrue(fail_analysis(consultation.id))
+
+        response = self.callback(consultation, urgency_level='low', department_id=str(self.dermatology.id))
+        self.assertEqual(response.json()['status'], 'ignored')
+        consultation.refresh_from_db()
+        self.assertEqual((consultation.status, consultation.urgency_level), ('error', None))
+        execution.refresh_from_db()
+        self.assertEqual(execution.status, 'success')
+        self.assertEqual(execution.error_message, 'Results ignored: consultation already error')
+        self.assertIsNotNone(execution.end_time)
+
+
+class ExecutionTimeSketchTest(SimpleTestCase):
+    """Quantiles stay within the sketch's relative error, also after merging."""
+
+    def setUp(self):
+        rng = random.Random(26)
+        self.values = [rng.lognormvariate(0, 1.5) for _ in range(20000)]
+
+    def assertQuantilesClose(self, sketch, values):
+        values = sorted(values)
+        # Representative values are within (gamma - 1) / (gamma + 1) of any value in their bucket
+        tolerance = (sketch.gamma - 1) / (sketch.gamma + 1) + 1e-9
+        for q in (0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 1.0):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact) / exact, tolerance, q)
+
+    def test_quantile_accuracy(self):
+        sketch = ExecutionTimeSketch()
+        for value in self.values:
+            sketch.add(value)
+        self.assertEqual(sketch.total, len(self.values))
+        self.assertQuantilesClose(sketch, self.values)
+        self.assertIsNone(ExecutionTimeSketch().quantile(0.5))
+
+    def test_merged_buckets(self):
+        # One sketch per slot, merged by adding bucket counts as the rollup query does
+        slots = [ExecutionTimeSketch() for _ in range(4)]
+        for number, value in enumerate(self.values):
+            slots[number % 4].add(value)
+        merged = ExecutionTimeSketch()
+        for slot in slots:
+            for bucket, count in slot.counts.items():
+                merged.add_bucket(bucket, count)
+
+        whole = ExecutionTimeSketch()
+        for value in self.values:
+            whole.add(value)
+        self.assertEqual((merged.counts, merged.total), (whole.counts, whole.total))
+        self.assertQuantilesClose(merged, self.values)
+
+
+class ExecutionMetricsTest(TestCase):
+    """Executions are folded into per-minute histogram rows once, when they finish."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.workflow = N8NWorkflow.objects.create(
+            name='Symptom analysis', workflow_type='symptom_analysis', n8n_workflow_id='wf-1',
+            version='1', description='Analysis', webhook_url='https://n8n.example.com/webhook/analysis'
+        )
+
+    def execution(self, seconds, ended, status='success'):
+        execution = N8NExecution.objects.create(
+            workflow=self.workflow, n8n_execution_id=f'exec-{N8NExecution.objects.count()}', input_data={},
+            start_time=ended - timedelta(seconds=seconds)
+        )
+        execution.status, execution.end_time = status, ended
+        execution.save()
+        return execution
+
+    def rows(self):
+        return list(N8NExecutionMetric.objects.order_by('slot_start', 'bucket').values_list(
+            'slot_start', 'bucket', 'count', 'error_count'
+        ))
+
+    def test_recorded_once_when_finished(self):
+        now = timezone.now()
+        running = N8NExecution.objects.create(
+            workflow=self.workflow, n8n_execution_id='exec-running', input_data={}, start_time=now
+        )
+        running.save()
+        self.assertEqual(self.rows(), [])
+
+        execution = self.execution(2, now)
+        bucket = ExecutionTimeSketch().bucket_for(2)
+        self.assertEqual(self.rows(), [(slot_start(now), bucket, 1, 0)])
+
+        # Saving a finished execution again, in memory or reloaded, changes nothing
+        execution.output_data = {'done': True}
+        execution.save()
+        N8NExecution.objects.get(pk=execution.pk).save()
+        self.assertEqual(self.rows(), [(slot_start(now), bucket, 1, 0)])
+
+    def test_per_minute_rollup(self):
+        minute = slot_start(timezone.now())
+        self.assertEqual((minute.second, minute.microsecond), (0, 0))
+        self.execution(2, minute + timedelta(seconds=5))
+        self.execution(2, minute + timedelta(seconds=50), status='error')
+        self.execution(2, minute - timedelta(seconds=1))
+        self.execution(30, minute + timedelta(seconds=10))
+
+        bucket, slow = ExecutionTimeSketch().bucket_for(2), ExecutionTimeSketch().bucket_for(30)
+        previous = minute - timedelta(seconds=SLOT_SECONDS)
+        self.assertEqual(self.rows(), [
+            (previous, bucket, 1, 0),
+            (minute, bucket, 2, 1),
+            (minute, slow, 1, 0),
+        ])
+
+        stats, = workflow_window_stats(timedelta(hours=1))
+        self.assertEqual((stats['name'], stats['executions'], stats['error_rate']), ('Symptom analysis', 4, 0.25))
+        # Nearest rank over four values: p99 is the third fastest
+        self.assertAlmostEqual(stats['p50_seconds'], 2, delta=0.05)
+        self.assertAlmostEqual(stats['p99_seconds'], 2, delta=0.05)
+
+
+class LaneSchedulerTest(SimpleTestCase):
+    """Higher lanes go first within their limits; tenants share a lane by weight."""
+
+    def drain(self, scheduler, count):
+        popped = []
+        for _ in range(count):
+            item, lane = scheduler.pop()
+            scheduler.done(lane)
+            popped.append(item)
+        return popped
+
+    def test_lane_priority(self):
+        scheduler = LaneScheduler({'emergency': 2, 'urgent': 2, 'routine': 2})
+        for number in range(3):
+            scheduler.push(f'routine-{number}', 'routine')
+        scheduler.push('urgent-0', 'urgent')
+        scheduler.push('emergency-0', 'emergency')
+        self.assertEqual(self.drain(scheduler, 5),
+                         ['emergency-0', 'urgent-0', 'routine-0', 'routine-1', 'routine-2'])
+        self.assertIsNone(scheduler.pop())
+
+    def test_lane_limits(self):
+        scheduler = LaneScheduler({'emergency': 1, 'urgent': 1, 'routine': 1})
+        for number in range(2):
+            scheduler.push(f'emergency-{number}', 'emergency')
+            scheduler.push(f'routine-{number}', 'routine')
+        # A full emergency lane lets routine work through, but only up to its own limit
+        self.assertEqual(scheduler.pop(), ('emergency-0', 'emergency'))
+        self.assertEqual(scheduler.pop(), ('routine-0', 'routine'))
+        self.assertIsNone(scheduler.pop())
+        self.assertEqual(
+            {lane: stats['depth'] for lane, stats in scheduler.stats().items()},
+            {'emergency': 1, 'urgent': 0, 'routine': 1}
+        )
+        scheduler.done('emergency')
+        self.assertEqual(scheduler.pop(), ('emergency-1', 'emergency'))
+        self.assertIsNone(scheduler.pop())
+        scheduler.done('routine')
+        self.assertEqual(scheduler.pop(), ('routine-1', 'routine'))
+
+    def test_weighted_fairness(self):
+        scheduler = LaneScheduler({'routine': 1}, weights={'big': 3})
+        # A bulk submission from one tenant queued ahead of everyone else's work
+        for number in range(30):
+            scheduler.push(('bulk', number), 'routine', tenant='bulk')
+        for number in range(10):
+            scheduler.push(('big', number), 'routine', tenant='big')
+            scheduler.push(('small', number), 'routine', tenant='small')
+
+        first = self.drain(scheduler, 15)
+        self.assertEqual(Counter(tenant for tenant, _ in first), {'big': 9, 'bulk': 3, 'small': 3})
+        # Each tenant's own work keeps its order
+        for tenant in ('big', 'bulk', 'small'):
+            numbers = [number for name, number in first if name == tenant]
+            self.assertEqual(numbers, sorted(numbers))
+        self.assertEqual(len(self.drain(scheduler, 35)), 35)
+        self.assertIsNone(scheduler.pop())
+
+
+class StalledAnalysisSweepTest(TestCase):
+    """Analyses lost from an in-process queue are triggered again, once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user(username='stalled', password='x', preferred_language='pt')
+
+    def consultation(self, minutes_ago, **fields):
+        fields.setdefault('status', 'initiated')
+        moment = timezone.now() - timedelta(minutes=minutes_ago)
+        consultation = Consultation.objects.create(
+            patient=self.patient, symptom_description='Headache', analysis_start_time=moment, **fields
+        )
+        # updated_at is auto_now; it is when a dispatcher claimed the analysis
+        Consultation.objects.filter(pk=consultation.pk).update(updated_at=moment)
+        return Consultation.objects.get(pk=consultation.pk)
+
+    @mock.patch('apps.n8n_integration.dispatch.N8NService')
+    def test_requeue(self, service):
+        trigger = service.return_value.trigger_symptom_analysis
+        trigger.side_effect = lambda consultation_id, **kwargs: f'exec-{consultation_id}'
+        routine = self.consultation(60, pain_level=2)
+        emergency = self.consultation(30, urgency_level='emergency')
+        abandoned = self.consultation(50, status='analyzing')  # claimed, then its worker died
+        recent = self.consultation(1)
+        claimed = self.consultation(1, status='analyzing')
+        dispatched = self.consultation(60, status='analyzing', n8n_execution_id='exec-running')
+        finished = self.consultation(60, status='completed')
+
+        stdout = StringIO()
+        call_command('requeue_stalled_analyses', stdout=stdout)
+        self.assertEqual(
+            [call.kwargs['consultation_id'] for call in trigger.call_args_list],
+            [emergency.id, routine.id, abandoned.id]
+        )
+        self.assertIn('triggered 3 of 3', stdout.getvalue())
+        self.assertEqual(trigger.call_args.kwargs['patient_data']['preferred_language'], 'pt')
+        for consultation in (routine, abandoned, recent, claimed, dispatched, finished):
+            consultation.refresh_from_db()
+        self.assertEqual((routine.status, routine.n8n_execution_id), ('analyzing', f'exec-{routine.id}'))
+        self.assertEqual(abandoned.n8n_execution_id, f'exec-{abandoned.id}')
+        self.assertEqual((recent.status, claimed.n8n_execution_id), ('initiated', ''))
+        self.assertEqual(dispatched.n8n_execution_id, 'exec-running')
+
+        # The original queue entry, if its process survived after all, is skipped
+        trigger.reset_mock()
+        self.assertIsNone(run_analysis(routine, {}))
+        call_command('requeue_stalled_analyses', stdout=StringIO())
+        trigger.assert_not_called()
+
+    @mock.patch('apps.n8n_integration.dispatch.N8NService')
+    def test_worker_and_sweep_race(self, service):
+        trigger = service.return_value.trigger_symptom_analysis
+        trigger.return_value = 'exec-1'
+        queued = self.consultation(60)
+        # Both loaded the queued row; whoever claims it first triggers it
+        swept = Consultation.objects.get(pk=queued.pk)
+        self.assertEqual(run_analysis(queued, {}), 'exec-1')
+        self.assertIsNone(run_analysis(swept, {}, stalled_before=timezone.now()))
+        trigger.assert_called_once()
+
+    @mock.patch('apps.n8n_integration.dispatch.N8NService')
+    def test_failed_trigger(self, service):
+        service.return_value.trigger_symptom_analysis.return_value = None
+        queued = self.consultation(0)
+        self.assertIsNone(run_analysis(queued, {}))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'error')
+        client = APIClient()
+        client.force_authenticate(self.patient)
+        body = client.get(f'/api/symptoms/analysis/{queued.id}/analysis_status/').json()
+        self.assertEqual((body['status'], body['analysis_complete']), ('error', True))
+        self.assertEqual(body['fallback_recommendation'], 'Please consult with a healthcare provider')
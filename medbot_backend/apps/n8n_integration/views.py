@@ -5,11 +5,34 @@ from django.utils import timezone
 import json
 import logging
 from apps.consultations.models import Consultation, Appointment
+from apps.consultations.transitions import complete_analysis, current_status, fail_analysis
+from apps.healthcare_systems.sharding import get_across_shards
 from .models import N8NExecution
 
 logger = logging.getLogger(__name__)
 
 
+def _close_execution(execution_id, results, note=''):
+    """
+    Mark a symptom analysis execution successful. With a ``note`` (results
+    that were not applied), only an execution still running is closed.
+    """
+    try:
+        execution = get_across_shards(N8NExecution, n8n_execution_id=execution_id)
+    except N8NExecution.DoesNotExist:
+        logger.warning(f"N8N execution {execution_id} not found")
+        return
+    if note and execution.status != 'running':
+        return
+    execution.output_data = results
+    execution.status = 'success'
+    execution.error_message = note
+    execution.end_time = timezone.now()
+    execution.save(update_fields=[
+        'output_data', 'status', 'error_message', 'end_time', 'execution_time', 'updated_at'
+    ])
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def symptom_analysis_callback(request):
@@ -22,28 +45,22 @@ def symptom_analysis_callback(request):
         execution_id = data.get('execution_id')
         results = data.get('results', {})
 
-        logger.info(f"Received symptom analysis callback for consultation {consultation_id}")
+        logger.info("Received symptom analysis callback for consultation %s", consultation_id)
 
-        # Update consultation with results
-        consultation = Consultation.objects.get(id=consultation_id)
-        consultation.recommended_department_id = results.get('department_id')
-        consultation.confidence_score = results.get('confidence_score')
-        consultation.urgency_level = results.get('urgency_level')
-        consultation.icd_suggestions = results.get('icd_codes', [])
-        consultation.alternative_departments = results.get('alternatives', [])
-        consultation.status = 'completed'
-        consultation.analysis_end_time = timezone.now()
-        consultation.save()
+        # Update consultation with results, unless it already finished
+        if not complete_analysis(consultation_id, results):
+            current = current_status(consultation_id)
+            if current is None:
+                raise Consultation.DoesNotExist
+            logger.warning(f"Ignoring results for consultation {consultation_id}: already {current}")
+            # The workflow did finish; don't leave its execution looking stuck
+            _close_execution(execution_id, results, note=f'Results ignored: consultation already {current}')
+            return JsonResponse({
+                'status': 'ignored',
+                'message': f'Consultation is already {current}'
+            })
 
-        # Update execution record
-        try:
-            execution = N8NExecution.objects.get(n8n_execution_id=execution_id)
-            execution.output_data = results
-            execution.status = 'success'
-            execution.end_time = timezone.now()
-            execution.save()
-        except N8NExecution.DoesNotExist:
-            logger.warning(f"N8N execution {execution_id} not found")
+        _close_execution(execution_id, results)
 
         return JsonResponse({
             'status': 'success',
@@ -75,17 +92,17 @@ def appointment_booking_callback(request):
         booking_result = data.get('booking_result', {})
         execution_id = data.get('execution_id')
 
-        logger.info(f"Received appointment booking callback for execution {execution_id}")
+        logger.info("Received appointment booking callback for execution %s", execution_id)
 
         if booking_result.get('success'):
             # Update appointment record if it exists
             appointment_id = booking_result.get('appointment_id')
             if appointment_id:
-                appointment = Appointment.objects.get(id=appointment_id)
+                appointment = get_across_shards(Appointment, id=appointment_id)
                 appointment.emr_appointment_id = booking_result.get('emr_appointment_id')
                 appointment.status = 'confirmed'
                 appointment.save()
-                logger.info(f"Appointment {appointment_id} confirmed")
+                logger.info("Appointment %s confirmed", appointment_id)
 
         return JsonResponse({
             'status': 'success',
@@ -121,17 +138,17 @@ def workflow_error_callback(request):
 
         # Update execution record
         try:
-            execution = N8NExecution.objects.get(n8n_execution_id=execution_id)
+            execution = get_across_shards(N8NExecution, n8n_execution_id=execution_id)
             execution.status = 'error'
             execution.error_message = error_message
             execution.end_time = timezone.now()
-            execution.save()
+            execution.save(update_fields=['status', 'error_message', 'end_time', 'execution_time', 'updated_at'])
 
             # Handle specific error cases
-            if execution.consultation:
-                execution.consultation.status = 'error'
-                execution.consultation.save()
-                logger.info(f"Consultation {execution.consultation.id} marked as error")
+            if execution.consultation_id and fail_analysis(
+                execution.consultation_id, using=execution._state.db
+            ):
+                logger.info("Consultation %s marked as error", execution.consultation_id)
 
         except N8NExecution.DoesNotExist:
             logger.warning(f"N8N execution {execution_id} not found")
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SymptomsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.symptoms'
+
+    def ready(self):
+        from . import signals  # noqa: F401
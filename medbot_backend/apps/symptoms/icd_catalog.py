@@ -0,0 +1,298 @@
+"""
+Compact, memory-mapped ICD-10-CM catalog.
+
+``compile_catalog`` turns a CMS release file into a binary artifact, and
+``get_catalog`` maps it read-only, so every worker process shares the same
+page cache instead of holding its own copy. The artifact holds:
+
+* the sorted codes, normalized (no dot) and NUL-padded to 8 bytes,
+* ``N + 1`` offsets into a UTF-8 blob of descriptions,
+* each code's parent (nearest shorter code in the catalog) or -1,
+* each code's subtree end: its descendants are the codes up to that index,
+* a flags byte per code (billable).
+
+All integers are little-endian uint32/int32.
+"""
+
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ICD10CM\x00'
+VERSION = 1
+CODE_WIDTH = 8
+BILLABLE = 1
+# magic, version, count, then the offsets of codes, descriptions, parents, subtree ends, flags, blob
+HEADER = struct.Struct('<8sII6Q')
+
+# Every FENCE_STRIDE-th code is kept in memory to narrow searches before touching the map
+FENCE_STRIDE = 64
+
+# Check for a recompiled artifact at most this often
+CATALOG_CHECK_INTERVAL = 60
+
+CHAPTERS = [
+    (1, 'A00', 'B99', 'Certain infectious and parasitic diseases'),
+    (2, 'C00', 'D49', 'Neoplasms'),
+    (3, 'D50', 'D89', 'Diseases of the blood and blood-forming organs and certain disorders '
+                      'involving the immune mechanism'),
+    (4, 'E00', 'E89', 'Endocrine, nutritional and metabolic diseases'),
+    (5, 'F01', 'F99', 'Mental, behavioral and neurodevelopmental disorders'),
+    (6, 'G00', 'G99', 'Diseases of the nervous system'),
+    (7, 'H00', 'H59', 'Diseases of the eye and adnexa'),
+    (8, 'H60', 'H95', 'Diseases of the ear and mastoid process'),
+    (9, 'I00', 'I99', 'Diseases of the circulatory system'),
+    (10, 'J00', 'J99', 'Diseases of the respiratory system'),
+    (11, 'K00', 'K95', 'Diseases of the digestive system'),
+    (12, 'L00', 'L99', 'Diseases of the skin and subcutaneous tissue'),
+    (13, 'M00', 'M99', 'Diseases of the musculoskeletal system and connective tissue'),
+    (14, 'N00', 'N99', 'Diseases of the genitourinary system'),
+    (15, 'O00', 'O9A', 'Pregnancy, childbirth and the puerperium'),
+    (16, 'P00', 'P96', 'Certain conditions originating in the perinatal period'),
+    (17, 'Q00', 'Q99', 'Congenital malformations, deformations and chromosomal abnormalities'),
+    (18, 'R00', 'R99', 'Symptoms, signs and abnormal clinical and laboratory findings, '
+                       'not elsewhere classified'),
+    (19, 'S00', 'T88', 'Injury, poisoning and certain other consequences of external causes'),
+    (22, 'U00', 'U85', 'Codes for special purposes'),
+    (20, 'V00', 'Y99', 'External causes of morbidity'),
+    (21, 'Z00', 'Z99', 'Factors influencing health status and contact with health services'),
+]
+# In code order (chapter 22 sits between 19 and 20) for bisecting
+_chapter_starts = [start for _, start, _, _ in CHAPTERS]
+
+# icd10cm_order_YYYY.txt: order number, code, header flag (0 = category), short and long description
+_order_line = re.compile(r'^\d{5} (?P<code>[A-Z0-9]{3,7}) +(?P<billable>[01]) (?P<short>.{60}) (?P<long>.*)$')
+# icd10cm_codes_YYYY.txt: code and description (billable codes only)
+_codes_line = re.compile(r'^(?P<code>[A-Z0-9]{3,7}) +(?P<long>\S.*)$')
+
+_catalog = None
+_catalog_stat = None
+_catalog_checked = 0.0
+_catalog_lock = threading.Lock()
+
+
+class CatalogUnavailable(Exception):
+    """No compiled catalog at ``ICD_CATALOG_PATH``."""
+
+
+def normalize_code(code):
+    return code.strip().upper().replace('.', '') if isinstance(code, str) else ''
+
+
+def display_code(code):
+    """``'I2109'`` -> ``'I21.09'``."""
+    return f'{code[:3]}.{code[3:]}' if len(code) > 3 else code
+
+
+def chapter_for(code):
+    code = normalize_code(code)
+    position = bisect_left(_chapter_starts, code[:3] + '~') - 1
+    if position >= 0:
+        number, start, end, title = CHAPTERS[position]
+        if code[:3] <= end:
+            return {'chapter': number, 'range': f'{start}-{end}', 'title': title}
+    return None
+
+
+def parse_release(lines):
+    """Yield ``(code, description, billable)`` from either CMS release file layout."""
+    for line in lines:
+        line = line.rstrip('\r\n')
+        match = _order_line.match(line)
+        if match:
+            yield match['code'], match['long'].strip(), match['billable'] == '1'
+            continue
+        match = _codes_line.match(line)
+        if match:
+            yield match['code'], match['long'].strip(), True
+        elif line.strip():
+            logger.warning(f"Skipping unrecognized ICD release line: {line[:80]!r}")
+
+
+def compile_catalog(entries, path):
+    """
+    Write the artifact for ``(code, description, billable)`` entries to
+    ``path`` atomically, so running workers never map a partial file.
+    Returns the number of codes.
+    """
+    catalog = {}
+    for code, description, billable in entries:
+        code = normalize_code(code)
+        if 3 <= len(code) < CODE_WIDTH:
+            catalog[code] = (description, billable)
+    codes = sorted(catalog)
+    positions = {code: position for position, code in enumerate(codes)}
+
+    parents = []
+    for code in codes:
+        prefixes = (code[:length] for length in range(len(code) - 1, 2, -1))
+        parents.append(next((positions[prefix] for prefix in prefixes if prefix in positions), -1))
+
+    # Descendants sort right after their ancestor, so a stack finds where each subtree ends
+    subtree_ends = [0] * len(codes)
+    open_codes = []
+    for position, code in enumerate(codes):
+        while open_codes and not code.startswith(codes[open_codes[-1]]):
+            subtree_ends[open_codes.pop()] = position
+        open_codes.append(position)
+    for position in open_codes:
+        subtree_ends[position] = len(codes)
+
+    blob = bytearray()
+    description_offsets = []
+    for code in codes:
+        description_offsets.append(len(blob))
+        blob += catalog[code][0].encode()
+    description_offsets.append(len(blob))
+
+    sections = [
+        b''.join(code.encode().ljust(CODE_WIDTH, b'\0') for code in codes),
+        struct.pack(f'<{len(description_offsets)}I', *description_offsets),
+        struct.pack(f'<{len(parents)}i', *parents),
+        struct.pack(f'<{len(subtree_ends)}I', *subtree_ends),
+        bytes(BILLABLE if catalog[code][1] else 0 for code in codes),
+        bytes(blob),
+    ]
+    offsets, position = [], HEADER.size
+    for section in sections:
+        position += -position % 8  # keep every section 8-byte aligned
+        offsets.append(position)
+        position += len(section)
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as artifact:
+        artifact.write(HEADER.pack(MAGIC, VERSION, len(codes), *offsets))
+        for offset, section in zip(offsets, sections):
+            artifact.write(b'\0' * (offset - artifact.tell()))
+            artifact.write(section)
+    os.replace(tmp_path, path)
+    return len(codes)
+
+
+class ICDCatalog:
+    """Read-only view of a compiled catalog; lookups touch only the pages they need."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as artifact:
+            self._map = mmap.mmap(artifact.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, *offsets = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise CatalogUnavailable(f"{path} is not a version {VERSION} ICD-10 catalog")
+        if sys.byteorder != 'little':
+            raise CatalogUnavailable('ICD-10 catalogs can only be mapped on little-endian hosts')
+
+        self._count = count
+        self._codes_at, descriptions_at, parents_at, subtree_at, flags_at, self._blob_at = offsets
+        view = memoryview(self._map)
+        self._descriptions = view[descriptions_at:descriptions_at + 4 * (count + 1)].cast('I')
+        self._parents = view[parents_at:parents_at + 4 * count].cast('i')
+        self._subtree_ends = view[subtree_at:subtree_at + 4 * count].cast('I')
+        self._flags = view[flags_at:flags_at + count]
+        self._fence = [self[position] for position in range(0, count, FENCE_STRIDE)]
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, position):
+        # Sequence protocol over the padded codes, for bisect
+        start = self._codes_at + position * CODE_WIDTH
+        return self._map[start:start + CODE_WIDTH]
+
+    def _bisect(self, key):
+        """Position of the first code >= ``key`` (a padded code)."""
+        low = max(bisect_right(self._fence, key) - 1, 0) * FENCE_STRIDE
+        return bisect_left(self, key, low, min(low + FENCE_STRIDE, self._count))
+
+    def _code(self, position):
+        return self[position].rstrip(b'\0').decode()
+
+    def _find(self, code):
+        key = normalize_code(code).encode()
+        if not 3 <= len(key) < CODE_WIDTH:
+            return None
+        key = key.ljust(CODE_WIDTH, b'\0')
+        # Scan the fence block in one C-level search rather than bisecting through __getitem__
+        low = max(bisect_right(self._fence, key) - 1, 0) * FENCE_STRIDE
+        start = self._codes_at + low * CODE_WIDTH
+        block = self._map[start:start + FENCE_STRIDE * CODE_WIDTH]
+        offset = block.find(key)
+        while offset > 0 and offset % CODE_WIDTH:
+            offset = block.find(key, offset + 1)
+        return low + offset // CODE_WIDTH if offset >= 0 else None
+
+    def _entry(self, position):
+        code = self._code(position)
+        start, end = self._descriptions[position], self._descriptions[position + 1]
+        parent = self._parents[position]
+        return {
+            'code': display_code(code),
+            'description': self._map[self._blob_at + start:self._blob_at + end].decode(),
+            'billable': bool(self._flags[position] & BILLABLE),
+            'parent': display_code(self._code(parent)) if parent >= 0 else None,
+        }
+
+    def __contains__(self, code):
+        return self._find(code) is not None
+
+    def lookup(self, code):
+        """Code, description, billable flag and parent, or ``None`` for unknown codes."""
+        position = self._find(code)
+        return self._entry(position) if position is not None else None
+
+    def children(self, code):
+        """Direct children of a code."""
+        position = self._find(code)
+        if position is None:
+            return []
+        return [
+            self._entry(child)
+            for child in range(position + 1, self._subtree_ends[position])
+            if self._parents[child] == position
+        ]
+
+    def search_prefix(self, prefix, limit=20):
+        """Autocomplete: codes starting with ``prefix``, in code order."""
+        key = normalize_code(prefix).encode()
+        if not key or len(key) >= CODE_WIDTH:
+            return []
+        start = self._bisect(key.ljust(CODE_WIDTH, b'\0'))
+        end = self._bisect((key + b'\x7f').ljust(CODE_WIDTH, b'\0'))
+        return [self._entry(position) for position in range(start, min(end, start + limit))]
+
+    def rollup(self, codes):
+        """Count codes per chapter, most frequent first; unknown codes are skipped."""
+        counts = {}
+        for code in codes:
+            chapter = chapter_for(code) if code in self else None
+            if chapter:
+                counts.setdefault(chapter['chapter'], {**chapter, 'count': 0})['count'] += 1
+        return sorted(counts.values(), key=lambda chapter: (-chapter['count'], chapter['chapter']))
+
+
+def get_catalog():
+    """This process's mapping of ``ICD_CATALOG_PATH``, remapped when the file is replaced."""
+    global _catalog, _catalog_stat, _catalog_checked
+    now = time.monotonic()
+    if _catalog is not None and now - _catalog_checked < CATALOG_CHECK_INTERVAL:
+        return _catalog
+
+    with _catalog_lock:
+        path = settings.ICD_CATALOG_PATH
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise CatalogUnavailable(f"No ICD-10 catalog at {path}; run compile_icd_catalog")
+        if _catalog is None or (stat.st_ino, stat.st_mtime_ns) != _catalog_stat:
+            _catalog = ICDCatalog(path)
+            _catalog_stat = (stat.st_ino, stat.st_mtime_ns)
+        _catalog_checked = now
+        return _catalog
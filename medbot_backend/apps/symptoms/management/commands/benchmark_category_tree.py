@@ -0,0 +1,94 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from apps.symptoms.models import MAX_CATEGORY_DEPTH, Symptom, SymptomCategory
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare subtree symptom queries using level-by-level parent lookups '
+        'versus materialized category paths, on deep and wide trees'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depth', type=int, default=MAX_CATEGORY_DEPTH - 2)
+        parser.add_argument('--fanout', type=int, default=8)
+        parser.add_argument('--levels', type=int, default=4)
+        parser.add_argument('--symptoms-per-category', type=int, default=2)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        prefix = f'bench-{time.time_ns()}'
+        created = []
+        try:
+            # Deep: one chain; wide: every category has ``fanout`` children
+            chain = [None]
+            for level in range(options['depth']):
+                chain.append(self._category(f'{prefix} deep {level}', chain[-1], created))
+            wide = [self._category(f'{prefix} wide', None, created)]
+            level_nodes = wide
+            for level in range(1, options['levels']):
+                level_nodes = [
+                    self._category(f'{prefix} wide {level}.{position}.{child}', parent, created)
+                    for position, parent in enumerate(level_nodes)
+                    for child in range(options['fanout'])
+                ]
+                wide.extend(level_nodes)
+
+            per_category = options['symptoms_per_category']
+            Symptom.objects.bulk_create([
+                Symptom(name=f'{category.name} #{number}', description='benchmark', category=category)
+                for category in created for number in range(per_category)
+            ], batch_size=1000)
+
+            for name, root in (('deep', chain[1]), ('wide', wide[0])):
+                self.stdout.write(f'{name}: {self._describe(root)}')
+                for method in (self._recursive, self._by_path):
+                    self._report(method, root, options['repeat'])
+
+            # Move a branch of the wide tree under the top of the deep chain
+            moved = wide[1]
+            description = self._describe(moved)
+            moved.parent_category = chain[1]
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                moved.save()
+                elapsed = (time.perf_counter() - start) * 1000
+            self.stdout.write(f'moving a subtree of {description}: {len(queries)} queries, {elapsed:.1f} ms')
+        finally:
+            SymptomCategory.objects.filter(pk__in=[category.pk for category in created]).delete()
+
+    def _category(self, name, parent, created):
+        category = SymptomCategory.objects.create(name=name, description='benchmark', parent_category=parent)
+        created.append(category)
+        return category
+
+    def _describe(self, root):
+        depths = list(SymptomCategory.objects.filter(path__startswith=root.path).values_list('depth', flat=True))
+        return f'{len(depths)} categories, {max(depths) - root.depth + 1} levels'
+
+    def _recursive(self, root):
+        """Collect descendants one level at a time, as parent_category alone requires."""
+        category_ids, level = [root.pk], [root.pk]
+        while level:
+            level = list(SymptomCategory.objects.filter(parent_category__in=level).values_list('pk', flat=True))
+            category_ids.extend(level)
+        return list(Symptom.objects.filter(category__in=category_ids).values_list('pk', flat=True))
+
+    def _by_path(self, root):
+        path = SymptomCategory.objects.filter(pk=root.pk).values_list('path', flat=True).first()
+        return list(Symptom.objects.filter(category__path__startswith=path).values_list('pk', flat=True))
+
+    def _report(self, method, root, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                found = method(root)
+                timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f'  {method.__name__.lstrip("_"):<10} {len(found)} symptoms, {len(queries)} queries, '
+            f'{statistics.median(timings):.2f} ms median'
+        )
@@ -0,0 +1,78 @@
+import statistics
+import threading
+import time
+from unittest import mock
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.consultations.models import Consultation
+from apps.symptoms.red_flags import get_matcher
+from apps.symptoms.views import SymptomAnalysisViewSet
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure analyze_symptoms latency for red-flag descriptions under concurrent load; '
+        'the background confirmation analysis is not dispatched'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=100, help='Requests per thread')
+        parser.add_argument('--slo-ms', type=float, default=50)
+
+    def handle(self, *args, **options):
+        matcher = get_matcher()
+        if not len(matcher):
+            raise CommandError('No emergency indicator symptoms; run populate_sample_data first')
+        phrase = next(iter(matcher._symptoms))
+
+        user = User.objects.create_user(username=f'emergency-benchmark-{time.time_ns()}')
+        view = SymptomAnalysisViewSet.as_view({'post': 'analyze_symptoms'})
+        factory = APIRequestFactory()
+        timings, statuses = [], []
+        barrier = threading.Barrier(options['threads'])
+
+        def worker():
+            local = []
+            barrier.wait()
+            try:
+                for number in range(options['requests']):
+                    request = factory.post(
+                        '/api/symptoms/analysis/analyze_symptoms/',
+                        {'symptoms': f'Sudden {phrase} #{number}, sweating and dizzy'}, format='json'
+                    )
+                    force_authenticate(request, user=user)
+                    start = time.perf_counter()
+                    response = view(request)
+                    local.append((time.perf_counter() - start) * 1000)
+                    statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+            timings.extend(local)
+
+        try:
+            with mock.patch('apps.symptoms.views.dispatch_analysis'):
+                threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+        finally:
+            for alias in connections:
+                Consultation.objects.using(alias).filter(patient_id=user.id).delete()
+            user.delete()
+
+        timings.sort()
+        p99 = timings[int(len(timings) * 0.99)]
+        self.stdout.write(
+            f'{len(timings)} red-flag requests on {options["threads"]} threads: '
+            f'{len(timings) / elapsed:.0f} req/s, p50 {statistics.median(timings):.1f} ms, '
+            f'p99 {p99:.1f} ms, non-202: {sum(code != 202 for code in statuses)}'
+        )
+        if p99 > options['slo_ms']:
+            raise CommandError(f'p99 {p99:.1f} ms exceeds the {options["slo_ms"]:.0f} ms SLO')
+        self.stdout.write(self.style.SUCCESS(f'Within the {options["slo_ms"]:.0f} ms SLO'))
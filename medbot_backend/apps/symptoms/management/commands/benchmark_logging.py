@@ -0,0 +1,116 @@
+import logging
+import os
+import queue
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from medbot.structured_logging import (
+    DEFAULT_REDACTED_FIELDS,
+    JSONFormatter,
+    QueueingHandler,
+    Redactor,
+    RoutingQueueListener,
+    SamplingFilter,
+)
+
+REQUEST_DATA = {
+    'symptoms': 'Persistent headache with nausea and blurred vision since Monday morning',
+    'duration': '3 days',
+    'pain_level': '6',
+    'additional_info': 'History of migraines, allergic to penicillin',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure per-request logging latency under concurrent load with a synchronous '
+        'file handler versus the queued, redacting JSON pipeline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=500, help='Requests per thread')
+        parser.add_argument('--sample-per-second', type=int, default=20)
+        parser.add_argument(
+            '--io-wait-ms', type=float, default=1.0,
+            help='Untimed wait per request standing in for database and n8n calls'
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            formatter = logging.Formatter(
+                '{levelname} {asctime} {module} {process:d} {thread:d} {message}', style='{'
+            )
+            self._run('file handler', options, directory, formatter, self._fstring_request)
+
+            for name, per_second in (('queue', 0), ('queue+sampling', options['sample_per_second'])):
+                self._run(name, options, directory, JSONFormatter(), self._lazy_request, per_second)
+
+    def _run(self, name, options, directory, formatter, request, sample_per_second=None):
+        path = os.path.join(directory, f'{uuid.uuid4().hex}.log')
+        file_handler = logging.FileHandler(path)
+        file_handler.setFormatter(formatter)
+        logger = logging.getLogger(f'medbot.benchmark.{uuid.uuid4().hex}')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+
+        listener = None
+        if sample_per_second is None:
+            logger.addHandler(file_handler)
+        else:
+            log_queue = queue.Queue(100000)
+            handler = QueueingHandler(log_queue, [file_handler])
+            handler.addFilter(SamplingFilter(sample_per_second))
+            logger.addHandler(handler)
+            listener = RoutingQueueListener(log_queue, Redactor(DEFAULT_REDACTED_FIELDS))
+            listener.start()
+
+        timings = []
+        io_wait = options['io_wait_ms'] / 1000
+        barrier = threading.Barrier(options['threads'])
+
+        def worker():
+            local = []
+            barrier.wait()
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                request(logger)
+                local.append((time.perf_counter() - start) * 1e6)
+                time.sleep(io_wait)
+            timings.extend(local)
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if listener:
+            listener.stop()
+        drained = time.perf_counter() - start
+        file_handler.close()
+
+        with open(path, 'rb') as log_file:
+            lines = sum(1 for _ in log_file)
+        timings.sort()
+        self.stdout.write(
+            f'{name:<15} p50 {statistics.median(timings):7.1f} us  '
+            f'p99 {timings[int(len(timings) * 0.99)]:8.1f} us  '
+            f'{lines} lines written, drained in {drained:.2f} s'
+        )
+
+    def _fstring_request(self, logger):
+        """The analyze_symptoms logging as written before the queue."""
+        consultation_id, user_id = uuid.uuid4(), uuid.uuid4()
+        logger.info(f"Received symptom analysis request: {REQUEST_DATA}")
+        logger.info(f"Created consultation {consultation_id} for user {user_id}")
+        logger.info(f"Triggered n8n symptom analysis: {consultation_id}")
+
+    def _lazy_request(self, logger):
+        consultation_id, user_id = uuid.uuid4(), uuid.uuid4()
+        logger.info("Received symptom analysis request: %s", REQUEST_DATA)
+        logger.info("Created consultation %s for user %s", consultation_id, user_id)
+        logger.info("Triggered n8n symptom analysis: %s", consultation_id)
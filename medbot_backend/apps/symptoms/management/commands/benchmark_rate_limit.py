@@ -0,0 +1,82 @@
+import statistics
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.symptoms.views import SymptomAnalysisViewSet
+from apps.users.models import User
+from medbot.throttling import TokenBucketThrottle, get_bucket_store
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the per-request overhead of the token-bucket throttle with the configured '
+        'bucket store, and the cost of answering a rejected request'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=500, help='Distinct users (and IPs)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Bucket store: {type(get_bucket_store()).__name__}')
+        factory = APIRequestFactory()
+        users = [User(pk=uuid.uuid4(), username=f'rate-{number}') for number in range(options['users'])]
+        view = SymptomAnalysisViewSet(action='analysis_status', throttle_scope='analysis_status')
+        throttle = TokenBucketThrottle()
+
+        tenants = [str(uuid.uuid4()) for _ in range(10)]
+        requests = []
+        for number in range(options['requests']):
+            client = number % len(users)
+            request = Request(factory.get(
+                '/api/symptoms/analysis/1/analysis_status/',
+                REMOTE_ADDR=f'10.0.{client // 250}.{client % 250}',
+                HTTP_X_HEALTHCARE_SYSTEM=tenants[client % len(tenants)],
+            ))
+            request.user = users[client]
+            requests.append(request)
+
+        # Generous buckets: every request is admitted and pays the full check-and-debit
+        admitted = self._time(throttle, requests, view, capacity=10 ** 9)
+        # One token each: after the first request per user, everything is rejected
+        rejected = self._time(throttle, requests, view, capacity=1)
+
+        for name, timings in (('admitted', admitted), ('rejected', rejected)):
+            timings.sort()
+            self.stdout.write(
+                f'{name:<9} p50 {statistics.median(timings):6.1f} µs  '
+                f'p99 {timings[int(len(timings) * 0.99)]:6.1f} µs  per request'
+            )
+
+        request = factory.get('/api/symptoms/analysis/1/analysis_status/', REMOTE_ADDR='10.9.9.9')
+        force_authenticate(request, user=User(pk=uuid.uuid4(), username='rate-rejected'))
+        handler = SymptomAnalysisViewSet.as_view({'get': 'analysis_status'})
+        timings = []
+        with self._buckets(capacity=1):
+            handler(request, pk=str(uuid.uuid4()))  # spends the only token
+            for _ in range(1000):
+                start = time.perf_counter()
+                response = handler(request, pk=str(uuid.uuid4()))
+                timings.append((time.perf_counter() - start) * 1e6)
+        self.stdout.write(
+            f'429 response end to end: p50 {statistics.median(timings):.0f} µs '
+            f'(status {response.status_code}, Retry-After {response["Retry-After"]})'
+        )
+
+    def _buckets(self, capacity):
+        buckets = {
+            kind: {'capacity': capacity, 'refill_per_second': 1e-3} for kind in ('user', 'ip', 'tenant')
+        }
+        return override_settings(RATE_LIMIT_BUCKETS=buckets, RATE_LIMIT_ENABLED=True)
+
+    def _time(self, throttle, requests, view, capacity):
+        timings = []
+        with self._buckets(capacity):
+            for request in requests:
+                start = time.perf_counter()
+                throttle.allow_request(request, view)
+                timings.append((time.perf_counter() - start) * 1e6)
+        return timings
@@ -0,0 +1,49 @@
+import io
+import os
+import time
+import zipfile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.symptoms.icd_catalog import compile_catalog, parse_release
+
+RELEASE_PREFIXES = ('icd10cm_order_', 'icd10cm_codes_')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compile an ICD-10-CM release file (icd10cm_order_YYYY.txt, icd10cm_codes_YYYY.txt '
+        'or the CMS zip containing one) into the memory-mapped catalog'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('release', help='Release .txt file or CMS code descriptions .zip')
+        parser.add_argument('--output', default=None, help='Defaults to ICD_CATALOG_PATH')
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.ICD_CATALOG_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+        start = time.monotonic()
+        with self._open_release(options['release']) as release:
+            count = compile_catalog(parse_release(release), output)
+        if not count:
+            raise CommandError('No ICD-10 codes found in the release file')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Compiled {count} codes into {output} '
+            f'({os.path.getsize(output) / 1024:.0f} KB) in {time.monotonic() - start:.1f}s'
+        ))
+
+    def _open_release(self, path):
+        if not zipfile.is_zipfile(path):
+            return open(path, encoding='utf-8', errors='replace')
+
+        archive = zipfile.ZipFile(path)
+        names = sorted(
+            name for name in archive.namelist()
+            if os.path.basename(name).startswith(RELEASE_PREFIXES) and name.endswith('.txt')
+        )
+        if not names:
+            raise CommandError(f'{path} contains no icd10cm_order_*.txt or icd10cm_codes_*.txt file')
+        # The order file also has the non-billable categories, so prefer it
+        return io.TextIOWrapper(archive.open(names[-1]), encoding='utf-8', errors='replace')
@@ -0,0 +1,135 @@
+import json
+import queue
+import random
+import statistics
+import threading
+import time
+from unittest import mock
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from apps.symptoms.red_flags import RedFlagMatcher
+from medbot.load_shedding import AdaptiveLimiter, LoadSheddingMiddleware
+
+# kind: (share of traffic, method, path, service time in ms)
+TRAFFIC = {
+    'browse': (0.40, 'GET', '/api/symptoms/symptoms/', 10),
+    'status': (0.30, 'GET', '/api/symptoms/analysis/7d0c/analysis_status/', 5),
+    'default': (0.10, 'GET', '/api/consultations/', 20),
+    'analysis': (0.15, 'POST', '/api/symptoms/analysis/analyze_symptoms/', 40),
+    'emergency': (0.03, 'POST', '/api/symptoms/analysis/analyze_symptoms/', 40),
+    'callback': (0.02, 'POST', '/webhooks/n8n/symptom-analysis/', 10),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the load-shedding middleware with open-loop traffic at a multiple of what a pool '
+        'of server threads can serve, with shedding off and on, and report goodput and latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--load', type=float, default=3.0, help='Offered load as a multiple of capacity')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of traffic')
+        parser.add_argument('--threads', type=int, default=4, help='Server threads')
+        parser.add_argument('--timeout', type=float, default=2.0, help='Client timeout in seconds')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        mean_service = sum(share * ms for share, _, _, ms in TRAFFIC.values()) / 1000
+        capacity = options['threads'] / mean_service
+        rate = capacity * options['load']
+        self.stdout.write(
+            f'Capacity ~{capacity:.0f} req/s ({options["threads"]} threads, {mean_service * 1000:.1f} ms '
+            f'mean service), offered {rate:.0f} req/s for {options["duration"]:.0f} s, '
+            f'{options["timeout"]:.0f} s client timeout'
+        )
+
+        matcher = RedFlagMatcher([(1, 'Chest Pain', ['heart pain'])])
+        with mock.patch('apps.symptoms.red_flags.get_matcher', return_value=matcher):
+            for shedding in (False, True):
+                results, elapsed = self._run(rate, shedding, options)
+                self._report('shedding on' if shedding else 'shedding off', results, elapsed, options)
+
+    def _run(self, rate, shedding, options):
+        def view(request):
+            time.sleep(request.service)
+            return HttpResponse(b'{}', content_type='application/json')
+
+        middleware = LoadSheddingMiddleware(view)
+        middleware.enabled = shedding
+        middleware.limiter = AdaptiveLimiter(
+            target=settings.LOAD_SHEDDING_TARGET_MS / 1000,
+            interval=settings.LOAD_SHEDDING_INTERVAL_MS / 1000,
+            initial_limit=settings.LOAD_SHEDDING_MAX_CONCURRENCY,
+            min_limit=settings.LOAD_SHEDDING_MIN_CONCURRENCY,
+            max_limit=settings.LOAD_SHEDDING_MAX_CONCURRENCY,
+            backoff=settings.LOAD_SHEDDING_BACKOFF,
+            shares=settings.LOAD_SHEDDING_SHARES,
+        )
+        factory = RequestFactory()
+        backlog = queue.Queue()
+        results = []
+
+        def serve():
+            while True:
+                item = backlog.get()
+                if item is None:
+                    return
+                kind, arrived = item
+                _, method, path, service_ms = TRAFFIC[kind]
+                body = {'symptoms': 'Sudden heart pain' if kind == 'emergency' else 'Mild headache'}
+                request = (factory.post if method == 'POST' else factory.get)(
+                    path, json.dumps(body) if method == 'POST' else None,
+                    content_type='application/json', HTTP_X_REQUEST_START=f't={arrived:.3f}'
+                )
+                request.service = service_ms / 1000
+                response = middleware(request)
+                results.append((kind, response.status_code, time.time() - arrived))
+
+        threads = [threading.Thread(target=serve) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+
+        # Open loop: clients keep arriving whatever the server's latency
+        rng = random.Random(options['seed'])
+        kinds, weights = list(TRAFFIC), [share for share, *_ in TRAFFIC.values()]
+        start = time.time()
+        next_arrival = start
+        while next_arrival < start + options['duration']:
+            delay = next_arrival - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            backlog.put((rng.choices(kinds, weights)[0], next_arrival))
+            next_arrival += rng.expovariate(rate)
+        for _ in threads:
+            backlog.put(None)
+        for thread in threads:
+            thread.join()
+        return results, time.time() - start
+
+    def _report(self, name, results, elapsed, options):
+        timeout = options['timeout']
+        # Goodput: share of the threads' time spent on responses that arrived before the client gave up
+        useful = sum(TRAFFIC[kind][3] for kind, status, latency in results if status == 200 and latency <= timeout)
+        self.stdout.write(
+            f'{name}: goodput {useful / 1000 / (options["threads"] * elapsed):.0%} of capacity, '
+            f'drained in {elapsed:.1f} s'
+        )
+        for kind in TRAFFIC:
+            served = sorted(latency for k, status, latency in results if k == kind and status == 200)
+            shed = sorted(latency for k, status, latency in results if k == kind and status == 503)
+            late = sum(1 for latency in served if latency > timeout)
+            line = (
+                f'  {kind:<10} sent {len(served) + len(shed):<5} in time {len(served) - late:<5} '
+                f'late {late:<5} shed {len(shed):<5}'
+            )
+            if served:
+                line += (
+                    f' latency p50 {statistics.median(served) * 1000:6.0f} ms'
+                    f' p99 {served[int(len(served) * 0.99)] * 1000:6.0f} ms'
+                )
+            if shed:
+                line += f'  503 p50 {statistics.median(shed) * 1000:4.0f} ms'
+            self.stdout.write(line)
@@ -19,42 +19,48 @@ class Command(BaseCommand):
                 'description': 'General internal medicine and primary care',
                 'urgency_level': 'medium',
                 'average_wait_time': 30,
-                'specialization_keywords': ['general', 'primary care', 'internal', 'fever', 'fatigue']
+                'specialization_keywords': ['general', 'primary care', 'internal', 'fever', 'fatigue'],
+                'icd_code_ranges': ['A00-B99', 'E00-E89', 'R50-R69']
             },
             {
                 'name': 'Cardiology',
                 'description': 'Heart and cardiovascular conditions',
                 'urgency_level': 'high',
                 'average_wait_time': 45,
-                'specialization_keywords': ['heart', 'chest pain', 'cardiac', 'cardiovascular']
+                'specialization_keywords': ['heart', 'chest pain', 'cardiac', 'cardiovascular'],
+                'icd_code_ranges': ['I00-I99', 'R00-R01', 'R07']
             },
             {
                 'name': 'Neurology',
                 'description': 'Brain and nervous system disorders',
                 'urgency_level': 'high',
                 'average_wait_time': 60,
-                'specialization_keywords': ['headache', 'migraine', 'seizure', 'neurological']
+                'specialization_keywords': ['headache', 'migraine', 'seizure', 'neurological'],
+                'icd_code_ranges': ['G00-G99', 'R25-R29', 'R51']
             },
             {
                 'name': 'Orthopedics',
                 'description': 'Bone, joint, and muscle conditions',
                 'urgency_level': 'medium',
                 'average_wait_time': 40,
-                'specialization_keywords': ['bone', 'joint', 'muscle', 'fracture', 'pain']
+                'specialization_keywords': ['bone', 'joint', 'muscle', 'fracture', 'pain'],
+                'icd_code_ranges': ['M00-M99', 'S00-T14']
             },
             {
                 'name': 'Dermatology',
                 'description': 'Skin conditions and disorders',
                 'urgency_level': 'low',
                 'average_wait_time': 25,
-                'specialization_keywords': ['skin', 'rash', 'acne', 'dermatitis']
+                'specialization_keywords': ['skin', 'rash', 'acne', 'dermatitis'],
+                'icd_code_ranges': ['L00-L99', 'R21']
             },
             {
                 'name': 'Emergency Medicine',
                 'description': 'Emergency and urgent care',
                 'urgency_level': 'emergency',
                 'average_wait_time': 15,
-                'specialization_keywords': ['emergency', 'urgent', 'trauma', 'critical']
+                'specialization_keywords': ['emergency', 'urgent', 'trauma', 'critical'],
+                'icd_code_ranges': ['S00-T88', 'I46', 'R57']
             }
         ]
         
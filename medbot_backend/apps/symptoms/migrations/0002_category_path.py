@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    SymptomCategory = apps.get_model('symptoms', 'SymptomCategory')
+    manager = SymptomCategory.objects.using(schema_editor.connection.alias)
+
+    children = {}
+    for category_id, parent_id in manager.values_list('id', 'parent_category_id'):
+        children.setdefault(parent_id, []).append(category_id)
+
+    level = [(category_id, '', 0) for category_id in children.get(None, [])]
+    while level:
+        next_level = []
+        for category_id, parent_path, depth in level:
+            path = f'{parent_path}{category_id.hex}/'
+            manager.filter(id=category_id).update(path=path, depth=depth)
+            next_level.extend((child_id, path, depth + 1) for child_id in children.get(category_id, []))
+        level = next_level
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('symptoms', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='symptomcategory',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=990),
+        ),
+        migrations.AddField(
+            model_name='symptomcategory',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,14 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Concat, Substr
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 import uuid
 
+# Each level of SymptomCategory.path is a 32-character hex id and a '/'
+CATEGORY_PATH_SEGMENT = 33
+MAX_CATEGORY_DEPTH = 30
+
 
 class SymptomCategory(models.Model):
     """
@@ -17,12 +24,77 @@ class SymptomCategory(models.Model):
         blank=True,
         related_name='subcategories'
     )
+    # Materialized path: hex ids of the ancestors and the category itself, root
+    # first, so a subtree is one indexed prefix match. Maintained by save().
+    path = models.CharField(
+        max_length=CATEGORY_PATH_SEGMENT * MAX_CATEGORY_DEPTH,
+        db_index=True,
+        editable=False,
+        default=''
+    )
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+    def _tree_position(self, using):
+        """
+        ``(stored, placed)``: the stored ``(path, depth)`` (``None`` for a new
+        category) and those under the current parent. Raises ``ValidationError``
+        if the parent is the category itself or one of its descendants.
+        """
+        manager = type(self)._base_manager.using(using)
+        stored = None
+        if not self._state.adding:
+            # An empty path (rows bulk-created without one) is treated as not placed yet
+            stored = manager.filter(pk=self.pk).exclude(path='').values_list('path', 'depth').first()
+
+        parent_path, parent_depth = '', -1
+        if self.parent_category_id is not None:
+            parent = manager.filter(pk=self.parent_category_id).values_list('path', 'depth').first()
+            if parent is None:
+                raise ValidationError({'parent_category': 'Parent category does not exist.'})
+            parent_path, parent_depth = parent
+            if stored and parent_path.startswith(stored[0]):
+                raise ValidationError(
+                    {'parent_category': 'A category cannot be moved under itself or its subcategories.'}
+                )
+
+        placed = (f'{parent_path}{self.pk.hex}/', parent_depth + 1)
+        deepest = placed[1]
+        if stored and stored[1] < placed[1]:
+            subtree_depth = manager.filter(path__startswith=stored[0]).aggregate(depth=Max('depth'))['depth']
+            deepest += (subtree_depth or stored[1]) - stored[1]
+        if deepest >= MAX_CATEGORY_DEPTH:
+            raise ValidationError(
+                {'parent_category': f'Categories cannot be nested more than {MAX_CATEGORY_DEPTH} levels deep.'}
+            )
+        return stored, placed
+
+    def clean(self):
+        super().clean()
+        self._tree_position(router.db_for_write(type(self), instance=self))
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            stored, (self.path, self.depth) = self._tree_position(using)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'path', 'depth'}
+            super().save(*args, **kwargs)
+
+            # A move rewrites the prefix of every descendant in one statement
+            if stored and stored[0] != self.path:
+                old_path, old_depth = stored
+                type(self)._base_manager.using(using).filter(
+                    path__startswith=old_path
+                ).exclude(pk=self.pk).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (self.depth - old_depth),
+                )
+
     class Meta:
         db_table = 'symptom_categories'
         verbose_name_plural = 'Symptom Categories'
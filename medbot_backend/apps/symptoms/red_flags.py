@@ -0,0 +1,138 @@
+"""
+Inline red-flag detection for symptom descriptions.
+
+The names and keywords of every ``Symptom.is_emergency_indicator`` symptom
+are compiled into one case-insensitive regular expression (whole words,
+longest phrase first, any whitespace between words), so checking a
+description is a single scan that needs no database access. A mention is
+ignored when a negation cue ("no", "denies", "without", ...) appears among
+the few words before it in the same clause, as in "no chest pain" or
+"denies fever or shortness of breath"; a clause ends at punctuation or a
+contrasting word such as "but". The emergency
+department is resolved when the matcher is built: the department named
+``EMERGENCY_DEPARTMENT_NAME``, else the first active department with
+``emergency`` urgency.
+
+The matcher is rebuilt per process after symptoms change in this process
+and, for other processes, once the symptoms or departments version stamps
+change (checked every ``RED_FLAG_CHECK_INTERVAL`` seconds).
+"""
+
+import logging
+import re
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+RED_FLAG_CHECK_INTERVAL = 5
+
+# Words before a mention searched for a negation cue
+NEGATION_WINDOW = 5
+NEGATION_CUES = re.compile(
+    r"\b(?:no|not|never|denies|denied|deny|denying|without|negative\s+for|free\s+of|absence\s+of)\b|n['’]t\b",
+    re.IGNORECASE
+)
+CLAUSE_BOUNDARY = re.compile(
+    r"[.;:!?,\n]|\b(?:but|however|although|though|except|yet|now|and\s+then)\b", re.IGNORECASE
+)
+
+_matcher = None
+_matcher_token = None
+_matcher_checked = 0.0
+_matcher_lock = threading.Lock()
+
+
+class RedFlagMatcher:
+    """Find emergency-indicator symptoms mentioned in free text."""
+
+    def __init__(self, symptoms, department=None):
+        """
+        ``symptoms``: iterable of ``(id, name, keywords)``; ``department``:
+        ``{'id', 'name'}`` of the emergency department, or ``None``.
+        """
+        self.department = department
+        self._symptoms = {}
+        for symptom_id, name, keywords in symptoms:
+            symptom = {'id': str(symptom_id), 'name': name}
+            for phrase in [name, *(keywords or ())]:
+                if isinstance(phrase, str) and phrase.split():
+                    self._symptoms.setdefault(' '.join(phrase.lower().split()), symptom)
+
+        phrases = sorted(self._symptoms, key=len, reverse=True)
+        self._pattern = re.compile(
+            r'\b(?:' + '|'.join(r'\s+'.join(map(re.escape, phrase.split())) for phrase in phrases) + r')\b',
+            re.IGNORECASE
+        ) if phrases else None
+
+    def __len__(self):
+        return len(self._symptoms)
+
+    def match(self, text):
+        """Emergency symptoms mentioned in ``text``, in order of first mention."""
+        if self._pattern is None or not text:
+            return []
+        found = {}
+        for match in self._pattern.finditer(text):
+            if self._negated(text, match.start()):
+                continue
+            symptom = self._symptoms[' '.join(match.group().lower().split())]
+            found.setdefault(symptom['id'], symptom)
+        return list(found.values())
+
+    @staticmethod
+    def _negated(text, start):
+        """Whether a negation cue precedes ``start`` within its clause and window."""
+        clause = CLAUSE_BOUNDARY.split(text[max(0, start - 80):start])[-1]
+        window = ' '.join(clause.split()[-NEGATION_WINDOW:])
+        return NEGATION_CUES.search(window) is not None
+
+
+def build_matcher():
+    from apps.departments.models import Department
+    from .models import Symptom
+
+    department = Department.objects.filter(
+        name=getattr(settings, 'EMERGENCY_DEPARTMENT_NAME', 'Emergency Medicine'), is_active=True
+    ).values('id', 'name').first() or Department.objects.filter(
+        urgency_level='emergency', is_active=True
+    ).order_by('name').values('id', 'name').first()
+    if department is None:
+        logger.warning("No active emergency department; red flags will not recommend one")
+    else:
+        department = {'id': str(department['id']), 'name': department['name']}
+
+    return RedFlagMatcher(
+        Symptom.objects.filter(is_emergency_indicator=True).values_list('id', 'name', 'keywords'),
+        department
+    )
+
+
+def forget_matcher():
+    global _matcher
+    _matcher = None
+
+
+def get_matcher():
+    """The current process's matcher, rebuilt when symptoms or departments changed."""
+    from medbot.http_cache import table_versions
+
+    global _matcher, _matcher_token, _matcher_checked
+    now = time.monotonic()
+    if _matcher is not None and now - _matcher_checked < RED_FLAG_CHECK_INTERVAL:
+        return _matcher
+
+    with _matcher_lock:
+        versions = table_versions(('symptoms', 'departments'))
+        token = (versions['symptoms']['token'], versions['departments']['token'])
+        if _matcher is None or token != _matcher_token:
+            _matcher, _matcher_token = build_matcher(), token
+        _matcher_checked = now
+        return _matcher
+
+
+def detect_red_flags(text):
+    """``(symptoms, department)``: emergency symptoms in ``text`` and where to send the patient."""
+    matcher = get_matcher()
+    return matcher.match(text), matcher.department
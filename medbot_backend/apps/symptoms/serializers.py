@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from .models import Symptom, SymptomCategory, SymptomDepartmentMapping
 from apps.departments.models import Department
+from apps.departments.wait_times import estimate as estimate_wait
 from apps.consultations.models import Consultation
+from apps.users.models import User
+from medbot.fast_serializers import ValuesSerializer
+from medbot.fieldsets import SparseFieldsetSerializerMixin
 
 
 class SymptomCategorySerializer(serializers.ModelSerializer):
@@ -24,6 +28,11 @@ class SymptomSerializer(serializers.ModelSerializer):
         ]
 
 
+class SymptomValuesSerializer(ValuesSerializer):
+    """Fast read-only serializer for symptom lists."""
+    serializer_class = SymptomSerializer
+
+
 class SymptomAnalysisRequestSerializer(serializers.Serializer):
     """Serializer for symptom analysis requests."""
     symptoms = serializers.CharField(
@@ -74,7 +83,7 @@ class SymptomAnalysisRequestSerializer(serializers.Serializer):
             raise serializers.ValidationError("Pain level must be a valid number between 1 and 10.")
 
 
-class ConsultationSerializer(serializers.ModelSerializer):
+class ConsultationSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for consultation records."""
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
     recommended_department_name = serializers.CharField(
@@ -98,6 +107,9 @@ class ConsultationSerializer(serializers.ModelSerializer):
             'urgency_level', 'icd_suggestions', 'alternative_departments',
             'status', 'analysis_start_time', 'analysis_end_time', 'created_at'
         ]
+    method_sources = {
+        'analysis_duration_seconds': ('analysis_start_time', 'analysis_end_time'),
+    }
     
     def get_analysis_duration_seconds(self, obj):
         """Get analysis duration in seconds."""
@@ -106,7 +118,38 @@ class ConsultationSerializer(serializers.ModelSerializer):
         return None
 
 
-class ConsultationResultSerializer(serializers.ModelSerializer):
+class ConsultationValuesSerializer(ValuesSerializer):
+    """Fast read-only serializer for consultation history lists."""
+    serializer_class = ConsultationSerializer
+    method_sources = {
+        'patient_name': ('patient',),
+        'analysis_duration_seconds': ('analysis_start_time', 'analysis_end_time'),
+    }
+
+    def prepare(self, rows):
+        if 'patient_name' not in self.field_names:
+            return
+        # Users are on the default database, so they can't be joined from a shard
+        patient_ids = {row['patient'] for row in rows}
+        self._patient_names = {
+            user_id: f'{first_name} {last_name}'.strip()
+            for user_id, first_name, last_name in User.objects.filter(
+                id__in=patient_ids
+            ).values_list('id', 'first_name', 'last_name')
+        } if patient_ids else {}
+
+    def get_patient_name(self, row):
+        return self._patient_names.get(row['patient'])
+
+    def get_analysis_duration_seconds(self, row):
+        if row['analysis_start_time'] and row['analysis_end_time']:
+            duration = row['analysis_end_time'] - row['analysis_start_time']
+            if duration:
+                return duration.total_seconds()
+        return None
+
+
+class ConsultationResultSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for consultation results with detailed information."""
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
     recommended_department_info = serializers.SerializerMethodField()
@@ -121,16 +164,30 @@ class ConsultationResultSerializer(serializers.ModelSerializer):
             'urgency_level', 'urgency_info', 'icd_suggestions',
             'alternative_departments_info', 'status', 'created_at'
         ]
+    method_sources = {
+        'recommended_department_info': ('recommended_department', 'healthcare_system'),
+        'alternative_departments_info': ('alternative_departments',),
+        'urgency_info': ('urgency_level',),
+    }
     
     def get_recommended_department_info(self, obj):
-        """Get detailed information about recommended department."""
+        """
+        Get detailed information about recommended department, with the live
+        wait-time estimate for the consultation's healthcare system when
+        there is one (read from the cache), else the department's static one.
+        """
         if obj.recommended_department:
+            department = obj.recommended_department
+            live = estimate_wait(obj.healthcare_system_id, department.id)
             return {
-                'id': str(obj.recommended_department.id),
-                'name': obj.recommended_department.name,
-                'description': obj.recommended_department.description,
-                'average_wait_time': obj.recommended_department.average_wait_time,
-                'urgency_level': obj.recommended_department.urgency_level
+                'id': str(department.id),
+                'name': department.name,
+                'description': department.description,
+                'average_wait_time': live['minutes'] if live else department.average_wait_time,
+                'wait_time_p90': live['p90_minutes'] if live else None,
+                'queue_length': live['queue_length'] if live else None,
+                'wait_time_source': 'live' if live else 'static',
+                'urgency_level': department.urgency_level
             }
         return None
     
@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from medbot.http_cache import bump_table_version
+from .models import Symptom, SymptomCategory
+from .red_flags import forget_matcher
+
+
+@receiver([post_save, post_delete], sender=Symptom)
+@receiver([post_save, post_delete], sender=SymptomCategory)
+def bump_symptom_versions(sender, using, **kwargs):
+    """Invalidate HTTP caches of the symptom browser endpoints."""
+    # After commit, so a concurrent request never caches the old rows under the new version
+    def refresh():
+        bump_table_version(sender._meta.db_table)
+        if sender is Symptom:
+            forget_matcher()
+    transaction.on_commit(refresh, using=using)
@@ -1,3 +1,416 @@
-from django.test import TestCase
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from apps.consultations.models import Consultation
+from apps.departments.models import Department
+from apps.users.models import User
+from . import icd_catalog
+from .icd_catalog import CatalogUnavailable, ICDCatalog, compile_catalog, get_catalog, parse_release
+from .models import MAX_CATEGORY_DEPTH, Symptom, SymptomCategory
+from .red_flags import RedFlagMatcher, forget_matcher
+from .serializers import (
+    ConsultationSerializer,
+    ConsultationValuesSerializer,
+    SymptomSerializer,
+    SymptomValuesSerializer,
+)
 
-# Create your tests here.
+
+class ValuesSerializerConformanceTest(TestCase):
+    """The fast list serializers must render exactly like the model serializers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = SymptomCategory.objects.create(name='Neurological', description='Head and nerves')
+        Symptom.objects.create(
+            name='Headache', description='Pain in the head', category=category,
+            keywords=['migraine', 'head pain'], icd_codes=['R51'], is_emergency_indicator=False
+        )
+        Symptom.objects.create(
+            name='Seizure', description='Uncontrolled movements', category=category,
+            severity_indicators=['prolonged'], is_emergency_indicator=True
+        )
+
+        department = Department.objects.create(
+            name='Neurology', description='Nervous system', urgency_level='medium'
+        )
+        cls.patient = User.objects.create_user(
+            username='patient', password='x', first_name='Ana ', last_name='Silva'
+        )
+        started = timezone.now() - timedelta(days=2)
+        Consultation.objects.create(
+            patient=cls.patient, symptom_description='Headache since Monday   worse at night',
+            symptom_duration='3 days', pain_level=6, recommended_department=department,
+            confidence_score=Decimal('0.85'), urgency_level='medium',
+            icd_suggestions=[{'code': 'R51', 'confidence': 0.8}],
+            alternative_departments=[{'id': str(department.id), 'confidence': 0.4}],
+            status='completed', analysis_start_time=started,
+            analysis_end_time=started + timedelta(seconds=12, microseconds=5000),
+        )
+        # Nothing analysed yet: null department, score, urgency and times
+        Consultation.objects.create(patient=cls.patient, symptom_description='Dizzy')
+        # Zero duration reports no duration, like the model serializer
+        Consultation.objects.create(
+            patient=cls.patient, symptom_description='Cough', status='failed',
+            analysis_start_time=started, analysis_end_time=started,
+        )
+
+    def assertRendersLike(self, serializer_class, values_serializer_class, queryset, **kwargs):
+        expected = serializer_class(queryset, many=True, **kwargs).data
+        values_serializer = values_serializer_class(**kwargs)
+        actual = values_serializer.to_representation(queryset.values(*values_serializer.lookups))
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_symptom_list(self):
+        self.assertRendersLike(
+            SymptomSerializer, SymptomValuesSerializer, Symptom.objects.order_by('name')
+        )
+
+    def test_consultation_list(self):
+        self.assertRendersLike(
+            ConsultationSerializer, ConsultationValuesSerializer,
+            Consultation.objects.filter(patient_id=self.patient.id).order_by('-created_at')
+        )
+
+    def test_consultation_list_omits_department_name_without_department(self):
+        values_serializer = ConsultationValuesSerializer()
+        rows = Consultation.objects.filter(symptom_description='Dizzy').values(*values_serializer.lookups)
+        item = values_serializer.to_representation(rows)[0]
+        self.assertIsNone(item['recommended_department'])
+        self.assertNotIn('recommended_department_name', item)
+
+    def test_consultation_list_sparse_fieldset(self):
+        fields = ['status', 'created_at', 'recommended_department_name', 'analysis_duration_seconds']
+        self.assertRendersLike(
+            ConsultationSerializer, ConsultationValuesSerializer,
+            Consultation.objects.order_by('-created_at'), fields=fields
+        )
+        self.assertEqual(
+            set(ConsultationValuesSerializer(fields=fields).lookups),
+            {'recommended_department__name', 'analysis_start_time', 'analysis_end_time',
+             'status', 'created_at'}
+        )
+
+    def test_sparse_fieldset_requests(self):
+        client = APIClient()
+        client.force_authenticate(self.patient)
+        url = '/api/symptoms/analysis/'
+        everything = ','.join(ConsultationValuesSerializer.available_fields())
+        consultation_id = Consultation.objects.filter(patient=self.patient).values_list('id', flat=True)[0]
+        for params, errors in (
+            ({'exclude': everything}, {'exclude': ['Leave at least one field']}),
+            ({'fields': 'status', 'exclude': 'status'}, {'exclude': ['Leave at least one field']}),
+            ({'fields': 'status,nope'}, {'fields': ['Unknown field(s): nope']}),
+        ):
+            response = client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.json(), errors)
+            self.assertEqual(client.get(f'{url}{consultation_id}/', params).status_code, 400, params)
+
+        response = client.get(url, {'exclude': everything.partition(',')[2]})
+        self.assertEqual(response.status_code, 200)
+        rows = response.json()
+        rows = rows.get('results', rows)
+        self.assertEqual({tuple(row) for row in rows}, {(everything.partition(',')[0],)})
+
+
+class CategoryTreeTest(TestCase):
+    """Materialized category paths follow moves and never form cycles."""
+
+    def setUp(self):
+        self.cardio = self._category('Cardiovascular')
+        self.arrhythmia = self._category('Arrhythmia', self.cardio)
+        self.tachycardia = self._category('Tachycardia', self.arrhythmia)
+        self.respiratory = self._category('Respiratory')
+
+    def _category(self, name, parent=None):
+        return SymptomCategory.objects.create(name=name, description=name, parent_category=parent)
+
+    def assertPlaced(self, category, *ancestors):
+        category.refresh_from_db()
+        self.assertEqual(category.path, ''.join(f'{node.pk.hex}/' for node in (*ancestors, category)))
+        self.assertEqual(category.depth, len(ancestors))
+
+    def test_paths_on_create(self):
+        self.assertPlaced(self.cardio)
+        self.assertPlaced(self.tachycardia, self.cardio, self.arrhythmia)
+
+    def test_move_rewrites_subtree(self):
+        self.arrhythmia.parent_category = self.respiratory
+        self.arrhythmia.save()
+        self.assertPlaced(self.arrhythmia, self.respiratory)
+        self.assertPlaced(self.tachycardia, self.respiratory, self.arrhythmia)
+        self.assertPlaced(self.cardio)
+
+        self.arrhythmia.parent_category = None
+        self.arrhythmia.save(update_fields=['parent_category'])
+        self.assertPlaced(self.tachycardia, self.arrhythmia)
+
+    def test_cycles_rejected(self):
+        for parent in (self.cardio, self.tachycardia):
+            self.cardio.parent_category = parent
+            with self.assertRaises(ValidationError):
+                self.cardio.save()
+        self.assertPlaced(self.cardio)
+        self.assertPlaced(self.tachycardia, self.cardio, self.arrhythmia)
+
+    def test_depth_limit(self):
+        parent = self.tachycardia
+        for level in range(3, MAX_CATEGORY_DEPTH):
+            parent = self._category(f'Level {level}', parent)
+        with self.assertRaises(ValidationError):
+            self._category('Too deep', parent)
+        # Moving the subtree one level down would push its leaf past the limit too
+        self.cardio.parent_category = self.respiratory
+        with self.assertRaises(ValidationError):
+            self.cardio.save()
+
+    def test_subtree_filter_and_tree(self):
+        for name, category in (('Palpitations', self.tachycardia), ('Chest pain', self.cardio),
+                               ('Cough', self.respiratory)):
+            Symptom.objects.create(name=name, description=name, category=category)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='browser', password='x'))
+
+        response = client.get('/api/symptoms/symptoms/', {'category_tree': str(self.cardio.pk)})
+        self.assertEqual([symptom['name'] for symptom in response.json()['results']],
+                         ['Chest pain', 'Palpitations'])
+        response = client.get('/api/symptoms/symptoms/', {'category_tree': 'cardio'})
+        self.assertEqual(response.status_code, 400)
+
+        with self.assertNumQueries(1):
+            tree = client.get('/api/symptoms/categories/tree/').json()
+        self.assertEqual([node['name'] for node in tree], ['Cardiovascular', 'Respiratory'])
+        self.assertEqual(tree[0]['subcategories'][0]['subcategories'][0]['name'], 'Tachycardia')
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class EmergencyFastPathTest(TestCase):
+    """Red-flag descriptions are triaged inline, well within the latency SLO."""
+
+    SLO_MS = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.emergency = Department.objects.create(
+            name='Emergency Medicine', description='Emergency care', urgency_level='emergency'
+        )
+        category = SymptomCategory.objects.create(name='Cardiovascular', description='Heart')
+        Symptom.objects.create(
+            name='Chest Pain', description='Chest pain', category=category,
+            keywords=['heart pain', 'cardiac pain'], is_emergency_indicator=True
+        )
+        Symptom.objects.create(
+            name='Headache', description='Head pain', category=category, keywords=['migraine']
+        )
+        cls.patient = User.objects.create_user(username='triage', password='x')
+
+    def setUp(self):
+        forget_matcher()
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def analyze(self, symptoms):
+        return self.client.post(
+            '/api/symptoms/analysis/analyze_symptoms/', {'symptoms': symptoms}, format='json'
+        )
+
+    def test_matcher(self):
+        matcher = RedFlagMatcher([(1, 'Chest Pain', ['heart pain']), (2, 'Stroke', None)])
+        self.assertEqual(
+            [symptom['name'] for symptom in matcher.match('Sudden HEART\n  pain, then chest pain')],
+            ['Chest Pain']
+        )
+        self.assertEqual(matcher.match('chestpain and heartburn'), [])
+        self.assertEqual(RedFlagMatcher([]).match('chest pain'), [])
+
+    def test_negated_mentions_ignored(self):
+        matcher = RedFlagMatcher([(1, 'Chest Pain', ['heart pain']), (2, 'Shortness of Breath', None)])
+        for text in (
+            'No chest pain',
+            'Patient denies fever or shortness of breath',
+            'Dizzy without any chest pain',
+            "I don't have heart pain",
+            'Negative for chest pain and shortness of breath',
+        ):
+            self.assertEqual(matcher.match(text), [], text)
+        for text, expected in (
+            ('No fever but crushing chest pain', ['Chest Pain']),
+            ('Chest pain, no shortness of breath', ['Chest Pain']),
+            ('Not sure why. Shortness of breath since noon', ['Shortness of Breath']),
+            ('I have no idea why I have had chest pain for two days', ['Chest Pain']),
+            ('No chest pain yesterday; chest pain now', ['Chest Pain']),
+        ):
+            self.assertEqual([symptom['name'] for symptom in matcher.match(text)], expected, text)
+
+    @mock.patch('apps.symptoms.views.dispatch_analysis')
+    def test_red_flags_answered_inline(self, dispatch_analysis):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.analyze('Crushing chest pain spreading to my left arm')
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual(body['urgency_level'], 'emergency')
+        self.assertEqual(body['red_flags'], ['Chest Pain'])
+        self.assertEqual(body['recommended_department']['name'], 'Emergency Medicine')
+
+        consultation = Consultation.objects.get(id=body['consultation_id'])
+        self.assertEqual(consultation.urgency_level, 'emergency')
+        self.assertEqual(consultation.recommended_department_id, self.emergency.id)
+        self.assertEqual((consultation.status, body['status'], body['execution_id']), ('initiated', 'initiated', None))
+        self.assertTrue(consultation.red_flag_triage)
+        # The full analysis is still queued for confirmation, ahead of everything else
+        dispatch_analysis.assert_called_once()
+        self.assertEqual(dispatch_analysis.call_args.args[0].id, consultation.id)
+        self.assertEqual(dispatch_analysis.call_args.args[2], 'emergency')
+
+    @mock.patch('apps.symptoms.views.dispatch_analysis')
+    def test_negated_red_flags_are_not_emergencies(self, dispatch_analysis):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.analyze('Mild cough, denies chest pain')
+        self.assertEqual(response.status_code, 202)
+        self.assertNotIn('urgency_level', response.json())
+        consultation = Consultation.objects.get(id=response.json()['consultation_id'])
+        self.assertEqual((consultation.urgency_level, consultation.red_flag_triage), (None, False))
+        self.assertEqual(dispatch_analysis.call_args.args[2], 'routine')
+
+    @mock.patch('apps.symptoms.views.dispatch_analysis')
+    def test_other_symptoms_are_queued_by_pain(self, dispatch_analysis):
+        for pain_level, lane in (('3', 'routine'), ('8', 'urgent')):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/symptoms/analysis/analyze_symptoms/', {
+                    'symptoms': 'Migraine since yesterday', 'pain_level': pain_level
+                }, format='json')
+            self.assertEqual(response.status_code, 202)
+            self.assertNotIn('urgency_level', response.json())
+            self.assertEqual(dispatch_analysis.call_args.args[2], lane)
+
+    @mock.patch('apps.symptoms.views.dispatch_analysis')
+    def test_latency_slo(self, dispatch_analysis):
+        self.analyze('chest pain')  # warm up the matcher and the URL resolver
+        timings = []
+        for number in range(200):
+            start = time.perf_counter()
+            response = self.analyze(f'Sharp cardiac pain #{number}, short of breath and sweating')
+            timings.append((time.perf_counter() - start) * 1000)
+            self.assertEqual(response.status_code, 202)
+        timings.sort()
+        self.assertLess(timings[int(len(timings) * 0.99)], self.SLO_MS)
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class ICDCatalogTest(TestCase):
+    """The memory-mapped catalog answers like a brute-force scan of its source codes."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = random.Random(42)
+        codes = {'A00', 'A000', 'A009', 'I21', 'I210', 'I2101', 'I2109', 'I211', 'I2111', 'R07', 'R0789'}
+        # Enough codes for several fence blocks, some without their category
+        while len(codes) < 600:
+            code = rng.choice('ABIJKRSZ') + f'{rng.randrange(100):02d}'
+            codes.add(code + ''.join(rng.choice('0123456789AX') for _ in range(rng.randrange(5))))
+        cls.entries = {code: (f'Description of {code} é', len(code) > 3) for code in codes}
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, 'icd10cm.bin')
+        compile_catalog([(code, *entry) for code, entry in cls.entries.items()], cls.path)
+        cls.catalog = ICDCatalog(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        icd_catalog._catalog = None
+        self.addCleanup(setattr, icd_catalog, '_catalog', None)
+
+    def expected(self, code):
+        description, billable = self.entries[code]
+        parent = next((code[:length] for length in range(len(code) - 1, 2, -1) if code[:length] in self.entries), None)
+        return {
+            'code': icd_catalog.display_code(code), 'description': description, 'billable': billable,
+            'parent': icd_catalog.display_code(parent) if parent else None,
+        }
+
+    def test_lookup_matches_brute_force(self):
+        self.assertEqual(len(self.catalog), len(self.entries))
+        for code in self.entries:
+            self.assertEqual(self.catalog.lookup(code), self.expected(code))
+        self.assertEqual(self.catalog.lookup(' i21.09 ')['code'], 'I21.09')
+        for code in ('I2', 'I212', 'Z99999999', '', 'I21-09', None, 'A0000000'):
+            self.assertIsNone(self.catalog.lookup(code), code)
+
+    def test_children_and_prefix_search(self):
+        codes = sorted(self.entries)
+        for code in codes:
+            children = [other for other in codes if self.expected(other)['parent'] == icd_catalog.display_code(code)]
+            self.assertEqual([entry['code'] for entry in self.catalog.children(code)],
+                             [icd_catalog.display_code(child) for child in children], code)
+        for prefix in ('A', 'I21', 'I2', 'R078', 'Z', 'Q', 'I21.0', 'b1'):
+            normalized = prefix.upper().replace('.', '')
+            matches = [icd_catalog.display_code(code) for code in codes if code.startswith(normalized)]
+            self.assertEqual([entry['code'] for entry in self.catalog.search_prefix(prefix, limit=1000)],
+                             matches, prefix)
+            self.assertEqual(len(self.catalog.search_prefix(prefix, limit=3)), min(len(matches), 3))
+        self.assertEqual(self.catalog.search_prefix(''), [])
+        self.assertEqual(self.catalog.children('I99999'), [])
+
+    def test_parse_release(self):
+        order = (
+            '00001 A00     0 Cholera' + ' ' * 53 + ' Cholera\n'
+            '00002 A000    1 Cholera due to Vibrio cholerae 01, biovar cholerae' + ' ' * 11
+            + ' Cholera due to Vibrio cholerae 01, biovar cholerae\n'
+        )
+        self.assertEqual(list(parse_release(order.splitlines(True))), [
+            ('A00', 'Cholera', False), ('A000', 'Cholera due to Vibrio cholerae 01, biovar cholerae', True),
+        ])
+        self.assertEqual(list(parse_release(['I2109   STEMI of anterior wall\n', 'garbage\n', '\n'])),
+                         [('I2109', 'STEMI of anterior wall', True)])
+
+    def test_missing_invalid_and_recompiled_files(self):
+        missing = os.path.join(self.tmp.name, 'missing.bin')
+        with override_settings(ICD_CATALOG_PATH=missing):
+            with self.assertRaises(CatalogUnavailable):
+                get_catalog()
+        with open(missing, 'wb') as artifact:
+            artifact.write(b'not a catalog'.ljust(icd_catalog.HEADER.size, b'\0'))
+        with override_settings(ICD_CATALOG_PATH=missing):
+            with self.assertRaises(CatalogUnavailable):
+                get_catalog()
+
+        path = os.path.join(self.tmp.name, 'current.bin')
+        compile_catalog([('I21', 'Acute myocardial infarction', False)], path)
+        with override_settings(ICD_CATALOG_PATH=path):
+            catalog = get_catalog()
+            self.assertIs(get_catalog(), catalog)
+            compile_catalog([('I21', 'Acute MI', False), ('I210', 'STEMI', True)], path)
+            # Remapped once the check interval has passed
+            self.assertIs(get_catalog(), catalog)
+            with mock.patch.object(icd_catalog, 'CATALOG_CHECK_INTERVAL', 0):
+                catalog = get_catalog()
+            self.assertEqual(catalog.lookup('I21')['description'], 'Acute MI')
+            self.assertEqual([entry['code'] for entry in catalog.children('I21')], ['I21.0'])
+
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='coder', password='x'))
+        with override_settings(ICD_CATALOG_PATH=self.path):
+            response = client.get('/api/symptoms/icd-codes/I21.0/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['chapter']['chapter'], 9)
+            self.assertEqual(client.get('/api/symptoms/icd-codes/I99.999/').status_code, 404)
+            response = client.get('/api/symptoms/icd-codes/', {'search': 'I', 'limit': 5})
+            self.assertEqual(len(response.json()['results']), 5)
+        icd_catalog._catalog = None
+        with override_settings(ICD_CATALOG_PATH=os.path.join(self.tmp.name, 'missing.bin')):
+            self.assertEqual(client.get('/api/symptoms/icd-codes/I21/').status_code, 503)
@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import SymptomViewSet, SymptomCategoryViewSet, SymptomAnalysisViewSet
+from .views import ICDCodeViewSet, SymptomViewSet, SymptomCategoryViewSet, SymptomAnalysisViewSet
 
 router = DefaultRouter()
 router.register(r'symptoms', SymptomViewSet, basename='symptoms')
 router.register(r'categories', SymptomCategoryViewSet, basename='symptom-categories')
 router.register(r'analysis', SymptomAnalysisViewSet, basename='symptom-analysis')
+router.register(r'icd-codes', ICDCodeViewSet, basename='icd-codes')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,30 +1,51 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
 from .models import Symptom, SymptomCategory
 from apps.consultations.models import Consultation
+from apps.consultations.transitions import (
+    complete_analysis,
+    current_status,
+    fail_analysis,
+)
+from apps.healthcare_systems.models import HealthcareSystem
+from apps.healthcare_systems.sharding import request_tenant
 from .serializers import (
     SymptomSerializer,
     SymptomCategorySerializer,
     SymptomAnalysisRequestSerializer,
+    SymptomValuesSerializer,
     ConsultationSerializer,
+    ConsultationValuesSerializer,
     ConsultationResultSerializer
 )
+from apps.n8n_integration.dispatch import analysis_lane, analysis_patient_data, dispatch_analysis
 from apps.n8n_integration.services import N8NService
+from .icd_catalog import CatalogUnavailable, chapter_for, get_catalog
+from .red_flags import detect_red_flags
+from medbot.fast_serializers import ValuesListMixin
+from medbot.fieldsets import SparseFieldsetMixin
+from medbot.http_cache import ReferenceDataCacheMixin
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
 
-class SymptomViewSet(viewsets.ReadOnlyModelViewSet):
+class SymptomViewSet(ReferenceDataCacheMixin, ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for browsing symptoms and categories.
     """
     queryset = Symptom.objects.all()
     serializer_class = SymptomSerializer
+    values_serializer_class = SymptomValuesSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # category_name comes from the categories table
+    reference_tables = ('symptoms', 'symptom_categories')
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -34,6 +55,17 @@ class SymptomViewSet(viewsets.ReadOnlyModelViewSet):
         if category:
             queryset = queryset.filter(category__name__icontains=category)
 
+        # Filter by a category and all of its subcategories
+        category_tree = self.request.query_params.get('category_tree')
+        if category_tree:
+            try:
+                category_tree = uuid.UUID(category_tree)
+            except ValueError:
+                raise ValidationError({'category_tree': 'Must be a category id.'})
+            path = SymptomCategory.objects.filter(pk=category_tree).values_list('path', flat=True).first()
+            # A literal prefix, so the path index serves the match
+            queryset = queryset.filter(category__path__startswith=path) if path else queryset.none()
+
         # Search by keyword
         search = self.request.query_params.get('search')
         if search:
@@ -46,26 +78,104 @@ class SymptomViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset.order_by('name')
 
 
-class SymptomCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class SymptomCategoryViewSet(ReferenceDataCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for browsing symptom categories.
     """
     queryset = SymptomCategory.objects.all()
     serializer_class = SymptomCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    reference_tables = ('symptom_categories',)
+
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """Every category nested under its parent, cached like the list."""
+        return self._conditional_response(request, self._tree)
+
+    def _tree(self, request):
+        # Parents sort before their children by depth, so one query builds the tree
+        nodes, roots = {}, []
+        for category in SymptomCategory.objects.order_by('depth', 'name').values(
+            'id', 'name', 'description', 'parent_category_id'
+        ):
+            node = nodes[category['id']] = {
+                'id': str(category['id']),
+                'name': category['name'],
+                'description': category['description'],
+                'subcategories': [],
+            }
+            parent = nodes.get(category['parent_category_id'])
+            (parent['subcategories'] if parent else roots).append(node)
+        return Response(roots)
+
+
+class ICDCodeViewSet(viewsets.ViewSet):
+    """
+    ICD-10-CM catalog: ``?search=<prefix>`` autocompletes codes, a code's
+    detail includes its chapter and direct children, and ``rollup``
+    counts ``?codes=`` per chapter.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_value_regex = '[^/]+'
+    max_search_results = 100
 
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.catalog = get_catalog()
 
-class SymptomAnalysisViewSet(viewsets.ModelViewSet):
+    def handle_exception(self, exc):
+        if isinstance(exc, CatalogUnavailable):
+            logger.error(f"ICD-10 catalog unavailable: {str(exc)}")
+            return Response({
+                'error': 'ICD-10 catalog is not available'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return super().handle_exception(exc)
+
+    def list(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), self.max_search_results)
+        except ValueError:
+            limit = 20
+        search = request.query_params.get('search', '')
+        return Response({'results': self.catalog.search_prefix(search, limit=limit) if search else []})
+
+    def retrieve(self, request, pk=None):
+        entry = self.catalog.lookup(pk)
+        if entry is None:
+            return Response({'error': 'Unknown ICD-10 code'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            **entry,
+            'chapter': chapter_for(pk),
+            'children': self.catalog.children(pk),
+        })
+
+    @action(detail=False, methods=['get'])
+    def rollup(self, request):
+        codes = [code for code in request.query_params.get('codes', '').split(',') if code.strip()]
+        return Response({'chapters': self.catalog.rollup(codes)})
+
+
+class SymptomAnalysisViewSet(SparseFieldsetMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for symptom analysis and consultation management.
+
+    ``list``, ``retrieve`` and ``analysis_results`` accept ``?fields=`` and
+    ``?exclude=`` (comma-separated field names).
     """
     serializer_class = ConsultationSerializer
+    values_serializer_class = ConsultationValuesSerializer
+    fieldset_actions = ('list', 'retrieve', 'analysis_results')
+    # analysis_results checks the status before serializing
+    fieldset_model_fields = ('status',)
     permission_classes = [permissions.IsAuthenticated]
+    # Set per action to price it in RATE_LIMIT_COSTS
+    throttle_scope = None
 
     def get_queryset(self):
         """Return consultations for the current user."""
+        # Filter on the id so the cached request user is never loaded
         return Consultation.objects.filter(
-            patient=self.request.user
+            patient_id=self.request.user.id
         ).order_by('-created_at')
 
     def get_serializer_class(self):
@@ -76,72 +186,94 @@ class SymptomAnalysisViewSet(viewsets.ModelViewSet):
             return ConsultationResultSerializer
         return ConsultationSerializer
 
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], throttle_scope='analysis')
     def analyze_symptoms(self, request):
         """
         Main endpoint for symptom analysis.
-        Creates a consultation and triggers n8n workflow.
+        Creates a consultation and queues the n8n workflow trigger.
+
+        The trigger runs in the background, so the 202 response reports the
+        queued consultation: ``status`` is ``initiated`` and ``execution_id``
+        is ``null``, where it used to be ``analyzing`` with the n8n execution
+        id. The 503 reply for an unavailable analysis service is gone for
+        the same reason; the consultation turns ``error`` instead and
+        ``analysis_status`` carries the ``fallback_recommendation``.
         """
-        logger.info(f"Received symptom analysis request: {request.data}")
+        logger.info("Received symptom analysis request: %s", request.data)
         serializer = SymptomAnalysisRequestSerializer(data=request.data)
         if not serializer.is_valid():
-            logger.error(f"Serializer validation failed: {serializer.errors}")
+            logger.error("Serializer validation failed: %s", serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+        # The consultation is stored on this healthcare system's shard
+        healthcare_system_id = request_tenant(request)
+        if healthcare_system_id and not HealthcareSystem.objects.filter(
+            id=healthcare_system_id, is_active=True
+        ).exists():
+            return Response({
+                'error': 'Unknown healthcare system'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         try:
+            # Red flags are triaged inline instead of waiting for the AI workflow
+            red_flags, emergency_department = detect_red_flags(serializer.validated_data['symptoms'])
+
             # Create consultation record
             consultation = Consultation.objects.create(
                 patient=request.user,
+                healthcare_system_id=healthcare_system_id,
                 symptom_description=serializer.validated_data['symptoms'],
                 symptom_duration=serializer.validated_data.get('duration', ''),
                 pain_level=serializer.validated_data.get('pain_level'),
                 additional_info=serializer.validated_data.get('additional_info', ''),
-                status='analyzing',
-                analysis_start_time=timezone.now()
+                # Queued; the dispatcher claims it (-> analyzing) before triggering n8n
+                status='initiated',
+                analysis_start_time=timezone.now(),
+                urgency_level='emergency' if red_flags else None,
+                red_flag_triage=bool(red_flags),
+                recommended_department_id=(
+                    emergency_department['id'] if red_flags and emergency_department else None
+                ),
             )
 
-            logger.info(f"Created consultation {consultation.id} for user {request.user.id}")
+            logger.info("Created consultation %s for user %s", consultation.id, request.user.id)
 
             # Prepare patient data for AI analysis
-            patient_data = {
-                'age': self._calculate_age(request.user.date_of_birth) if request.user.date_of_birth else None,
-                'gender': request.user.gender,
-                'medical_history': request.user.medical_history,
-                'allergies': request.user.allergies,
-                'current_medications': request.user.current_medications,
-                'preferred_language': serializer.validated_data.get('preferred_language', 'en')
-            }
-
-            # Trigger n8n workflow for AI analysis
-            n8n_service = N8NService()
-            execution_id = n8n_service.trigger_symptom_analysis(
-                consultation_id=consultation.id,
-                symptoms=consultation.symptom_description,
-                patient_data=patient_data
+            patient_data = analysis_patient_data(
+                request.user, serializer.validated_data.get('preferred_language', 'en')
             )
 
-            if execution_id:
-                consultation.n8n_execution_id = execution_id
-                consultation.save()
+            # The n8n trigger runs in the background, in a lane chosen by this early triage
+            lane = analysis_lane(red_flags, consultation.pain_level)
+            transaction.on_commit(
+                lambda: dispatch_analysis(consultation, patient_data, lane), using=consultation._state.db
+            )
 
+            if red_flags:
+                logger.warning(
+                    "Red flags in consultation %s: %s", consultation.id,
+                    ', '.join(symptom['name'] for symptom in red_flags)
+                )
+                # The full analysis still runs to confirm the triage
                 return Response({
                     'consultation_id': str(consultation.id),
-                    'execution_id': execution_id,
-                    'status': 'analyzing',
-                    'message': 'Symptom analysis initiated successfully',
+                    'execution_id': None,
+                    'status': consultation.status,
+                    'urgency_level': 'emergency',
+                    'red_flags': [symptom['name'] for symptom in red_flags],
+                    'recommended_department': emergency_department,
+                    'message': 'Your symptoms may need emergency care. Seek emergency care now; '
+                               'a full analysis will follow.',
                     'estimated_completion_time': '30-60 seconds'
                 }, status=status.HTTP_202_ACCEPTED)
-            else:
-                # Fallback: mark as error and provide basic response
-                consultation.status = 'error'
-                consultation.save()
 
-                return Response({
-                    'consultation_id': str(consultation.id),
-                    'status': 'error',
-                    'message': 'AI analysis service temporarily unavailable',
-                    'fallback_recommendation': 'Please consult with a healthcare provider'
-                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            return Response({
+                'consultation_id': str(consultation.id),
+                'execution_id': None,
+                'status': consultation.status,
+                'message': 'Symptom analysis initiated successfully',
+                'estimated_completion_time': '30-60 seconds'
+            }, status=status.HTTP_202_ACCEPTED)
 
         except Exception as e:
             logger.error(f"Error in symptom analysis: {str(e)}")
@@ -150,7 +282,7 @@ class SymptomAnalysisViewSet(viewsets.ModelViewSet):
                 'message': 'Please try again later'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], throttle_scope='analysis_status')
     def analysis_status(self, request, pk=None):
         """
         Check the status of symptom analysis.
@@ -169,13 +301,17 @@ class SymptomAnalysisViewSet(viewsets.ModelViewSet):
                 if execution_status.get('status') == 'success':
                     self._update_consultation_results(consultation, execution_status.get('data', {}))
 
-            return Response({
+            response = {
                 'consultation_id': str(consultation.id),
                 'status': consultation.status,
                 'analysis_complete': consultation.status in ['completed', 'error'],
                 'progress_message': self._get_progress_message(consultation.status),
                 'results_available': consultation.status == 'completed'
-            })
+            }
+            if consultation.status == 'error':
+                # What analyze_symptoms answered when it triggered n8n itself
+                response['fallback_recommendation'] = 'Please consult with a healthcare provider'
+            return Response(response)
 
         except Exception as e:
             logger.error(f"Error checking analysis status: {str(e)}")
@@ -196,19 +332,9 @@ class SymptomAnalysisViewSet(viewsets.ModelViewSet):
                 'status': consultation.status
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = ConsultationResultSerializer(consultation)
+        serializer = self.get_serializer(consultation)
         return Response(serializer.data)
 
-    def _calculate_age(self, birth_date):
-        """Calculate age from birth date."""
-        if not birth_date:
-            return None
-
-        today = timezone.now().date()
-        return today.year - birth_date.year - (
-            (today.month, today.day) < (birth_date.month, birth_date.day)
-        )
-
     def _get_progress_message(self, status):
         """Get user-friendly progress message."""
         messages = {
@@ -222,28 +348,12 @@ class SymptomAnalysisViewSet(viewsets.ModelViewSet):
 
     def _update_consultation_results(self, consultation, results_data):
         """Update consultation with AI analysis results."""
+        using = consultation._state.db
         try:
-            # Get department by ID if provided
-            department_id = results_data.get('department_id')
-            if department_id:
-                from apps.departments.models import Department
-                try:
-                    department = Department.objects.get(id=department_id)
-                    consultation.recommended_department = department
-                except Department.DoesNotExist:
-                    logger.warning(f"Department with ID {department_id} not found")
-
-            consultation.confidence_score = results_data.get('confidence_score')
-            consultation.urgency_level = results_data.get('urgency_level')
-            consultation.icd_suggestions = results_data.get('icd_codes', [])
-            consultation.alternative_departments = results_data.get('alternatives', [])
-            consultation.status = 'completed'
-            consultation.analysis_end_time = timezone.now()
-            consultation.save()
-
-            logger.info(f"Updated consultation {consultation.id} with AI results")
-
+            if complete_analysis(consultation.id, results_data, using=using):
+                logger.info("Updated consultation %s with AI results", consultation.id)
         except Exception as e:
             logger.error(f"Error updating consultation results: {str(e)}")
-            consultation.status = 'error'
-            consultation.save()
+            fail_analysis(consultation.id, using=using)
+        # A callback may have finished the analysis first
+        consultation.status = current_status(consultation.id, using=using)
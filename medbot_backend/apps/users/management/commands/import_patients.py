@@ -0,0 +1,55 @@
+import json
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from apps.users.onboarding import (
+    DEFAULT_CHUNK_SIZE,
+    ImportFormatError,
+    UnknownHealthcareSystem,
+    check_healthcare_system,
+    import_patients,
+    read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import patients from a CSV or NDJSON file and email each an invite to set their password'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="CSV or NDJSON file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+        parser.add_argument('--healthcare-system', help='Healthcare system the patients belong to')
+        parser.add_argument('--report', default='-', help="NDJSON report path, or '-' for stdout")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            check_healthcare_system(options['healthcare_system'])
+        except UnknownHealthcareSystem as e:
+            raise CommandError(str(e))
+
+        path = options['input']
+        import_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        source = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        report = sys.stdout if options['report'] == '-' else open(options['report'], 'w')
+
+        summary = {}
+        try:
+            rows = read_rows(source, import_format)
+            for entry in import_patients(
+                rows,
+                healthcare_system_id=options['healthcare_system'],
+                chunk_size=options['chunk_size'],
+            ):
+                summary = entry.get('summary', summary)
+                report.write(json.dumps(entry) + '\n')
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+            if report is not sys.stdout:
+                report.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f"Imported {summary.get('created', 0)} patients, {summary.get('failed', 0)} rows failed"
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_healthcare_system'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:20
+
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, migrations
+
+FEEDBACK_SCORES = ('accuracy_rating', 'helpfulness_rating', 'speed_rating')
+
+
+def backfill_rating_totals(apps, schema_editor):
+    """
+    Seed the running rating totals from existing feedback, attributed like
+    ``apps.consultations.signals.feedback_doctor``: to the doctor of the
+    consultation's latest completed appointment. Feedback lives with its
+    consultation on any shard; doctor profiles only on ``default``.
+    """
+    if schema_editor.connection.alias != DEFAULT_DB_ALIAS:
+        return
+    ConsultationFeedback = apps.get_model('consultations', 'ConsultationFeedback')
+    Appointment = apps.get_model('consultations', 'Appointment')
+    DoctorProfile = apps.get_model('users', 'DoctorProfile')
+
+    totals = defaultdict(lambda: [0, 0])
+    for alias in [DEFAULT_DB_ALIAS, *getattr(settings, 'DATABASE_SHARDS', [])]:
+        tables = connections[alias].introspection.table_names()
+        if ConsultationFeedback._meta.db_table not in tables or Appointment._meta.db_table not in tables:
+            continue  # a shard not migrated yet holds no feedback
+        feedback = ConsultationFeedback.objects.using(alias)
+        # Ascending, so the latest completed appointment of each consultation wins
+        doctors = dict(
+            Appointment.objects.using(alias).filter(
+                status='completed', consultation_id__in=feedback.values('consultation_id')
+            ).order_by('scheduled_date', 'scheduled_time').values_list('consultation_id', 'doctor_id')
+        )
+        for consultation_id, *scores in feedback.values_list('consultation_id', *FEEDBACK_SCORES).iterator():
+            doctor_id = doctors.get(consultation_id)
+            if doctor_id is not None:
+                totals[doctor_id][0] += sum(score or 0 for score in scores)
+                totals[doctor_id][1] += len(FEEDBACK_SCORES)
+
+    profiles = list(DoctorProfile.objects.using(DEFAULT_DB_ALIAS).filter(user_id__in=list(totals)))
+    for profile in profiles:
+        profile.rating_sum, profile.rating_count = totals[profile.user_id]
+        profile.rating = (Decimal(profile.rating_sum) / profile.rating_count).quantize(Decimal('0.01'))
+    DoctorProfile.objects.using(DEFAULT_DB_ALIAS).bulk_update(
+        profiles, ['rating_sum', 'rating_count', 'rating'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_doctor_rating_totals'),
+        ('consultations', '0003_shard_user_references'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
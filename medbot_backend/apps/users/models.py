@@ -35,6 +35,14 @@ class User(AbstractUser):
     current_medications = models.TextField(blank=True)
     preferred_language = models.CharField(max_length=10, default='en')
     is_verified = models.BooleanField(default=False)
+    # Healthcare system a staff member belongs to; scopes their role permissions
+    healthcare_system = models.ForeignKey(
+        'healthcare_systems.HealthcareSystem',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='staff'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -101,6 +109,9 @@ class DoctorProfile(models.Model):
         default=0.00,
         validators=[MinValueValidator(0.00), MaxValueValidator(5.00)]
     )
+    # Running totals of feedback scores behind ``rating``, kept by apps.consultations.counters
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
     total_consultations = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,258 @@
+import csv
+import io
+import json
+import logging
+import secrets
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.contrib.auth.tokens import default_token_generator
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.mail import EmailMessage, get_connection
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_date
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from apps.healthcare_systems.models import HealthcareSystem
+from .models import User, PatientProfile
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ['username', 'email', 'first_name', 'last_name']
+USER_FIELDS = REQUIRED_FIELDS + ['phone_number', 'date_of_birth', 'gender', 'preferred_language']
+PROFILE_FIELDS = ['insurance_provider', 'insurance_number', 'primary_care_physician']
+
+DEFAULT_CHUNK_SIZE = 1000
+GENDERS = {code for code, _ in User.GENDER_CHOICES}
+# Over-long values would fail the whole chunk's INSERT on PostgreSQL
+MAX_LENGTHS = {
+    field: model._meta.get_field(field).max_length
+    for model, fields in ((User, USER_FIELDS), (PatientProfile, PROFILE_FIELDS))
+    for field in fields
+    if model._meta.get_field(field).max_length
+}
+
+_username_validator = UnicodeUsernameValidator()
+
+
+class ImportFormatError(ValueError):
+    """Raised when the uploaded file cannot be parsed."""
+
+
+class UnknownHealthcareSystem(ValueError):
+    """Raised when patients are imported into a healthcare system that does not exist."""
+
+
+def check_healthcare_system(healthcare_system_id):
+    """
+    Raise ``UnknownHealthcareSystem`` unless ``healthcare_system_id`` is
+    empty or names an existing system, before any row is imported.
+    """
+    if not healthcare_system_id:
+        return
+    try:
+        exists = HealthcareSystem.objects.filter(pk=healthcare_system_id).exists()
+    except ValidationError:
+        exists = False
+    if not exists:
+        raise UnknownHealthcareSystem(f"Healthcare system '{healthcare_system_id}' does not exist.")
+
+
+def read_rows(stream, import_format):
+    """
+    Yield ``(row_number, dict)`` pairs from a binary CSV or NDJSON stream,
+    one line at a time.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if import_format == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, row
+    elif import_format == 'ndjson':
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else {'__invalid__': line.strip()[:200]}
+    else:
+        raise ImportFormatError(f"Unknown format '{import_format}'. Choose csv or ndjson.")
+
+
+def _clean_row(row):
+    """Return ``(cleaned, errors)`` for one import row without touching the database."""
+    if '__invalid__' in row:
+        return None, {'row': 'Line is not a JSON object'}
+
+    cleaned = {
+        field: (str(row.get(field) or '')).strip()
+        for field in USER_FIELDS + PROFILE_FIELDS
+    }
+    errors = {}
+    for field in REQUIRED_FIELDS:
+        if not cleaned[field]:
+            errors[field] = 'This field is required.'
+    for field, max_length in MAX_LENGTHS.items():
+        if len(cleaned[field]) > max_length:
+            errors[field] = f'Ensure this value has at most {max_length} characters (it has {len(cleaned[field])}).'
+
+    cleaned['username'] = User.normalize_username(cleaned['username'])
+    cleaned['email'] = User.objects.normalize_email(cleaned['email'])
+    if cleaned['username'] and 'username' not in errors:
+        try:
+            _username_validator(cleaned['username'])
+        except ValidationError as e:
+            errors['username'] = e.messages[0]
+    if cleaned['email'] and 'email' not in errors:
+        try:
+            validate_email(cleaned['email'])
+        except ValidationError as e:
+            errors['email'] = e.messages[0]
+
+    if cleaned['date_of_birth']:
+        try:
+            cleaned['date_of_birth'] = parse_date(cleaned['date_of_birth'])
+        except ValueError:
+            cleaned['date_of_birth'] = None
+        if cleaned['date_of_birth'] is None:
+            errors['date_of_birth'] = 'Use the YYYY-MM-DD format.'
+    else:
+        cleaned['date_of_birth'] = None
+
+    if cleaned['gender'] and cleaned['gender'] not in GENDERS:
+        errors['gender'] = f"Must be one of {', '.join(sorted(GENDERS))}."
+    cleaned['preferred_language'] = cleaned['preferred_language'] or 'en'
+    return cleaned, errors
+
+
+def _import_chunk(chunk, healthcare_system_id):
+    """Validate and insert one chunk; yields a report entry per row."""
+    valid = []
+    seen = set()
+    for number, row in chunk:
+        cleaned, errors = _clean_row(row)
+        if cleaned and not errors and cleaned['username'] in seen:
+            errors = {'username': 'Duplicate username in this file.'}
+        if errors:
+            yield {'row': number, 'status': 'error', 'errors': errors}
+            continue
+        seen.add(cleaned['username'])
+        valid.append((number, cleaned))
+
+    # One query per chunk catches usernames taken by earlier chunks or existing users
+    taken = set(User.objects.filter(
+        username__in=[cleaned['username'] for _, cleaned in valid]
+    ).values_list('username', flat=True))
+
+    users, profiles, numbers = [], [], []
+    for number, cleaned in valid:
+        if cleaned['username'] in taken:
+            yield {'row': number, 'status': 'error', 'errors': {'username': 'Username already exists.'}}
+            continue
+        user = User(
+            user_type='patient',
+            # Unusable until the patient accepts their invite and sets one;
+            # same format as make_password(None) without its slow random string
+            password=UNUSABLE_PASSWORD_PREFIX + secrets.token_hex(20),
+            **{field: cleaned[field] for field in USER_FIELDS}
+        )
+        users.append(user)
+        profiles.append(PatientProfile(
+            user=user,
+            preferred_hospital_id=healthcare_system_id,
+            **{field: cleaned[field] for field in PROFILE_FIELDS}
+        ))
+        numbers.append(number)
+
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            PatientProfile.objects.bulk_create(profiles)
+    except IntegrityError:
+        # A concurrent import claimed one of these usernames
+        for number in numbers:
+            yield {'row': number, 'status': 'error', 'errors': {'row': 'Conflicted with a concurrent import, retry this row.'}}
+        return
+
+    invited = send_invites(users)
+    for number, user in zip(numbers, users):
+        yield {
+            'row': number,
+            'status': 'created',
+            'user_id': str(user.id),
+            'username': user.username,
+            'invite_sent': user.pk in invited,
+        }
+
+
+def invite_link(user):
+    """Link for ``user`` to set their first password via ``/api/auth/accept-invite/``."""
+    return settings.PATIENT_INVITE_URL.format(
+        uid=urlsafe_base64_encode(force_bytes(user.pk)),
+        token=default_token_generator.make_token(user),
+    )
+
+
+def send_invites(users):
+    """
+    Email each imported patient their invite link over one mail connection.
+    Returns the ids of the users whose invite was sent; the link itself only
+    ever goes to the patient.
+    """
+    invited = set()
+    connection = get_connection()
+    try:
+        for user in users:
+            message = EmailMessage(
+                subject='Your MedBot account',
+                body=(
+                    f"Hello {user.first_name},\n\n"
+                    f"An account with the username {user.username} has been created for you. "
+                    f"Choose your password here:\n\n{invite_link(user)}\n\n"
+                    f"The link expires in {settings.PASSWORD_RESET_TIMEOUT // 86400} days."
+                ),
+                to=[user.email],
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception:
+                logger.exception("Failed to send the invite for imported patient %s", user.pk)
+            else:
+                invited.add(user.pk)
+    finally:
+        connection.close()
+    return invited
+
+
+def import_patients(rows, healthcare_system_id=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import patients from ``(row_number, dict)`` pairs in fixed-size chunks.
+
+    Yields one report entry per input row, then a final ``summary`` entry.
+    Only the current chunk is held in memory. Check ``healthcare_system_id``
+    with ``check_healthcare_system`` first.
+    """
+    created = failed = 0
+    chunk = []
+
+    def _flush():
+        nonlocal created, failed
+        for entry in _import_chunk(chunk, healthcare_system_id):
+            if entry['status'] == 'created':
+                created += 1
+            else:
+                failed += 1
+            yield entry
+        chunk.clear()
+
+    for number, row in rows:
+        chunk.append((number, row))
+        if len(chunk) >= chunk_size:
+            yield from _flush()
+    if chunk:
+        yield from _flush()
+
+    yield {'summary': {'created': created, 'failed': failed}}
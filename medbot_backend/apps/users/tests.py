@@ -1,3 +1,146 @@
-from django.test import TestCase
+import json
+import re
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from types import SimpleNamespace
+from django.apps import apps
+from django.contrib.auth import authenticate
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.consultations.models import Appointment, Consultation, ConsultationFeedback
+from apps.departments.models import Department
+from apps.healthcare_systems.models import HealthcareSystem
+from .models import DoctorProfile, User
 
-# Create your tests here.
+backfill = import_module('apps.users.migrations.0004_backfill_doctor_rating_totals')
+
+
+class RatingBackfillTest(TestCase):
+    """Existing feedback seeds the running rating totals of the doctor who saw the patient last."""
+
+    def test_backfill(self):
+        department = Department.objects.create(name='Cardiology', description='Heart', urgency_level='routine')
+        system = HealthcareSystem.objects.create(
+            name='General', system_type='hospital', address='1 Main St', city='Springfield',
+            state='IL', zip_code='62701', phone_number='555-0100', email='info@example.com',
+            monthly_fee=Decimal('100.00'), contract_start_date=timezone.now().date(),
+            contract_end_date=timezone.now().date() + timedelta(days=365),
+        )
+        patient = User.objects.create_user(username='patient', password='x')
+        first, second = (User.objects.create_user(username=name, password='x') for name in ('first', 'second'))
+        for number, doctor in enumerate((first, second)):
+            DoctorProfile.objects.create(
+                user=doctor, license_number=f'L-{number}', specialization=department,
+                years_of_experience=5, education='MD', consultation_fee=Decimal('50.00'), rating=Decimal('4.80')
+            )
+        today = timezone.now().date()
+        for scores, visits in (((5, 5, 2), [(first, 1), (second, 2)]), ((1, 2, 3), [(first, 3)])):
+            consultation = Consultation.objects.create(
+                patient=patient, healthcare_system=system, symptom_description='Palpitations'
+            )
+            for doctor, days in visits:
+                Appointment.objects.create(
+                    consultation=consultation, patient=patient, doctor=doctor, department=department,
+                    healthcare_system=system, scheduled_date=today - timedelta(days=days),
+                    scheduled_time='09:00', appointment_type='consultation', status='completed'
+                )
+            ConsultationFeedback.objects.create(
+                consultation=consultation, accuracy_rating=scores[0], helpfulness_rating=scores[1],
+                speed_rating=scores[2], would_recommend=True
+            )
+        DoctorProfile.objects.update(rating_sum=0, rating_count=0)
+
+        backfill.backfill_rating_totals(apps, SimpleNamespace(connection=connection))
+        # The first consultation's latest visit was with the first doctor (a day ago)
+        self.assertEqual(
+            list(DoctorProfile.objects.order_by('license_number').values_list('rating_sum', 'rating_count', 'rating')),
+            [(18, 6, Decimal('3.00')), (0, 0, Decimal('4.80'))]
+        )
+
+
+@override_settings(
+    RATE_LIMIT_ENABLED=False,
+    PATIENT_INVITE_URL='https://app.example.com/invite/{uid}/{token}/',
+)
+class PatientImportTest(TestCase):
+    """Imported patients get their invite by email and redeem it to set a password."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.system = HealthcareSystem.objects.create(
+            name='General', system_type='hospital', address='1 Main St', city='Springfield',
+            state='IL', zip_code='62701', phone_number='555-0100', email='info@example.com',
+            monthly_fee=Decimal('100.00'), contract_start_date=timezone.now().date(),
+            contract_end_date=timezone.now().date() + timedelta(days=365),
+        )
+        cls.admin = User.objects.create_user(username='admin', password='x', user_type='admin')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, rows, healthcare_system=None):
+        content = ''.join(json.dumps(row) + '\n' for row in rows).encode()
+        response = self.client.post('/api/users/import/', {
+            'file': SimpleUploadedFile('patients.ndjson', content),
+            'healthcare_system': healthcare_system or str(self.system.pk),
+        })
+        if response.status_code != 200:
+            return response, None
+        return response, [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def patient(self, username, **fields):
+        return {'username': username, 'email': f'{username}@example.com',
+                'first_name': 'Ana', 'last_name': 'Silva', **fields}
+
+    def test_invite_is_emailed_and_redeemed_once(self):
+        response, report = self.upload([self.patient('ana')])
+        self.assertEqual(report[0]['status'], 'created')
+        self.assertTrue(report[0]['invite_sent'])
+        self.assertNotIn('invite_token', report[0])
+        self.assertNotIn('invite_uid', report[0])
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['ana@example.com'])
+        uid, token = re.search(r'/invite/([^/]+)/([^/]+)/', mail.outbox[0].body).groups()
+        self.assertIsNone(authenticate(username='ana', password='chosen-secret-1'))
+
+        anonymous = APIClient()
+        redeem = {'uid': uid, 'token': token, 'password': 'chosen-secret-1', 'password_confirm': 'chosen-secret-1'}
+        self.assertEqual(anonymous.post('/api/auth/accept-invite/', redeem, format='json').status_code, 200)
+        self.assertIsNotNone(authenticate(username='ana', password='chosen-secret-1'))
+
+        redeem.update(password='other-secret-2', password_confirm='other-secret-2')
+        self.assertEqual(anonymous.post('/api/auth/accept-invite/', redeem, format='json').status_code, 400)
+        redeem.update(uid='bm9wZQ', token=token)
+        self.assertEqual(anonymous.post('/api/auth/accept-invite/', redeem, format='json').status_code, 400)
+
+    def test_over_long_values_are_row_errors(self):
+        response, report = self.upload([
+            self.patient('u' * 151),
+            self.patient('phone', phone_number='5' * 21),
+            self.patient('language', preferred_language='portuguese-br'),
+            self.patient('insured', insurance_number='9' * 51),
+            self.patient('fine'),
+        ])
+        self.assertEqual(
+            [(entry['status'], sorted(entry.get('errors', {}))) for entry in report[:5]],
+            [('error', ['username']), ('error', ['phone_number']), ('error', ['preferred_language']),
+             ('error', ['insurance_number']), ('created', [])]
+        )
+        self.assertEqual(report[-1], {'summary': {'created': 1, 'failed': 4}})
+
+    def test_unknown_healthcare_system_rejected_up_front(self):
+        for unknown in ('9b2f5a3e-0000-4000-8000-000000000000', 'not-a-uuid'):
+            response, report = self.upload([self.patient('lost')], healthcare_system=unknown)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('does not exist', response.json()['error'])
+            with self.assertRaises(CommandError):
+                call_command('import_patients', '-', '--healthcare-system', unknown)
+        self.assertFalse(User.objects.filter(username='lost').exists())
@@ -1,7 +1,6 @@
-from django.urls import path, include
-from rest_framework.routers import DefaultRouter
+from django.urls import path
+from .views import import_patients_view
 
-# Placeholder for user-related endpoints
 urlpatterns = [
-    # User management endpoints will be added here
+    path('import/', import_patients_view, name='import_patients'),
 ]
@@ -1,3 +1,77 @@
-from django.shortcuts import render
+import json
+from rest_framework import status
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from django.http import StreamingHttpResponse
+from apps.authentication.permissions import (
+    Capability,
+    has_capability,
+    has_global_role,
+    request_capabilities,
+    require,
+)
+from .onboarding import (
+    ImportFormatError,
+    UnknownHealthcareSystem,
+    check_healthcare_system,
+    import_patients,
+    read_rows,
+)
 
-# Create your views here.
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+@permission_classes([require(Capability.IMPORT_PATIENTS)])
+def import_patients_view(request):
+    """
+    Bulk-import patients from an uploaded CSV or NDJSON ``file``.
+
+    Accounts get an unusable password and each patient is emailed an invite
+    to set one; the streamed NDJSON report carries a per-row result with
+    whether the invite was sent, or the row's validation errors.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Upload the patient list as "file"'}, status=status.HTTP_400_BAD_REQUEST)
+
+    user = request.user
+    healthcare_system_id = request.data.get('healthcare_system')
+    if not has_global_role(user):
+        # Scoped roles import into their own healthcare system only
+        healthcare_system_id = healthcare_system_id or user.healthcare_system_id
+        if healthcare_system_id is None or not has_capability(
+            user,
+            Capability.IMPORT_PATIENTS,
+            healthcare_system_id=healthcare_system_id,
+            capabilities=request_capabilities(request),
+        ):
+            return Response({
+                'error': 'You can only import patients into your healthcare system'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        check_healthcare_system(healthcare_system_id)
+    except UnknownHealthcareSystem as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    import_format = request.data.get('import_format') or (
+        'csv' if upload.name.lower().endswith('.csv') else 'ndjson'
+    )
+    try:
+        rows = read_rows(upload.file, import_format)
+        # Surface format errors before the streamed response starts
+        first = next(rows, None)
+    except ImportFormatError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def _rows():
+        if first is not None:
+            yield first
+        yield from rows
+
+    report = (
+        json.dumps(entry) + '\n'
+        for entry in import_patients(_rows(), healthcare_system_id=healthcare_system_id)
+    )
+    return StreamingHttpResponse(report, content_type='application/x-ndjson')
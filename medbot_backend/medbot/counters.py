@@ -0,0 +1,221 @@
+"""
+Write-behind counters for hot columns.
+
+Instead of saving a row per event, events add deltas with ``increment``.
+With the Redis cache backend, the deltas of each model accumulate in one
+Redis hash. ``HINCRBY`` calls in a ``MULTI`` apply all the fields of one
+event together. ``flush`` drains each hash atomically (``HGETALL`` + ``DEL``
+in one Lua script) and writes it in a transaction with
+``UPDATE ... SET field = field + delta``. Rows with identical deltas share a
+single statement, so a hot row is written once per flush however many
+events hit it, and concurrent events can never overwrite each other. A
+flush that fails puts its deltas back.
+
+Other cache backends fall back to per-process deltas, which each process
+flushes itself; so does an increment that finds Redis unreachable.
+
+Each process that increments runs a flusher thread every
+``COUNTER_FLUSH_INTERVAL`` seconds and flushes once more at exit.
+``flush_counters`` flushes on demand.
+
+Models register their counter columns with ``register``. ``derive`` adds
+columns computed from the new totals to the same UPDATE, e.g. an average
+from a running sum and count.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+# Returns the drained hash as a flat field/value list
+DRAIN_SCRIPT = """
+local deltas = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return deltas
+"""
+
+
+@dataclass(frozen=True)
+class CounterSet:
+    model: type
+    fields: tuple
+    key: str = 'pk'
+    derive: object = None
+
+
+_registry = {}
+
+
+def register(model, fields, key='pk', derive=None):
+    """
+    Count ``fields`` of ``model`` write-behind, for rows identified by the
+    ``key`` column. ``derive(deltas)`` returns extra UPDATE expressions.
+    """
+    _registry[model._meta.label_lower] = CounterSet(model, tuple(fields), key, derive)
+
+
+class LocalCounters:
+    """Per-process deltas with the same interface as ``RedisCounters``."""
+
+    def __init__(self):
+        self._deltas = defaultdict(lambda: defaultdict(Counter))
+        self._lock = threading.Lock()
+
+    def add(self, label, key, deltas):
+        with self._lock:
+            self._deltas[label][key].update(deltas)
+
+    def drain(self, label):
+        with self._lock:
+            drained = self._deltas.pop(label, {})
+        return {key: dict(deltas) for key, deltas in drained.items()}
+
+
+class RedisCounters:
+    """Deltas in one Redis hash per model, field ``<key>|<column>``."""
+
+    def __init__(self, redis_cache):
+        self._cache = redis_cache
+        self._script = None
+
+    def _hash(self, label):
+        return self._cache.make_key(f'counters:{label}')
+
+    def add(self, label, key, deltas):
+        client = self._cache._cache.get_client(write=True)
+        pipeline = client.pipeline(transaction=True)
+        for field, delta in deltas.items():
+            pipeline.hincrby(self._hash(label), f'{key}|{field}', delta)
+        pipeline.execute()
+
+    def drain(self, label):
+        client = self._cache._cache.get_client(write=True)
+        if self._script is None:
+            self._script = client.register_script(DRAIN_SCRIPT)
+        flat = self._script(keys=[self._hash(label)], client=client)
+        drained = defaultdict(dict)
+        for name, delta in zip(flat[::2], flat[1::2]):
+            key, field = name.decode().rsplit('|', 1)
+            drained[key][field] = int(delta)
+        return dict(drained)
+
+
+_local_counters = LocalCounters()
+_store = None
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def get_counter_store():
+    global _store
+    if _store is None:
+        _store = RedisCounters(cache) if isinstance(cache, RedisCache) else _local_counters
+    return _store
+
+
+def increment(model, key, **deltas):
+    """Add ``deltas`` (column -> int) to the row of ``model`` whose key column is ``key``."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    store = get_counter_store()
+    try:
+        store.add(model._meta.label_lower, key, deltas)
+    except Exception as exc:
+        if store is _local_counters:
+            raise
+        logger.warning("Counter store unavailable, keeping deltas in this process: %s", exc)
+        _local_counters.add(model._meta.label_lower, key, deltas)
+    _start_flusher()
+
+
+def _apply(counters, deltas):
+    """Write drained deltas; returns the number of UPDATE statements."""
+    by_delta = defaultdict(list)
+    for key, fields in deltas.items():
+        fields = tuple(sorted((field, delta) for field, delta in fields.items() if delta))
+        if fields:
+            by_delta[fields].append(key)
+
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        for fields, keys in by_delta.items():
+            updates = {field: F(field) + delta for field, delta in fields}
+            if counters.derive:
+                updates.update(counters.derive(dict(fields)))
+            counters.model.objects.using(DEFAULT_DB_ALIAS).filter(
+                **{f'{counters.key}__in': keys}
+            ).update(**updates)
+    return len(by_delta)
+
+
+def flush():
+    """Write every pending delta to the database; returns the number of UPDATE statements."""
+    statements = 0
+    stores = {get_counter_store(), _local_counters}
+    for label, counters in _registry.items():
+        for store in stores:
+            deltas = store.drain(label)
+            if not deltas:
+                continue
+            try:
+                statements += _apply(counters, deltas)
+            except Exception:
+                logger.exception("Flushing %s counters failed; keeping the deltas", label)
+                for key, fields in deltas.items():
+                    store.add(label, key, fields)
+    return statements
+
+
+def _flush_periodically(interval, stop):
+    while not stop.wait(interval):
+        try:
+            flush()
+        except Exception:
+            logger.exception("Counter flush failed")
+        finally:
+            connections.close_all()
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    interval = getattr(settings, 'COUNTER_FLUSH_INTERVAL', 5)
+    if not interval:
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            stop = threading.Event()
+            _flusher = threading.Thread(
+                target=_flush_periodically, args=(interval, stop), name='counter-flusher', daemon=True
+            )
+            _flusher.start()
+            atexit.register(_flush_at_exit, stop)
+
+
+def _flush_at_exit(stop):
+    stop.set()
+    try:
+        flush()
+    except Exception:
+        logger.exception("Counter flush at exit failed")
+
+
+def _reset_after_fork():
+    # The parent's flusher thread does not survive fork, and its deltas are the parent's to flush
+    global _flusher
+    _flusher = None
+    _local_counters.__init__()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
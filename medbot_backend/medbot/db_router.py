@@ -0,0 +1,237 @@
+"""
+Database routing: tenant shards and read replicas.
+
+``TenantShardRouter`` sends consultation data to the shard of the
+healthcare system it belongs to (see ``apps.healthcare_systems.sharding``).
+For all other models, reads made while serving a safe (GET/HEAD/OPTIONS)
+request go to a healthy replica from ``DATABASE_REPLICAS``; everything else
+uses the primary:
+
+* all writes, and every query in a request that writes or uses an unsafe method,
+* reads by a user who wrote within ``DB_READ_YOUR_WRITES_SECONDS``,
+* reads before the request is authenticated, and all reads outside requests
+  (management commands, shell, workers),
+* reads when no replica is within ``DB_REPLICA_MAX_LAG`` seconds of the primary.
+"""
+
+import logging
+import random
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Zero when the replica has replayed everything it received (an idle primary
+# would otherwise look lagged), else seconds since the last replayed commit
+POSTGRES_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+_routing_state = ContextVar('db_routing_state', default=None)
+
+
+def recent_write_key(user_id):
+    return f'db:recent-write:{user_id}'
+
+
+def _request_user_id(request):
+    """
+    Id of the authenticated user, ``False`` for anonymous requests, or
+    ``None`` while authentication has not run yet. Never triggers a query.
+    """
+    user = request.__dict__.get('user')
+    # Until DRF authenticates the request (and replaces it), request.user is
+    # Django's lazy session user; resolving it would settle on AnonymousUser
+    # before the JWT is read. type() does not resolve it, isinstance() would.
+    if type(user) is SimpleLazyObject:
+        if user._wrapped is empty:
+            return None
+        user = user._wrapped
+    if user is None:
+        return None
+    return user.pk if user.is_authenticated else False
+
+
+class TenantShardRouter:
+    """
+    Route tenant models (see ``apps.healthcare_systems.sharding``) to their
+    healthcare system's shard. Other models fall through to the next router.
+    """
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        alias = self._shard(model, hints.get('instance'))
+        if alias is not None:
+            state = _routing_state.get()
+            if state is not None:
+                state['primary'] = True
+                state['wrote'] = True
+        return alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        from apps.healthcare_systems.sharding import is_sharded
+
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+            # A new row follows its parent's shard when saved (see _shard)
+            return obj1._state.adding or obj2._state.adding or obj1._state.db == obj2._state.db
+        if is_sharded(type(obj1)) or is_sharded(type(obj2)):
+            # Users and reference data are reachable from every shard
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards get the full schema; only tenant and reference tables hold rows there
+        return None
+
+    def _shard(self, model, instance):
+        from apps.healthcare_systems.models import HealthcareSystem
+        from apps.healthcare_systems.sharding import is_sharded, request_tenant, shard_for
+
+        if not settings.DATABASE_SHARDS or not is_sharded(model):
+            return None
+
+        if instance is not None and is_sharded(type(instance)):
+            # Rows never move between shards once stored
+            if instance._state.db and not instance._state.adding:
+                return instance._state.db
+            system_id = getattr(instance, 'healthcare_system_id', None)
+            if system_id:
+                return shard_for(system_id)
+            # e.g. a new reminder or execution: follow its cached parent row, even
+            # when assigning a reference row (its workflow) already set _state.db
+            for field in instance._meta.concrete_fields:
+                if field.is_relation and is_sharded(field.related_model) and field.is_cached(instance):
+                    parent = field.get_cached_value(instance)
+                    if parent is not None and parent._state.db:
+                        return parent._state.db
+            if instance._state.db:
+                return instance._state.db
+        elif isinstance(instance, HealthcareSystem):
+            return shard_for(instance.pk)
+
+        state = _routing_state.get()
+        return shard_for(request_tenant(state['request']) if state else None)
+
+
+class ReplicaRouter:
+    """Send reads to lag-checked replicas, with read-your-writes stickiness."""
+
+    def __init__(self):
+        # alias -> (checked at, healthy), refreshed every DB_REPLICA_CHECK_INTERVAL
+        self._health = {}
+
+    @property
+    def replicas(self):
+        return getattr(settings, 'DATABASE_REPLICAS', [])
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        if not self.replicas or state is None or state['primary']:
+            return DEFAULT_DB_ALIAS
+        if self._pinned(state):
+            return DEFAULT_DB_ALIAS
+
+        healthy = [alias for alias in self.replicas if self._is_healthy(alias)]
+        return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            # Later reads in this request must see the write
+            state['primary'] = True
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *self.replicas}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive schema changes through replication
+        return db not in self.replicas
+
+    def _pinned(self, state):
+        if state['pinned'] is None:
+            user_id = _request_user_id(state['request'])
+            if user_id is None:
+                # Not authenticated yet; don't remember, the user is still unknown
+                return True
+            if not user_id:
+                # Anonymous so far; authentication may still identify a user
+                return False
+            state['pinned'] = cache.get(recent_write_key(user_id)) is not None
+        return state['pinned']
+
+    def _is_healthy(self, alias):
+        now = time.monotonic()
+        checked = self._health.get(alias)
+        interval = getattr(settings, 'DB_REPLICA_CHECK_INTERVAL', 5)
+        if checked and now - checked[0] < interval:
+            return checked[1]
+
+        max_lag = getattr(settings, 'DB_REPLICA_MAX_LAG', 5)
+        try:
+            lag = self._replication_lag(alias)
+            healthy = lag <= max_lag
+            if not healthy:
+                logger.warning(f"Replica {alias} is {lag:.1f}s behind, reading from primary")
+        except DatabaseError as e:
+            healthy = False
+            logger.warning(f"Replica {alias} unavailable, reading from primary: {str(e)}")
+
+        self._health[alias] = (now, healthy)
+        return healthy
+
+    def _replication_lag(self, alias):
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            # e.g. a SQLite copy used for local testing has no lag to measure
+            return 0.0
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRES_LAG_SQL)
+            return float(cursor.fetchone()[0] or 0)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scope replica routing to the current request and remember users who
+    wrote, so their next requests keep reading from the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {
+            'request': request,
+            'primary': request.method not in SAFE_METHODS,
+            'wrote': False,
+            'pinned': None,
+        }
+        token = _routing_state.set(state)
+        try:
+            response = self.get_response(request)
+            if state['wrote']:
+                user_id = _request_user_id(request)
+                if user_id:
+                    cache.set(
+                        recent_write_key(user_id), True,
+                        getattr(settings, 'DB_READ_YOUR_WRITES_SECONDS', 15)
+                    )
+        finally:
+            _routing_state.reset(token)
+        return response
@@ -0,0 +1,163 @@
+"""
+Read-only serializers for list endpoints that work on ``.values()`` rows.
+
+A ``ValuesSerializer`` mirrors a ``ModelSerializer``: the columns to select
+and the function converting each value are worked out once from the model
+serializer's fields, so each row is a single dict build instead of DRF's
+per-field attribute lookups. Output is identical to the model serializer's.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import RelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Fields whose to_representation returns database values unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    RelatedField,
+)
+
+
+class ValuesSerializer:
+    """
+    Serialize ``.values(*serializer.lookups)`` rows like ``serializer_class``.
+
+    Fields whose output cannot come from a column (``SerializerMethodField``,
+    callable sources) need a ``get_<field>(row)`` method, which may also be
+    defined to override any other field. Columns those methods read go in
+    ``method_sources``; ``prepare(rows)`` can load related data for a page in
+    one query before the rows are serialized.
+
+    ``fields`` restricts the output to those field names, selecting only the
+    columns they need.
+    """
+    serializer_class = None
+    method_sources = {}
+
+    def __init__(self, context=None, fields=None):
+        self.context = context or {}
+        self._plan = [
+            (name, lookup, getattr(self, method) if method else self._mapper(field), omit_null)
+            for name, lookup, field, omit_null, method in self.get_plan()
+            if fields is None or name in fields
+        ]
+        self.field_names = [name for name, _, _, _ in self._plan]
+
+    @classmethod
+    def available_fields(cls):
+        return [name for name, _, _, _, _ in cls.get_plan()]
+
+    @property
+    def lookups(self):
+        lookups = []
+        for name, lookup, _, _ in self._plan:
+            if lookup is None:
+                lookups.extend(self.method_sources.get(name, ()))
+            else:
+                lookups.append(lookup)
+        return list(dict.fromkeys(lookups))
+
+    @classmethod
+    def get_plan(cls):
+        """``(name, lookup, field, omit_null, method)`` per output field, built once per class."""
+        if '_class_plan' not in cls.__dict__:
+            cls._class_plan = [
+                cls._field_plan(name, field)
+                for name, field in cls.serializer_class().fields.items()
+                if not field.write_only
+            ]
+        return cls._class_plan
+
+    @classmethod
+    def _field_plan(cls, name, field):
+        method = f'get_{name}'
+        if hasattr(cls, method):
+            return name, None, None, False, method
+        if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            raise ImproperlyConfigured(f'{cls.__name__} needs a {method}(row) method')
+
+        if isinstance(field, RelatedField):
+            lookup = field.source
+        else:
+            lookup = '__'.join(field.source_attrs)
+        # DRF leaves out read-only fields whose source crosses a null relation
+        omit_null = len(field.source_attrs) > 1 and not field.required and not field.allow_null
+        return name, lookup, field, omit_null, None
+
+    @staticmethod
+    def _mapper(field):
+        """Function giving ``field``'s representation of a column value, or ``None`` to copy it."""
+        if isinstance(field, PASSTHROUGH_FIELDS):
+            return None
+        if isinstance(field, serializers.JSONField) and not field.binary:
+            return None
+        if isinstance(field, serializers.DateTimeField):
+            return _datetime_mapper(field)
+        return field.to_representation
+
+    def prepare(self, rows):
+        """Hook to batch-load data used by ``get_<field>`` methods."""
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        self.prepare(rows)
+        plan = self._plan
+        data = []
+        for row in rows:
+            item = {}
+            for name, lookup, mapper, omit_null in plan:
+                if lookup is None:
+                    item[name] = mapper(row)
+                    continue
+                value = row[lookup]
+                if value is None:
+                    if not omit_null:
+                        item[name] = None
+                elif mapper is None:
+                    item[name] = value
+                else:
+                    item[name] = mapper(value)
+            data.append(item)
+        return data
+
+
+def _datetime_mapper(field):
+    """
+    ``DateTimeField.to_representation`` with the active timezone looked up
+    once, rather than for every value.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def to_representation(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return to_representation
+
+
+class ValuesListMixin:
+    """ViewSet mixin serving ``list`` through ``values_serializer_class``."""
+    values_serializer_class = None
+
+    def get_values_serializer(self, **kwargs):
+        return self.values_serializer_class(context=self.get_serializer_context(), **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_values_serializer()
+        queryset = self.filter_queryset(self.get_queryset()).values(*serializer.lookups)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(queryset))
@@ -0,0 +1,116 @@
+"""
+Sparse fieldsets: ``?fields=a,b`` returns only the listed fields and
+``?exclude=a,b`` leaves them out. Only the columns the remaining fields read
+are loaded, and method fields that were not asked for are never computed.
+"""
+
+from rest_framework.exceptions import ValidationError
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _split(value):
+    names = [name.strip() for name in (value or '').split(',') if name.strip()]
+    return names or None
+
+
+def requested_fields(query_params, available):
+    """
+    Names from ``available`` selected by ``?fields=``/``?exclude=``, in their
+    serializer order, or ``None`` when neither parameter is given. Unknown
+    names and excluding every field are validation errors.
+    """
+    fields = _split(query_params.get('fields'))
+    exclude = _split(query_params.get('exclude'))
+    if fields is None and exclude is None:
+        return None
+
+    errors = {}
+    for param, names in (('fields', fields), ('exclude', exclude)):
+        unknown = [name for name in names or () if name not in available]
+        if unknown:
+            errors[param] = [f"Unknown field(s): {', '.join(unknown)}"]
+    if errors:
+        raise ValidationError(errors)
+
+    selected = [
+        name for name in available
+        if (fields is None or name in fields) and name not in (exclude or ())
+    ]
+    if not selected:
+        # No field names would mean no column list, and every column loaded
+        raise ValidationError({'exclude': ['Leave at least one field']})
+    return selected
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    ModelSerializer mixin accepting ``fields=[...]`` to drop every other field.
+
+    ``method_sources`` lists the model fields each ``SerializerMethodField``
+    reads, so ``model_fields()`` can tell the view what to load with ``only()``.
+    """
+    method_sources = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def available_fields(cls):
+        if '_available_fields' not in cls.__dict__:
+            cls._available_fields = list(cls().fields)
+        return cls._available_fields
+
+    @classmethod
+    def model_fields(cls, field_names):
+        """Model fields to load with ``only()`` to serialize ``field_names``."""
+        declared = cls().fields
+        model_fields = []
+        for name in field_names:
+            if name in cls.method_sources:
+                model_fields.extend(cls.method_sources[name])
+            elif declared[name].source != '*':
+                # e.g. 'patient' for patient.get_full_name
+                model_fields.append(declared[name].source_attrs[0])
+        return list(dict.fromkeys(model_fields))
+
+
+class SparseFieldsetMixin:
+    """
+    ViewSet mixin applying ``?fields=``/``?exclude=`` to the reads in
+    ``fieldset_actions``: the ``values()`` list path and detail views (with
+    ``only()``). ``fieldset_model_fields`` are always loaded for detail
+    views, e.g. fields the view itself checks.
+    """
+    fieldset_actions = ('list', 'retrieve')
+    fieldset_model_fields = ()
+
+    def get_fieldset(self, serializer_class):
+        if (self.request.method not in SAFE_METHODS or self.action not in self.fieldset_actions
+                or not hasattr(serializer_class, 'available_fields')):
+            return None
+        return requested_fields(self.request.query_params, serializer_class.available_fields())
+
+    def get_values_serializer(self, **kwargs):
+        kwargs.setdefault('fields', self.get_fieldset(self.values_serializer_class))
+        return super().get_values_serializer(**kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_fieldset(self.get_serializer_class())
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.detail:
+            serializer_class = self.get_serializer_class()
+            fields = self.get_fieldset(serializer_class)
+            if fields is not None:
+                queryset = queryset.only(
+                    *serializer_class.model_fields(fields), *self.fieldset_model_fields
+                )
+        return queryset
@@ -0,0 +1,120 @@
+"""
+Conditional GET and pre-rendered response caching for reference data.
+
+Every reference table has a version stamp in the cache, replaced whenever
+one of its rows is saved or deleted. ETags and Last-Modified are derived
+from the stamps of the tables a view reads, so revalidation is answered
+from the cache alone, and full responses are cached gzip-compressed under
+their ETag.
+"""
+
+import gzip
+import hashlib
+import re
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
+from django.utils.text import compress_string
+
+# Clients and shared caches (CDNs) may store responses but must revalidate,
+# which forwards the Authorization header to us on every use
+REFERENCE_CACHE_CONTROL = 'public, no-cache'
+
+_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def _version_key(table):
+    return f'http:version:{table}'
+
+
+def bump_table_version(table):
+    """Invalidate ETags and cached responses for everything reading ``table``."""
+    cache.set(_version_key(table), {'token': uuid.uuid4().hex, 'modified': int(time.time())}, None)
+
+
+def table_versions(tables):
+    """
+    Return ``{table: {'token', 'modified'}}``. Stamps missing from the cache
+    (first use, eviction) are created fresh; random tokens guarantee an
+    evicted stamp never matches an ETag issued before.
+    """
+    keys = {_version_key(table): table for table in tables}
+    found = cache.get_many(keys)
+    for key, table in keys.items():
+        if key not in found:
+            cache.add(key, {'token': uuid.uuid4().hex, 'modified': int(time.time())}, None)
+            found[key] = cache.get(key) or {'token': uuid.uuid4().hex, 'modified': int(time.time())}
+    return {table: found[key] for key, table in keys.items()}
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # Weak comparison, as required for If-None-Match
+        tags = parse_etags(if_none_match)
+        return '*' in tags or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in tags}
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+class ReferenceDataCacheMixin:
+    """
+    ViewSet mixin serving ``list``/``retrieve`` with ETag/Last-Modified
+    validation and gzip-compressed, pre-rendered responses from the cache.
+
+    Set ``reference_tables`` to every table the serialized data depends on.
+    """
+    reference_tables = ()
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(request, super().retrieve, *args, **kwargs)
+
+    def _conditional_response(self, request, handler, *args, **kwargs):
+        versions = table_versions(self.reference_tables)
+        fingerprint = '|'.join([
+            self.__class__.__name__,
+            request.accepted_media_type or '',
+            request.get_full_path(),
+            *(versions[table]['token'] for table in self.reference_tables),
+        ])
+        etag = f'W/"{hashlib.sha1(fingerprint.encode()).hexdigest()}"'
+        last_modified = max(version['modified'] for version in versions.values())
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(last_modified),
+            'Cache-Control': REFERENCE_CACHE_CONTROL,
+            'Vary': 'Accept, Accept-Encoding',
+        }
+
+        if _not_modified(request, etag, last_modified):
+            return HttpResponseNotModified(headers=headers)
+
+        body_key = f'http:body:{etag}'
+        cached = cache.get(body_key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            # Render now so the bytes can be stored; the renderer was negotiated in initial()
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            cached = {
+                'content_type': response['Content-Type'],
+                'body': compress_string(response.content),
+            }
+            cache.set(body_key, cached, getattr(settings, 'REFERENCE_RESPONSE_CACHE_SECONDS', 3600))
+
+        if _accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            body = cached['body']
+            headers['Content-Encoding'] = 'gzip'
+        else:
+            body = gzip.decompress(cached['body'])
+        return HttpResponse(body, content_type=cached['content_type'], headers=headers)
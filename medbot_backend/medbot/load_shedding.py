@@ -0,0 +1,222 @@
+"""
+Admission control: under overload, refuse the least important requests
+first with a fast 503 instead of letting every request queue and time out.
+
+Each request gets a priority class from ``LOAD_SHEDDING_RULES``. From least
+to most important: ``browse`` (symptom reference data), ``status`` (analysis
+polls), ``default`` (everything unmatched), ``analysis`` (new analyses) and
+``critical``. Critical requests are never shed: n8n callbacks, health
+endpoints, and analyses whose description contains red-flag symptoms.
+
+``AdaptiveLimiter`` holds a per-process concurrency limit adjusted by the
+time requests spend in Django (AIMD). Those times are grouped into
+CoDel-style intervals. If even the fastest request of an interval took
+longer than ``LOAD_SHEDDING_TARGET_MS``, requests are contending for
+something inside the process (threads, connections, the GIL). The limit
+then shrinks by ``LOAD_SHEDDING_BACKOFF`` and the process counts as
+overloaded. Otherwise, if the limit was reached during the interval, it
+grows by one.
+
+A class may only fill its share of the limit (``LOAD_SHEDDING_SHARES``), and
+may only wait its share of the target in front of Django. That wait is known
+when the proxy sends ``X-Request-Start``. When the backlog grows, browsing
+passes its deadline first and is refused in microseconds, which drains the
+queue. The wait then settles where the admitted classes fit the capacity.
+With one thread per worker, these queue deadlines do all of the shedding.
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ('browse', 'status', 'default', 'analysis', 'critical')
+
+SHED_BODY = b'{"error": "Server overloaded, retry later"}'
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with per-class shares; thread-safe."""
+
+    def __init__(self, target, interval, initial_limit, min_limit, max_limit,
+                 backoff=0.9, shares=None):
+        self.target = target
+        self.interval = interval
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.shares = shares or {}
+        self.in_flight = 0
+        self.overloaded = False
+        self.admitted = Counter()
+        self.shed = Counter()
+        self._lock = threading.Lock()
+        self._interval_end = None
+        self._interval_min = None
+        self._interval_peak = 0
+
+    def has_room(self, priority, queued=0.0):
+        """Whether a ``priority`` request that waited ``queued`` seconds may start now."""
+        share = self.shares.get(priority)
+        if share is None:
+            return True
+        if self.in_flight >= max(1.0, self.limit * share):
+            return False
+        return queued <= self.target * share
+
+    def acquire(self, priority):
+        with self._lock:
+            self.in_flight += 1
+            self.admitted[priority] += 1
+            self._interval_peak = max(self._interval_peak, self.in_flight)
+
+    def reject(self, priority):
+        with self._lock:
+            self.shed[priority] += 1
+
+    def release(self, latency, now):
+        """Record a finished request's time in Django (seconds); adjust the limit once per interval."""
+        with self._lock:
+            self.in_flight -= 1
+            if self._interval_min is None or latency < self._interval_min:
+                self._interval_min = latency
+            if self._interval_end is None:
+                self._interval_end = now + self.interval
+            elif now >= self._interval_end:
+                self._adjust()
+                self._interval_end = now + self.interval
+
+    def _adjust(self):
+        was_overloaded, self.overloaded = self.overloaded, self._interval_min > self.target
+        if self.overloaded and not was_overloaded:
+            logger.warning(
+                "Overloaded: fastest request in %.0f ms took %.0f ms, lowering the concurrency limit",
+                self.interval * 1000, self._interval_min * 1000
+            )
+        if self.overloaded:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif self._interval_peak >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1)
+        self._interval_min = None
+        self._interval_peak = self.in_flight
+
+    def stats(self):
+        with self._lock:
+            return {
+                'concurrency_limit': round(self.limit, 1),
+                'in_flight': self.in_flight,
+                'overloaded': self.overloaded,
+                'classes': {
+                    priority: {'admitted': self.admitted[priority], 'shed': self.shed[priority]}
+                    for priority in PRIORITIES
+                },
+            }
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = AdaptiveLimiter(
+                    target=settings.LOAD_SHEDDING_TARGET_MS / 1000,
+                    interval=settings.LOAD_SHEDDING_INTERVAL_MS / 1000,
+                    initial_limit=settings.LOAD_SHEDDING_MAX_CONCURRENCY,
+                    min_limit=settings.LOAD_SHEDDING_MIN_CONCURRENCY,
+                    max_limit=settings.LOAD_SHEDDING_MAX_CONCURRENCY,
+                    backoff=settings.LOAD_SHEDDING_BACKOFF,
+                    shares=settings.LOAD_SHEDDING_SHARES,
+                )
+    return _limiter
+
+
+def load_shedding_stats():
+    """Concurrency limit and admitted/shed counts per class in this process."""
+    return get_limiter().stats()
+
+
+def request_start(meta, now):
+    """
+    Epoch seconds at which the proxy received the request, from
+    ``X-Request-Start`` (``t=<seconds>`` as nginx's ``${msec}``, or
+    milliseconds/microseconds), else ``now``.
+    """
+    header = meta.get('HTTP_X_REQUEST_START')
+    if not header:
+        return now
+    try:
+        start = float(header.strip().removeprefix('t='))
+    except ValueError:
+        return now
+    while start > now * 10:  # milliseconds or microseconds
+        start /= 1000
+    return min(start, now)
+
+
+class LoadSheddingMiddleware:
+    """Refuse low-priority requests with a 503 while the process is overloaded."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'LOAD_SHEDDING_ENABLED', True)
+        self.limiter = get_limiter()
+        self.rules = [
+            (re.compile(pattern), method, priority)
+            for pattern, method, priority in getattr(settings, 'LOAD_SHEDDING_RULES', ())
+        ]
+        self.retry_after = str(math.ceil(getattr(settings, 'LOAD_SHEDDING_RETRY_AFTER', 2)))
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        limiter = self.limiter
+        priority = self.priority(request)
+        now = time.time()
+        started = request_start(request.META, now)
+        if not limiter.has_room(priority, now - started):
+            if not (priority == 'analysis' and self.red_flagged(request)):
+                limiter.reject(priority)
+                return self.shed_response()
+            priority = 'critical'
+
+        limiter.acquire(priority)
+        admitted = time.monotonic()
+        try:
+            return self.get_response(request)
+        finally:
+            finished = time.monotonic()
+            limiter.release(finished - admitted, finished)
+
+    def priority(self, request):
+        path = request.path_info
+        for pattern, method, priority in self.rules:
+            if (method is None or method == request.method) and pattern.match(path):
+                return priority
+        return 'default'
+
+    def red_flagged(self, request):
+        """Whether a new analysis describes red-flag symptoms; only checked when it would be shed."""
+        from apps.symptoms.red_flags import detect_red_flags
+
+        try:
+            text = request.body.decode('utf-8', 'replace')
+            return bool(detect_red_flags(text)[0])
+        except Exception:
+            logger.exception("Red-flag check failed while shedding load; admitting the analysis")
+            return True
+
+    def shed_response(self):
+        response = HttpResponse(SHED_BODY, status=503, content_type='application/json')
+        response['Retry-After'] = self.retry_after
+        return response
@@ -52,7 +52,11 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    # First, so shed requests cost as little as possible
+    'medbot.load_shedding.LoadSheddingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'medbot.compression.CompressionMiddleware',
+    'medbot.db_router.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,9 +95,68 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default='postgres'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas: comma-separated host[:port] list sharing the primary's credentials
+DB_REPLICA_HOSTS = config('DB_REPLICA_HOSTS', default='')
+
+
+def add_read_replicas(databases, hosts):
+    """Add a ``replica_<n>`` alias per host, cloned from ``default``; returns the aliases."""
+    aliases = []
+    hosts = [host.strip() for host in hosts.split(',') if host.strip()]
+    for number, host in enumerate(hosts, start=1):
+        name, _, port = host.partition(':')
+        alias = f'replica_{number}'
+        databases[alias] = {
+            **databases['default'],
+            'HOST': name,
+            'PORT': port or databases['default']['PORT'],
+            'TEST': {'MIRROR': 'default'},
+        }
+        aliases.append(alias)
+    return aliases
+
+
+# Tenant shards: comma-separated host[:port]/name list, added as shard_<n> aliases;
+# assign a healthcare system with HealthcareSystem.database_shard
+DB_SHARDS = config('DB_SHARDS', default='')
+
+
+def add_shards(databases, shards):
+    """Add a ``shard_<n>`` alias per ``host[:port]/name`` entry; returns the aliases."""
+    aliases = []
+    shards = [shard.strip() for shard in shards.split(',') if shard.strip()]
+    for number, shard in enumerate(shards, start=1):
+        address, _, name = shard.partition('/')
+        host, _, port = address.partition(':')
+        alias = f'shard_{number}'
+        databases[alias] = {
+            **databases['default'],
+            'NAME': name or f"{databases['default']['NAME']}_{alias}",
+            'HOST': host,
+            'PORT': port or databases['default']['PORT'],
+        }
+        aliases.append(alias)
+    return aliases
+
+
+DATABASE_REPLICAS = add_read_replicas(DATABASES, DB_REPLICA_HOSTS)
+DATABASE_SHARDS = add_shards(DATABASES, DB_SHARDS)
+DATABASE_ROUTERS = [
+    'medbot.db_router.TenantShardRouter',
+    'medbot.db_router.ReplicaRouter',
+]
+
+# Replicas further behind than this are skipped (seconds, checked every interval)
+DB_REPLICA_MAX_LAG = config('DB_REPLICA_MAX_LAG', default=5, cast=float)
+DB_REPLICA_CHECK_INTERVAL = config('DB_REPLICA_CHECK_INTERVAL', default=5, cast=float)
+# After writing, a user's reads stay on the primary for this long (seconds)
+DB_READ_YOUR_WRITES_SECONDS = config('DB_READ_YOUR_WRITES_SECONDS', default=15, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -114,6 +177,16 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+AUTHENTICATION_BACKENDS = [
+    'apps.authentication.backends.PooledModelBackend',
+]
+
+# Password hashing pool (workers=0 hashes inline on the request thread)
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=2, cast=int)
+PASSWORD_HASHING_QUEUE_SIZE = config('PASSWORD_HASHING_QUEUE_SIZE', default=64, cast=int)
+PASSWORD_HASHING_QUEUE_TIMEOUT = config('PASSWORD_HASHING_QUEUE_TIMEOUT', default=2, cast=float)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -142,21 +215,52 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.authentication.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # orjson-backed; identical output, falls back to DRF's encoder without orjson
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'medbot.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'medbot.renderers.FastJSONParser',
         'rest_framework.parsers.MultiPartParser',
         'rest_framework.parsers.FormParser',
     ],
+    # Cost-weighted token buckets per user, IP and healthcare system (RATE_LIMIT_* below)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'medbot.throttling.TokenBucketThrottle',
+    ],
+    # Proxies in front of Django that append to X-Forwarded-For; 0 uses REMOTE_ADDR
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+}
+
+# Rate limiting: each bucket holds `capacity` tokens and refills continuously
+RATE_LIMIT_ENABLED = config('RATE_LIMIT_ENABLED', default=True, cast=bool)
+RATE_LIMIT_BUCKETS = {
+    'user': {
+        'capacity': config('RATE_LIMIT_USER_CAPACITY', default=120, cast=int),
+        'refill_per_second': config('RATE_LIMIT_USER_REFILL', default=2.0, cast=float),
+    },
+    'ip': {
+        'capacity': config('RATE_LIMIT_IP_CAPACITY', default=300, cast=int),
+        'refill_per_second': config('RATE_LIMIT_IP_REFILL', default=5.0, cast=float),
+    },
+    'tenant': {
+        'capacity': config('RATE_LIMIT_TENANT_CAPACITY', default=3000, cast=int),
+        'refill_per_second': config('RATE_LIMIT_TENANT_REFILL', default=50.0, cast=float),
+    },
+}
+# Tokens a request spends, by the view's throttle_scope; 'default' for the rest
+RATE_LIMIT_COSTS = {
+    'default': 1,
+    'analysis_status': 1,
+    'analysis': 20,
+    'login': 10,
 }
 
 # JWT Configuration
@@ -165,7 +269,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(minutes=config('JWT_REFRESH_TOKEN_LIFETIME', default=1440, cast=int)),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    # last_login is written by CustomTokenObtainPairSerializer, throttled
+    'UPDATE_LAST_LOGIN': False,
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'VERIFYING_KEY': None,
@@ -177,6 +282,10 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Cached authentication snapshot lifetime and last_login write throttle (seconds)
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=60, cast=int)
+LAST_LOGIN_UPDATE_INTERVAL = config('LAST_LOGIN_UPDATE_INTERVAL', default=3600, cast=int)
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', default='http://localhost:3000,http://127.0.0.1:3000').split(',')
 CORS_ALLOW_CREDENTIALS = True
@@ -184,6 +293,58 @@ CORS_ALLOW_CREDENTIALS = True
 # n8n Integration Settings
 N8N_BASE_URL = config('N8N_BASE_URL', default='http://localhost:5678')
 N8N_API_KEY = config('N8N_API_KEY', default='development-key')
+N8N_STUCK_EXECUTION_MINUTES = config('N8N_STUCK_EXECUTION_MINUTES', default=10, cast=int)
+# Threads triggering analyses in n8n, i.e. the most analyses started at once
+N8N_DISPATCH_WORKERS = config('N8N_DISPATCH_WORKERS', default=8, cast=int)
+# Most of those workers each priority lane may occupy; lower lanes leave room for emergencies
+N8N_LANE_CONCURRENCY = {
+    'emergency': config('N8N_EMERGENCY_CONCURRENCY', default=N8N_DISPATCH_WORKERS, cast=int),
+    'urgent': config('N8N_URGENT_CONCURRENCY', default=7, cast=int),
+    'routine': config('N8N_ROUTINE_CONCURRENCY', default=6, cast=int),
+}
+# Fair-share weight of a healthcare system (by id) within each lane; others weigh 1
+ANALYSIS_TENANT_WEIGHTS = {}
+
+# Load shedding: requests are classed by the first matching (path regex, method or None, class).
+# From least to most important: browse, status, default (unmatched), analysis, critical (never shed)
+LOAD_SHEDDING_ENABLED = config('LOAD_SHEDDING_ENABLED', default=True, cast=bool)
+LOAD_SHEDDING_RULES = [
+    (r'^/webhooks/n8n/', None, 'critical'),
+    (r'^/api/admin-dashboard/system-health/', 'GET', 'critical'),
+    (r'^/api/symptoms/analysis/analyze_symptoms/$', 'POST', 'analysis'),
+    (r'^/api/symptoms/analysis/[^/]+/analysis_(status|results)/$', 'GET', 'status'),
+    (r'^/api/symptoms/(symptoms|categories|icd-codes)/', 'GET', 'browse'),
+]
+# Share of the adaptive concurrency limit (and of the latency target) each class may use
+LOAD_SHEDDING_SHARES = {'browse': 0.5, 'status': 0.7, 'default': 0.85, 'analysis': 1.0}
+LOAD_SHEDDING_TARGET_MS = config('LOAD_SHEDDING_TARGET_MS', default=500, cast=int)
+LOAD_SHEDDING_INTERVAL_MS = config('LOAD_SHEDDING_INTERVAL_MS', default=100, cast=int)
+LOAD_SHEDDING_MIN_CONCURRENCY = config('LOAD_SHEDDING_MIN_CONCURRENCY', default=2, cast=int)
+LOAD_SHEDDING_MAX_CONCURRENCY = config('LOAD_SHEDDING_MAX_CONCURRENCY', default=64, cast=int)
+LOAD_SHEDDING_BACKOFF = 0.9
+LOAD_SHEDDING_RETRY_AFTER = config('LOAD_SHEDDING_RETRY_AFTER', default=2, cast=int)  # seconds
+
+# Write-behind counters (doctor totals and ratings, occupancy) are flushed this often; 0 leaves it to flush_counters
+COUNTER_FLUSH_INTERVAL = config('COUNTER_FLUSH_INTERVAL', default=5, cast=int)  # seconds
+
+# Department that red-flag symptoms are sent to, answered without waiting for the AI workflow
+EMERGENCY_DEPARTMENT_NAME = config('EMERGENCY_DEPARTMENT_NAME', default='Emergency Medicine')
+
+# Data Retention and Archival
+DATA_RETENTION_DAYS = config('DATA_RETENTION_DAYS', default=365, cast=int)
+N8N_EXECUTION_RETENTION_DAYS = config('N8N_EXECUTION_RETENTION_DAYS', default=90, cast=int)
+ARCHIVE_ROOT = config('ARCHIVE_ROOT', default=str(BASE_DIR / 'archive'))
+
+# Response compression (brotli when installed and accepted, else gzip)
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)  # bytes
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Pre-rendered reference data responses (symptoms, categories) stay cached this long
+REFERENCE_RESPONSE_CACHE_SECONDS = config('REFERENCE_RESPONSE_CACHE_SECONDS', default=3600, cast=int)
+
+# Compiled ICD-10-CM catalog (manage.py compile_icd_catalog), memory-mapped by every worker
+ICD_CATALOG_PATH = config('ICD_CATALOG_PATH', default=str(BASE_DIR / 'data' / 'icd10cm.catalog'))
 
 # Redis Configuration
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
@@ -203,8 +364,19 @@ EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='MedBot <noreply@medbot.local>')
+
+# Frontend page that redeems bulk-import invites via /api/auth/accept-invite/
+PATIENT_INVITE_URL = config('PATIENT_INVITE_URL', default='http://localhost:3000/accept-invite/{uid}/{token}/')
 
 # Logging Configuration
+# Handlers run on a background thread behind a queue; see medbot.structured_logging
+LOGGING_CONFIG = 'medbot.structured_logging.configure'
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+# Records below WARNING let through per logger and message template each second (0: no sampling)
+LOG_SAMPLE_PER_SECOND = config('LOG_SAMPLE_PER_SECOND', default=20, cast=int)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -217,13 +389,16 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'medbot.structured_logging.JSONFormatter',
+        },
     },
     'handlers': {
         'file': {
             'level': 'INFO',
             'class': 'logging.FileHandler',
             'filename': BASE_DIR / 'logs' / 'medbot.log',
-            'formatter': 'verbose',
+            'formatter': 'json',
         },
         'console': {
             'level': 'DEBUG',
@@ -233,7 +408,7 @@ LOGGING = {
     },
     'root': {
         'handlers': ['console', 'file'],
-        'level': 'INFO',
+        'level': LOG_LEVEL,
     },
     'loggers': {
         'django': {
@@ -243,12 +418,12 @@ LOGGING = {
         },
         'apps.n8n_integration': {
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': False,
         },
         'apps.consultations': {
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': False,
         },
     },
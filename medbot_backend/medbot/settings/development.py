@@ -17,8 +17,12 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default='postgres'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+DATABASE_REPLICAS = add_read_replicas(DATABASES, DB_REPLICA_HOSTS)
+DATABASE_SHARDS = add_shards(DATABASES, DB_SHARDS)
 
 # Additional development apps - django_extensions already in base.py
 
@@ -60,7 +64,7 @@ SESSION_CACHE_ALIAS = 'default'
 
 # Development logging
 LOGGING['handlers']['console']['level'] = 'DEBUG'
-LOGGING['root']['level'] = 'DEBUG'
+LOGGING['root']['level'] = config('LOG_LEVEL', default='DEBUG')
 
 # n8n settings for development
 N8N_BASE_URL = config('N8N_BASE_URL', default='http://localhost:5678')
@@ -13,9 +13,35 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Optional second SQLite file acting as a read replica, e.g. a copy of
+# db.sqlite3; it is never migrated or written, so it behaves like a stale replica.
+# The alias always exists so tests can switch it on with
+# override_settings(DATABASE_REPLICAS=['replica_1']); there it is a separate,
+# empty test database that never catches up
+SQLITE_REPLICA = config('SQLITE_REPLICA', default='')
+DATABASES['replica_1'] = {**DATABASES['default'], 'NAME': SQLITE_REPLICA or DATABASES['default']['NAME']}
+DATABASE_REPLICAS = ['replica_1'] if SQLITE_REPLICA else []
+
+# Optional SQLite files acting as tenant shards (shard_1, shard_2, ...);
+# create them with `python manage.py migrate --database shard_<n>`
+SQLITE_SHARDS = [path.strip() for path in config('SQLITE_SHARDS', default='').split(',') if path.strip()]
+DATABASE_SHARDS = []
+for number, path in enumerate(SQLITE_SHARDS, start=1):
+    DATABASES[f'shard_{number}'] = {**DATABASES['default'], 'NAME': path}
+    DATABASE_SHARDS.append(f'shard_{number}')
+
+# Otherwise two shard aliases still exist (in memory under the test runner,
+# whichever runs it) and stay unused until a test case switches them on with
+# override_settings(DATABASE_SHARDS=[...])
+if not SQLITE_SHARDS:
+    for number in (1, 2):
+        DATABASES[f'shard_{number}'] = {**DATABASES['default'], 'NAME': BASE_DIR / f'shard_{number}.sqlite3'}
+
 # Additional development apps
 # django_extensions already in base.py
 
@@ -49,13 +75,16 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
     }
 }
+if SQLITE_REPLICA:
+    # Read-your-writes stickiness needs a cache that actually stores entries
+    CACHES['default'] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
 
 # Session configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 
 # Development logging
 LOGGING['handlers']['console']['level'] = 'DEBUG'
-LOGGING['root']['level'] = 'DEBUG'
+LOGGING['root']['level'] = config('LOG_LEVEL', default='DEBUG')
 
 # n8n settings for development
 N8N_BASE_URL = config('N8N_BASE_URL', default='http://localhost:5678')
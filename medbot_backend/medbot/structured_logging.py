@@ -0,0 +1,255 @@
+"""
+Non-blocking, structured logging.
+
+``configure`` is Django's ``LOGGING_CONFIG``: it applies ``LOGGING`` as usual,
+then replaces the handlers of the root logger and every logger named there
+with a single ``QueueingHandler``. Request threads only sample and enqueue
+records; a ``RoutingQueueListener`` thread redacts PHI, formats messages and
+writes to the original handlers. Log with lazy ``%s`` arguments and
+``extra=`` fields rather than f-strings, so nothing is formatted on the
+request thread and sampling can group records by message template.
+
+Arguments are formatted on the listener thread, so log values the request
+will not mutate afterwards.
+"""
+
+import atexit
+import datetime
+import logging
+import logging.config
+import logging.handlers
+import os
+import queue
+import re
+import time
+from collections.abc import Mapping
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+    import json
+
+# Patient data never written to logs, wherever it appears
+DEFAULT_REDACTED_FIELDS = (
+    'medical_history', 'allergies', 'current_medications', 'symptoms',
+    'symptom_description', 'additional_info', 'password', 'token',
+    'first_name', 'last_name', 'full_name', 'email', 'phone_number',
+    'date_of_birth', 'emergency_contact', 'insurance_number',
+)
+REDACTED = '[REDACTED]'
+
+# Contact details masked in any text, whatever field (if any) they are in:
+# email addresses, and phone numbers written with a country code or as
+# NANP-style groups, e.g. "+44 20 7946 0958", "(555) 010-0199", "555.010.0199"
+_contact_pattern = re.compile(
+    r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+'
+    r'|(?<![\w+])\+\d[\d\s().-]{6,}\d(?!\w)'
+    r'|(?<![\w+])(?:\(\d{3}\)\s?|\d{3}[\s.-])\d{3}[\s.-]\d{4}(?!\w)'
+)
+
+# Message templates tracked by SamplingFilter before stale seconds are pruned
+SAMPLING_MAX_KEYS = 10000
+
+# LogRecord attributes; anything else on a record came from ``extra=``
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener = None
+
+
+def _redaction_pattern(fields):
+    # ``'allergies': 'penicillin'``, ``allergies=penicillin`` and the like in formatted text
+    keys = '|'.join(re.escape(field) for field in fields)
+    return re.compile(
+        rf'''(?P<key>['"]?\b(?:{keys})\b['"]?\s*[:=]\s*)'''
+        r'''(?P<value>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|\[[^\]]*\]|\{[^}]*\}|[^,;)\]}\s]+)'''
+    )
+
+
+class Redactor:
+    """Copies of log values with PHI fields replaced by ``[REDACTED]``."""
+
+    def __init__(self, fields):
+        self.fields = frozenset(fields)
+        self.pattern = _redaction_pattern(sorted(self.fields))
+
+    def value(self, value):
+        if isinstance(value, Mapping):
+            return {
+                key: REDACTED if key in self.fields else self.value(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, (list, tuple, set)):
+            return [self.value(item) for item in value]
+        if isinstance(value, str):
+            return self.text(value)
+        return value
+
+    def text(self, text):
+        return _contact_pattern.sub(REDACTED, self.pattern.sub(rf'\g<key>{REDACTED}', text))
+
+    def record(self, record):
+        """A redacted copy of ``record`` with its message already formatted."""
+        record = logging.makeLogRecord(record.__dict__)
+        if isinstance(record.args, Mapping):
+            record.args = self.value(record.args)
+        elif record.args:
+            record.args = tuple(self.value(arg) for arg in record.args)
+        try:
+            message = record.getMessage()
+        except Exception as exc:  # a bad format string must not kill the listener
+            message = f'{record.msg!r} % {record.args!r} ({exc})'
+        record.msg, record.args = self.text(message), None
+
+        for key in record.__dict__.keys() - _RECORD_ATTRIBUTES:
+            record.__dict__[key] = REDACTED if key in self.fields else self.value(record.__dict__[key])
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through at most ``per_second`` records per logger and message
+    template each second, below ``WARNING``. The first record after a
+    sampled second carries ``sampled_out``: how many were dropped.
+    """
+
+    def __init__(self, per_second=20, max_level=logging.INFO):
+        super().__init__()
+        self.per_second = per_second
+        self.max_level = max_level
+        self._windows = {}
+
+    def filter(self, record):
+        if record.levelno > self.max_level or not self.per_second:
+            return True
+        key = (record.name, record.msg)
+        now = int(time.monotonic())
+        second, passed, dropped = self._windows.get(key, (now, 0, 0))
+        if second != now:
+            second, passed = now, 0
+        if len(self._windows) > SAMPLING_MAX_KEYS:
+            self._windows = {key: window for key, window in self._windows.items() if window[0] == now}
+        if passed >= self.per_second:
+            self._windows[key] = (second, passed, dropped + 1)
+            return False
+        if dropped:
+            record.sampled_out = dropped
+        self._windows[key] = (second, passed + 1, 0)
+        return True
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records with the handlers they are meant for, unformatted.
+    Never blocks: when the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue, targets):
+        super().__init__(log_queue)
+        self.targets = tuple(targets)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if self.dropped:
+            record.queue_dropped = self.dropped
+        try:
+            self.queue.put_nowait((record, self.targets))
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting and redaction happen on the listener thread
+        return record
+
+
+class RoutingQueueListener(logging.handlers.QueueListener):
+    """Redact each queued record and hand it to the handlers it was queued for."""
+
+    def __init__(self, log_queue, redactor):
+        super().__init__(log_queue, respect_handler_level=True)
+        self.redactor = redactor
+
+    def handle(self, item):
+        record, targets = item
+        record = self.redactor.record(record)
+        for handler in targets:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with ``extra=`` fields as top-level keys."""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key in record.__dict__.keys() - _RECORD_ATTRIBUTES:
+            entry.setdefault(key, record.__dict__[key])
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        if orjson:
+            return orjson.dumps(entry, default=str).decode()
+        return json.dumps(entry, default=str)
+
+
+def _start_listener(log_queue):
+    global _listener
+    _listener = RoutingQueueListener(
+        log_queue, Redactor(getattr(settings, 'LOG_REDACTED_FIELDS', DEFAULT_REDACTED_FIELDS))
+    )
+    _listener.start()
+
+
+def stop_listener():
+    """Write out everything still queued."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure(logging_settings):
+    """``LOGGING_CONFIG``: ``dictConfig`` with every configured logger behind the queue."""
+    stop_listener()
+    logging.config.dictConfig(logging_settings)
+
+    log_queue = queue.Queue(getattr(settings, 'LOG_QUEUE_SIZE', 10000))
+    for name in [None, *logging_settings.get('loggers', {})]:
+        logger = logging.getLogger(name)
+        if not logger.handlers:
+            continue
+        handler = QueueingHandler(log_queue, logger.handlers)
+        # Records no target would write are dropped before they are queued
+        handler.setLevel(min(target.level for target in logger.handlers))
+        handler.addFilter(SamplingFilter(getattr(settings, 'LOG_SAMPLE_PER_SECOND', 20)))
+        logger.handlers = [handler]
+    _start_listener(log_queue)
+
+
+def _restart_after_fork():
+    # Threads do not survive fork (e.g. gunicorn --preload), and the queue's condition still
+    # lists the parent listener as its waiter, so a put would wake nobody. Reset the queue (what
+    # it holds is the parent's to write) and drain it from a new listener in the child.
+    if _listener is not None:
+        log_queue = _listener.queue
+        log_queue.__init__(log_queue.maxsize)
+        _start_listener(log_queue)
+
+
+atexit.register(stop_listener)
+os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,629 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+import uuid
+import zlib
+from datetime import date, datetime, time as datetime_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipIf
+from django.core.cache import cache
+from django.db import connection
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from apps.authentication.authentication import CachedUser, build_user_snapshot
+from apps.consultations.models import Consultation
+from apps.departments.models import Department
+from apps.healthcare_systems.models import HealthcareSystem
+from apps.symptoms.models import Symptom, SymptomCategory
+from apps.symptoms.red_flags import forget_matcher
+from apps.users.models import DoctorProfile, User
+from . import compression, counters, structured_logging
+from .compression import CompressionMiddleware, choose_encoding
+from .db_router import ReplicaRoutingMiddleware, recent_write_key
+from .http_cache import REFERENCE_CACHE_CONTROL
+from .load_shedding import AdaptiveLimiter, LoadSheddingMiddleware
+from .renderers import FastJSONRenderer
+from .structured_logging import (
+    DEFAULT_REDACTED_FIELDS,
+    QueueingHandler,
+    Redactor,
+    RoutingQueueListener,
+    SamplingFilter,
+)
+from .throttling import LocalBuckets, _local_buckets, forget_buckets
+
+
+@override_settings(
+    RATE_LIMIT_ENABLED=True,
+    RATE_LIMIT_BUCKETS={'user': {'capacity': 25, 'refill_per_second': 0.01}},
+    RATE_LIMIT_COSTS={'default': 1, 'analysis_status': 1, 'analysis': 20},
+)
+class RateLimitTest(TestCase):
+    """Analyses spend more of a user's tokens than status polls."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user(username='limited', password='x')
+
+    def setUp(self):
+        forget_buckets()
+        self.addCleanup(forget_buckets)
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    @mock.patch('apps.symptoms.views.dispatch_analysis')
+    def test_analysis_costs_more_than_status(self, dispatch_analysis):
+        url = '/api/symptoms/analysis/analyze_symptoms/'
+        response = self.client.post(url, {'symptoms': 'Migraine'}, format='json')
+        self.assertEqual(response.status_code, 202)
+
+        response = self.client.post(url, {'symptoms': 'Migraine again'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        # 15 tokens short at 0.01 per second
+        self.assertEqual(response['Retry-After'], '1500')
+
+        status_url = f'/api/symptoms/analysis/{Consultation.objects.get().id}/analysis_status/'
+        for _ in range(5):
+            self.assertEqual(self.client.get(status_url).status_code, 200)
+        self.assertEqual(self.client.get(status_url).status_code, 429)
+
+    @override_settings(
+        RATE_LIMIT_BUCKETS={'ip': {'capacity': 25, 'refill_per_second': 0.01}}, RATE_LIMIT_COSTS={'login': 10}
+    )
+    def test_forwarded_for_is_not_trusted_by_default(self):
+        client = APIClient()
+        for number in range(3):
+            response = client.post(
+                '/api/auth/login/', {'username': 'limited', 'password': 'wrong'}, format='json',
+                HTTP_X_FORWARDED_FOR=f'10.0.0.{number}'
+            )
+        # Rotating X-Forwarded-For does not refill REMOTE_ADDR's bucket
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(RATE_LIMIT_BUCKETS={'tenant': {'capacity': 25, 'refill_per_second': 0.01}})
+    def test_tenant_bucket_is_the_users_own(self):
+        tenant = str(uuid.uuid4())
+        self.client.get('/api/symptoms/symptoms/', HTTP_X_HEALTHCARE_SYSTEM=tenant)
+        # A client-supplied tenant header never names a bucket
+        self.assertFalse(any(tenant in key for key in _local_buckets._buckets))
+
+        system_id = uuid.uuid4()
+        staff = User.objects.create_user(username='staff', password='x', user_type='clinic_admin')
+        staff.healthcare_system_id = system_id
+        self.client.force_authenticate(staff)
+        self.client.get('/api/symptoms/symptoms/')
+        self.assertIn(f'ratelimit:tenant:{system_id}', _local_buckets._buckets)
+
+    def test_buckets_are_debited_together(self):
+        buckets = LocalBuckets()
+        self.assertEqual(buckets.take([('a', 10, 1.0), ('b', 3, 1.0)], 3), (True, 0.0))
+        admitted, wait = buckets.take([('a', 10, 1.0), ('b', 3, 1.0)], 2)
+        self.assertFalse(admitted)
+        self.assertAlmostEqual(wait, 2.0, places=2)
+        # 'b' could not pay, so 'a' kept its tokens
+        self.assertEqual(buckets.take([('a', 10, 1.0)], 7), (True, 0.0))
+
+
+class LoadSheddingTest(TestCase):
+    """Overload sheds browsing before analyses, and never red-flag analyses."""
+
+    def setUp(self):
+        forget_matcher()
+        self.middleware = LoadSheddingMiddleware(lambda request: HttpResponse(b'{}'))
+        self.middleware.limiter = AdaptiveLimiter(
+            target=0.5, interval=0.1, initial_limit=4, min_limit=1, max_limit=8,
+            shares={'browse': 0.5, 'status': 0.7, 'default': 0.85, 'analysis': 1.0},
+        )
+        self.factory = RequestFactory()
+
+    def call(self, method, path, queued, **kwargs):
+        request = getattr(self.factory, method)(
+            path, HTTP_X_REQUEST_START=f't={time.time() - queued:.3f}', **kwargs
+        )
+        return self.middleware(request)
+
+    def test_queue_deadlines_by_priority(self):
+        # 300 ms in the queue: past browsing's 250 ms deadline, within the analysis 500 ms one
+        response = self.call('get', '/api/symptoms/symptoms/', 0.3)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+        analysis = '/api/symptoms/analysis/analyze_symptoms/'
+        body = {'data': '{"symptoms": "Migraine"}', 'content_type': 'application/json'}
+        self.assertEqual(self.call('post', analysis, 0.3, **body).status_code, 200)
+        self.assertEqual(self.call('post', analysis, 0.8, **body).status_code, 503)
+        self.assertEqual(self.call('post', '/webhooks/n8n/symptom-analysis/', 30).status_code, 200)
+
+    def test_red_flag_analyses_are_never_shed(self):
+        category = SymptomCategory.objects.create(name='Cardiovascular', description='Heart')
+        Symptom.objects.create(
+            name='Chest Pain', description='Chest pain', category=category, is_emergency_indicator=True
+        )
+        response = self.call(
+            'post', '/api/symptoms/analysis/analyze_symptoms/', 30,
+            data='{"symptoms": "Crushing chest pain"}', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.middleware.limiter.stats()['classes']['critical']['admitted'], 1)
+
+    def test_limit_backs_off_and_recovers(self):
+        limiter = self.middleware.limiter
+        for now in (0.0, 0.2, 0.4):  # two intervals whose fastest request missed the target
+            limiter.acquire('default')
+            limiter.release(0.6, now=now)
+        self.assertTrue(limiter.overloaded)
+        self.assertAlmostEqual(limiter.limit, 4 * 0.9 * 0.9)
+        limiter.acquire('default')
+        limiter.acquire('default')
+        self.assertFalse(limiter.has_room('browse'))  # 1.62 slots for browsing, 2 in flight
+        self.assertTrue(limiter.has_room('analysis'))
+
+        # The next interval is fast and reaches the limit
+        limiter.acquire('default')
+        limiter.acquire('default')
+        limiter.release(0.01, now=0.6)
+        self.assertFalse(limiter.overloaded)
+        self.assertAlmostEqual(limiter.limit, 4 * 0.9 * 0.9 + 1)
+
+
+@override_settings(COUNTER_FLUSH_INTERVAL=0)
+class WriteBehindCounterTest(TestCase):
+    """Concurrent increments are all counted and reach each row in one UPDATE."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(
+            name='Cardiology', description='Heart', urgency_level='routine', average_wait_time=30
+        )
+        cls.system = HealthcareSystem.objects.create(
+            name='General', system_type='hospital', address='1 Main St', city='Springfield',
+            state='IL', zip_code='62701', phone_number='555-0100', email='info@example.com',
+            monthly_fee=Decimal('100.00'), contract_start_date=timezone.now().date(),
+            contract_end_date=timezone.now().date() + timedelta(days=365),
+        )
+        cls.patient = User.objects.create_user(username='rated', password='x')
+        cls.doctor = User.objects.create_user(username='doctor', password='x')
+        cls.profile = DoctorProfile.objects.create(
+            user=cls.doctor, license_number='L-1', specialization=cls.department, years_of_experience=5,
+            education='MD', consultation_fee=Decimal('50.00')
+        )
+
+    def setUp(self):
+        counters.flush()
+
+    def test_no_lost_updates(self):
+        def work():
+            for _ in range(500):
+                counters.increment(HealthcareSystem, self.system.pk, current_occupancy=1)
+                counters.increment(DoctorProfile, self.doctor.pk, total_consultations=1)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(counters.flush(), 2)
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries), 2)
+        self.system.refresh_from_db()
+        self.profile.refresh_from_db()
+        self.assertEqual((self.system.current_occupancy, self.profile.total_consultations), (4000, 4000))
+        self.assertEqual(counters.flush(), 0)
+
+
+class StructuredLoggingForkTest(TestCase):
+    """A forked child (pool worker, preloaded server) gets a working log queue."""
+
+    def test_child_can_flush(self):
+        self.assertIsNotNone(structured_logging._listener)
+        pid = os.fork()
+        if pid == 0:
+            signal.alarm(5)  # killed rather than hanging the suite
+            try:
+                # What django.setup() does first in a pool worker
+                structured_logging.stop_listener()
+            finally:
+                os._exit(0)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+
+class CapturingHandler(logging.Handler):
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class StructuredLoggingTest(SimpleTestCase):
+    """PHI is masked before any handler sees a record; sampling only thins chatty INFO logs."""
+
+    def setUp(self):
+        self.redactor = Redactor(DEFAULT_REDACTED_FIELDS)
+
+    def redact(self, msg, args=(), **extra):
+        record = logging.getLogger('medbot.test').makeRecord(
+            'medbot.test', logging.INFO, __file__, 1, msg, args, None, extra=extra
+        )
+        return self.redactor.record(record)
+
+    def test_redacts_message_args_and_extra(self):
+        record = self.redact(
+            'Patient %s (first_name=%s) wrote %r; reach them at %s',
+            ('jane.doe@example.com', 'Jane', {'symptoms': 'Crushing chest pain', 'pain_level': 8}, '(555) 010-0199'),
+            patient={'last_name': 'Doe', 'phone_number': '555-010-0199', 'age': 42},
+            symptom_description='Short of breath since noon',
+            contact='call +44 20 7946 0958',
+            consultation_id='5cf4d4f1-3037-4b90-84c1-f807ee230353',
+        )
+        message = record.getMessage()
+        for secret in ('jane.doe', 'Jane', 'chest pain', '010-0199'):
+            self.assertNotIn(secret, message)
+        self.assertEqual(
+            message,
+            "Patient [REDACTED] (first_name=[REDACTED]) wrote {'symptoms': [REDACTED], 'pain_level': 8}; "
+            "reach them at [REDACTED]"
+        )
+        self.assertEqual(record.patient, {'last_name': '[REDACTED]', 'phone_number': '[REDACTED]', 'age': 42})
+        self.assertEqual(record.symptom_description, '[REDACTED]')
+        self.assertEqual(record.contact, 'call [REDACTED]')
+        # Identifiers, dates and timings are not contact details
+        self.assertEqual(record.consultation_id, '5cf4d4f1-3037-4b90-84c1-f807ee230353')
+        self.assertEqual(self.redact('started 2026-10-19 12:00:00 in 563 ms').getMessage(),
+                         'started 2026-10-19 12:00:00 in 563 ms')
+
+        # Text that was already formatted, and mapping-style arguments
+        self.assertEqual(
+            self.redact("Received symptom analysis request: {'symptoms': 'rash', 'email': 'x@y.org'}").getMessage(),
+            "Received symptom analysis request: {'symptoms': [REDACTED], 'email': [REDACTED]}"
+        )
+        self.assertEqual(self.redact('%(allergies)s / %(age)s', ({'allergies': 'penicillin', 'age': 3},)).getMessage(),
+                         '[REDACTED] / 3')
+
+    def test_listener_routes_redacted_records(self):
+        log_queue = queue.Queue()
+        everything, warnings, other = CapturingHandler(), CapturingHandler(logging.WARNING), CapturingHandler()
+        listener = RoutingQueueListener(log_queue, self.redactor)
+        first = QueueingHandler(log_queue, [everything, warnings])
+        second = QueueingHandler(log_queue, [other])
+        listener.start()
+        try:
+            for handler, level, text in (
+                (first, logging.INFO, 'info symptoms=vertigo'),
+                (first, logging.ERROR, 'error for jane@example.com'),
+                (second, logging.INFO, 'other'),
+            ):
+                handler.handle(logging.makeLogRecord({'msg': text, 'levelno': level, 'levelname': 'X'}))
+        finally:
+            listener.stop()
+        self.assertEqual([record.msg for record in everything.records],
+                         ['info symptoms=[REDACTED]', 'error for [REDACTED]'])
+        self.assertEqual([record.msg for record in warnings.records], ['error for [REDACTED]'])
+        self.assertEqual([record.msg for record in other.records], ['other'])
+
+    def test_full_queue_drops_without_blocking(self):
+        handler = QueueingHandler(queue.Queue(1), [CapturingHandler()])
+        for number in range(3):
+            handler.handle(logging.makeLogRecord({'msg': f'record {number}'}))
+        self.assertEqual(handler.dropped, 2)
+        handler.queue.get_nowait()
+        record = logging.makeLogRecord({'msg': 'after'})
+        handler.handle(record)
+        # The count survives records dropped while it was pending
+        self.assertEqual((record.queue_dropped, handler.dropped), (2, 0))
+
+    def test_sampling(self):
+        sampler = SamplingFilter(per_second=3)
+
+        def passed(msg, level=logging.INFO, name='medbot.test'):
+            records = [logging.makeLogRecord({'msg': msg, 'levelno': level, 'name': name}) for _ in range(5)]
+            return [record for record in records if sampler.filter(record)]
+
+        with mock.patch('medbot.structured_logging.time.monotonic', return_value=100.0):
+            self.assertEqual(len(passed('Polled %s')), 3)
+            # Per logger and template; warnings and above are never sampled
+            self.assertEqual(len(passed('Polled %s', name='medbot.other')), 3)
+            self.assertEqual(len(passed('Created %s')), 3)
+            self.assertEqual(len(passed('Polled %s', level=logging.WARNING)), 5)
+        with mock.patch('medbot.structured_logging.time.monotonic', return_value=101.5):
+            records = passed('Polled %s')
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0].sampled_out, 2)
+        self.assertFalse(hasattr(records[1], 'sampled_out'))
+        unlimited = SamplingFilter(per_second=0)
+        record = logging.makeLogRecord({'msg': 'x', 'levelno': logging.INFO})
+        self.assertTrue(all(unlimited.filter(record) for _ in range(50)))
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RATE_LIMIT_ENABLED=False,
+)
+class ReferenceDataCacheTest(TestCase):
+    """Reference data revalidates from version stamps that change once a write commits."""
+
+    url = '/api/symptoms/symptoms/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = SymptomCategory.objects.create(name='Neurological', description='Nerves')
+        Symptom.objects.create(name='Headache', description='Head pain', category=cls.category)
+        cls.user = User.objects.create_user(username='browser', password='x')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, **headers):
+        return self.client.get(self.url, **headers)
+
+    def names(self, response):
+        body = response.content
+        if response.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        data = json.loads(body)
+        return sorted(symptom['name'] for symptom in data.get('results', data))
+
+    def test_validators_and_encoding(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(response['Cache-Control'], REFERENCE_CACHE_CONTROL)
+        self.assertIn('Last-Modified', response)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(self.names(response), ['Headache'])
+
+        # Served from the stored body, compressed when the client accepts it
+        with self.assertNumQueries(0):
+            compressed = self.get(HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual((compressed['ETag'], compressed['Content-Encoding']), (response['ETag'], 'gzip'))
+        self.assertEqual(self.names(compressed), ['Headache'])
+
+        # The ETag depends on the query, not only the tables
+        self.assertNotEqual(self.client.get(self.url, {'search': 'head'})['ETag'], response['ETag'])
+
+    def test_if_none_match(self):
+        etag = self.get()['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag.removeprefix('W/')).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='W/"other"').status_code, 200)
+
+    def test_writes_invalidate_after_commit(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks() as callbacks:
+            Symptom.objects.create(name='Dizziness', description='Vertigo', category=self.category)
+            # Until the write commits, readers keep the version of the rows they can see
+            self.assertEqual(self.get()['ETag'], etag)
+        for callback in callbacks:
+            callback()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.names(response), ['Dizziness', 'Headache'])
+
+        # category_name is read from the categories table too
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Neurology'
+            self.category.save()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    DATABASE_REPLICAS=['replica_1'],
+)
+class ReplicaRoutingTest(TestCase):
+    """Safe requests read from the replica until the user writes, then from the primary."""
+
+    databases = {'default', 'replica_1'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.writer = User.objects.create_user(username='writer', password='x')
+        cls.reader = User.objects.create_user(username='reader', password='x')
+
+    def setUp(self):
+        cache.clear()
+
+    def serve(self, user, view, method='get'):
+        """Run ``view`` behind the routing middleware; returns the databases it read from."""
+        reads = []
+
+        def get_response(request):
+            view(request, lambda: reads.append(User.objects.all().db))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        request.user = CachedUser(build_user_snapshot(user)) if user else AnonymousUser()
+        ReplicaRoutingMiddleware(get_response)(request)
+        return reads
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(User.objects.all().db, 'default')  # outside requests
+
+        def view(request, read):
+            read()
+            # The test replica is a second database that never receives the primary's rows
+            found = User.objects.filter(pk=self.reader.pk).exists()
+            self.assertEqual(found, User.objects.all().db == 'default')
+
+        self.assertEqual(self.serve(self.reader, view), ['replica_1'])
+        self.assertEqual(self.serve(None, view), ['replica_1'])
+        self.assertEqual(self.serve(self.reader, view, method='post'), ['default'])
+
+    def test_reads_follow_writes_to_primary(self):
+        def write(request, read):
+            read()
+            self.writer.first_name = 'Changed'
+            self.writer.save(update_fields=['first_name'])
+            read()
+
+        self.assertEqual(self.serve(self.writer, write), ['replica_1', 'default'])
+        # The writer's next requests stick to the primary; other users' don't
+        self.assertEqual(self.serve(self.writer, lambda request, read: read()), ['default'])
+        self.assertEqual(self.serve(self.reader, lambda request, read: read()), ['replica_1'])
+
+    def test_unauthenticated_lazy_user_is_not_resolved(self):
+        cache.set(recent_write_key(self.writer.pk), True)
+
+        def view(request, read):
+            # What AuthenticationMiddleware leaves for DRF to replace
+            request.user = SimpleLazyObject(AnonymousUser)
+            read()
+            self.assertIs(request.user._wrapped, empty)
+            # DRF authenticates the JWT and sets the real user
+            request.user = CachedUser(build_user_snapshot(self.writer))
+            read()
+
+        self.assertEqual(self.serve(None, view), ['default', 'default'])
+
+
+class FastJSONRendererTest(SimpleTestCase):
+    """The orjson renderer writes what DRF's JSONRenderer writes; floats only differ in spelling."""
+
+    def render(self, data):
+        return FastJSONRenderer().render(data), JSONRenderer().render(data)
+
+    def test_matches_drf(self):
+        chicago = timezone.get_fixed_timezone(-300)
+        for data in (
+            {'fee': Decimal('12.50'), 'big': Decimal('1E+2'), 'small': Decimal('0.001')},
+            [datetime(2026, 10, 19, 12, 0, 0, 123456, tzinfo=dt_timezone.utc),
+             datetime(2026, 10, 19, 12, 0, tzinfo=chicago), datetime(2026, 10, 19, 12, 0),
+             date(2026, 10, 19), datetime_time(12, 30, 1, 5), timedelta(minutes=3)],
+            {'id': uuid.UUID('5cf4d4f1-3037-4b90-84c1-f807ee230353'), 1: 'non-string key'},
+            {'title': gettext_lazy('Consultation'), 'names': [gettext_lazy('Symptoms')]},
+            {'text': 'caf\u00e9 \u2028 \u2029 </script>', 'nested': [(1, 2), {'empty': None, 'flag': True}]},
+            {'huge': 2 ** 70, 'negative': -2 ** 63},
+            {'floats': [0.1, -0.0, 2.5, 123456789.125, 1 / 3, 1e15]},
+        ):
+            fast, drf = self.render(data)
+            self.assertEqual(fast, drf)
+
+    def test_float_exponents_parse_to_the_same_value(self):
+        data = [1e-05, 1e16, 1e22, 1.5e300, 5e-324, Decimal('0.000001')]
+        fast, drf = self.render(data)
+        if fast != drf:  # always, with orjson installed
+            self.assertEqual(fast, b'[0.00001,1e16,1e22,1.5e300,5e-324,1e-6]')
+        self.assertEqual(json.loads(fast), json.loads(drf))
+        self.assertEqual(json.loads(fast), [*data[:-1], 1e-06])
+
+    def test_indent_uses_drf(self):
+        context = {'indent': 2}
+        data = {'value': 1e-05}
+        self.assertEqual(FastJSONRenderer().render(data, renderer_context=context),
+                         JSONRenderer().render(data, renderer_context=context))
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTest(SimpleTestCase):
+    """Negotiated compression of large enough text bodies, leaving everything else alone."""
+
+    body = json.dumps([{'symptom': f'symptom {number}'} for number in range(50)]).encode()
+
+    def respond(self, response, accept_encoding='gzip'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def json_response(self, body=None):
+        return HttpResponse(self.body if body is None else body, content_type='application/json')
+
+    def test_choose_encoding(self):
+        with mock.patch.object(compression, 'brotli', None):
+            self.assertEqual(choose_encoding('gzip, deflate, br'), 'gzip')
+            self.assertIsNone(choose_encoding('br'))
+        with mock.patch.object(compression, 'brotli', object()):
+            for header, expected in (
+                ('gzip, deflate, br', 'br'),
+                ('gzip;q=1.0, br;q=0.5', 'gzip'),
+                ('br;q=0, gzip', 'gzip'),
+                ('GZIP', 'gzip'),
+                ('*', 'br'),
+                ('*;q=0.5, br;q=0', 'gzip'),
+                ('identity', None),
+                ('gzip;q=0', None),
+                ('gzip;q=abc, br', 'br'),
+                ('', None),
+            ):
+                self.assertEqual(choose_encoding(header), expected, header)
+
+    def test_gzip(self):
+        response = self.respond(self.json_response(), 'deflate, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    @skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_brotli(self):
+        response = self.respond(self.json_response(), 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content), self.body)
+
+    def test_not_accepted(self):
+        response = self.respond(self.json_response(), 'identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        # Still varies, so caches keep the compressed and plain bodies apart
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, self.body)
+
+    def test_minimum_size(self):
+        small = self.respond(self.json_response(self.body[:99]))
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertEqual(small.content, self.body[:99])
+        self.assertEqual(self.respond(self.json_response(self.body[:100]))['Content-Encoding'], 'gzip')
+        # Bodies compression would not shrink are sent as they are
+        incompressible = os.urandom(200)
+        response = self.respond(HttpResponse(incompressible, content_type='text/plain'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, incompressible)
+
+    def test_skips_encoded_binary_and_empty_responses(self):
+        encoded = self.json_response(gzip.compress(self.body))
+        encoded['Content-Encoding'] = 'gzip'
+        self.assertEqual(gzip.decompress(self.respond(encoded).content), self.body)
+        self.assertFalse(self.respond(encoded).has_header('Vary'))
+
+        image = self.respond(HttpResponse(self.body, content_type='image/png'))
+        self.assertFalse(image.has_header('Content-Encoding'))
+        not_modified = self.json_response()
+        not_modified.status_code = 304
+        self.assertFalse(self.respond(not_modified).has_header('Content-Encoding'))
+
+    def test_streaming(self):
+        chunks = [b'{"rows": [', b'1,' * 10, b'2]}']
+        response = self.respond(StreamingHttpResponse(iter(chunks), content_type='application/x-ndjson'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        parts = list(response.streaming_content)
+        # Every chunk is flushed as it arrives, before the stream ends
+        self.assertGreaterEqual(len(parts), len(chunks))
+        self.assertEqual(zlib.decompress(b''.join(parts), 31), b''.join(chunks))
+
+        binary = StreamingHttpResponse(iter(chunks), content_type='application/octet-stream')
+        binary = self.respond(binary)
+        self.assertFalse(binary.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(binary.streaming_content), b''.join(chunks))
+
+    def test_weakens_strong_etag(self):
+        response = self.json_response()
+        response['ETag'] = '"abc"'
+        self.assertEqual(self.respond(response)['ETag'], 'W/"abc"')
+        response = self.json_response()
+        response['ETag'] = 'W/"abc"'
+        self.assertEqual(self.respond(response)['ETag'], 'W/"abc"')
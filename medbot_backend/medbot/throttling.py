@@ -0,0 +1,194 @@
+"""
+Cost-weighted token-bucket rate limiting.
+
+Every request spends tokens from up to three buckets at once: its user's,
+its client IP's and the healthcare system the user belongs to
+(``RATE_LIMIT_BUCKETS``). The client IP is ``REMOTE_ADDR`` unless DRF's
+``NUM_PROXIES`` says how many trusted proxies append to X-Forwarded-For. The
+cost depends on the view's ``throttle_scope`` (``RATE_LIMIT_COSTS``), so
+starting an analysis costs far more than polling its status. A request is
+admitted only if every bucket can pay; otherwise it gets a 429 with
+``Retry-After`` set to when the emptiest bucket will have refilled enough.
+
+With the Redis cache backend the buckets live in Redis and are checked and
+debited by one Lua script, atomically across processes. Other backends
+fall back to per-process buckets, as does a request that finds Redis
+unreachable.
+"""
+
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+# Buckets kept by LocalBuckets before full (idle) ones are pruned
+LOCAL_BUCKETS_MAX = 100000
+
+# KEYS: bucket keys. ARGV: cost, then capacity and refill rate per key.
+# Returns {admitted, seconds to wait as a string} (Lua numbers would be truncated).
+TAKE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local levels, wait = {}, 0
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'at')
+    local tokens = tonumber(state[1]) or capacity
+    local at = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - at) * rate)
+    levels[i] = tokens
+    local need = math.min(cost, capacity)
+    if tokens < need then
+        wait = math.max(wait, (need - tokens) / rate)
+    end
+end
+if wait > 0 then
+    return {0, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    redis.call('HSET', key, 'tokens', levels[i] - math.min(cost, capacity), 'at', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return {1, '0'}
+"""
+
+
+class LocalBuckets:
+    """In-process buckets with the same semantics as ``TAKE_SCRIPT``."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, buckets, cost):
+        """``buckets``: ``[(key, capacity, rate)]``. Returns ``(admitted, wait_seconds)``."""
+        now = time.monotonic()
+        with self._lock:
+            levels, wait = [], 0.0
+            for key, capacity, rate in buckets:
+                tokens, at = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + max(0.0, now - at) * rate)
+                levels.append(tokens)
+                need = min(cost, capacity)
+                if tokens < need:
+                    wait = max(wait, (need - tokens) / rate)
+            if wait:
+                return False, wait
+            if len(self._buckets) > LOCAL_BUCKETS_MAX:
+                self._prune(now)
+            for (key, capacity, _), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens - min(cost, capacity), now)
+            return True, 0.0
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def _prune(self, now):
+        # A bucket that has refilled completely is the same as a missing one
+        specs = _bucket_specs()
+        self._buckets = {
+            key: (tokens, at) for key, (tokens, at) in self._buckets.items()
+            if now - at < _refill_seconds(specs.get(key.split(':', 2)[1]))
+        }
+
+
+class RedisBuckets:
+    """Buckets in the Redis cache, updated atomically by ``TAKE_SCRIPT``."""
+
+    def __init__(self, redis_cache):
+        self._cache = redis_cache
+        self._script = None
+
+    def take(self, buckets, cost):
+        client = self._cache._cache.get_client(write=True)
+        if self._script is None:
+            self._script = client.register_script(TAKE_SCRIPT)
+        args = [cost]
+        for _, capacity, rate in buckets:
+            args.extend((capacity, rate))
+        admitted, wait = self._script(
+            keys=[self._cache.make_key(key) for key, _, _ in buckets], args=args, client=client
+        )
+        return bool(admitted), float(wait)
+
+
+def _bucket_specs():
+    return getattr(settings, 'RATE_LIMIT_BUCKETS', {})
+
+
+def _refill_seconds(spec):
+    return spec['capacity'] / spec['refill_per_second'] if spec else 0
+
+
+_local_buckets = LocalBuckets()
+_store = None
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        _store = RedisBuckets(cache) if isinstance(cache, RedisCache) else _local_buckets
+    return _store
+
+
+def forget_buckets():
+    """Refill every per-process bucket; Redis buckets are left alone."""
+    _local_buckets.clear()
+
+
+def take_tokens(buckets, cost):
+    """Debit ``cost`` from every bucket or none; ``(admitted, wait_seconds)``."""
+    store = get_bucket_store()
+    if store is _local_buckets:
+        return store.take(buckets, cost)
+    try:
+        return store.take(buckets, cost)
+    except Exception as exc:
+        logger.warning("Rate limit store unavailable, using per-process buckets: %s", exc)
+        return _local_buckets.take(buckets, cost)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle spending ``RATE_LIMIT_COSTS[view.throttle_scope]`` tokens
+    (``default`` for views without a scope) from the user, IP and healthcare
+    system buckets.
+    """
+
+    def allow_request(self, request, view):
+        if not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+            return True
+        costs = getattr(settings, 'RATE_LIMIT_COSTS', {})
+        cost = costs.get(getattr(view, 'throttle_scope', None), costs.get('default', 1))
+        if not cost:
+            return True
+
+        specs = _bucket_specs()
+        # REMOTE_ADDR, or the X-Forwarded-For entry added by the NUM_PROXIES trusted proxies
+        idents = {'ip': self.get_ident(request)}
+        if request.user and request.user.is_authenticated:
+            idents['user'] = request.user.pk
+            # Only the user's own healthcare system: X-Healthcare-System is client-supplied
+            tenant = getattr(request.user, 'healthcare_system_id', None)
+            if tenant:
+                idents['tenant'] = tenant
+        buckets = [
+            (f'ratelimit:{kind}:{ident}', specs[kind]['capacity'], specs[kind]['refill_per_second'])
+            for kind, ident in idents.items() if kind in specs
+        ]
+        if not buckets:
+            return True
+
+        admitted, self._wait = take_tokens(buckets, cost)
+        return admitted
+
+    def wait(self):
+        return self._wait